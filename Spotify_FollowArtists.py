@@ -1,125 +1,72 @@
 import os
 import random # Not directly used for following, but often useful in related scripts
-import json # For JSON caching
 import sys # For command-line arguments
-from tinytag import TinyTag
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
+from local_library import get_songs_from_local_library_with_cache
+from library_index import get_artists_from_library_index
+from resolution_cache import ResolutionCache
+from spotify_resolver import TokenBucket, RateLimitedSpotify, build_requests_session, resolve_in_order
+from run_journal import RunJournal
+from song_dedupe import canonical_artist, canonical_artist_names
+from run_metrics import RunMetrics, NO_METRICS
+from library_watcher import watch_library
 
 # --- Configuration ---
 # Replace with your Spotify App credentials
-SPOTIPY_CLIENT_ID = 'YOUR_SPOTIPY_CLIENT_ID'
-SPOTIPY_CLIENT_SECRET = 'YOUR_SPOTIPY_CLIENT_SECRET'
-SPOTIPY_REDIRECT_URI = 'http://127.0.0.1:8888/callback' # Must match your Spotify App settings
+SPOTIPY_CLIENT_ID = os.environ.get('SPOTIPY_CLIENT_ID', 'YOUR_SPOTIPY_CLIENT_ID')
+SPOTIPY_CLIENT_SECRET = os.environ.get('SPOTIPY_CLIENT_SECRET', 'YOUR_SPOTIPY_CLIENT_SECRET')
+SPOTIPY_REDIRECT_URI = os.environ.get('SPOTIPY_REDIRECT_URI', 'http://127.0.0.1:8888/callback') # Must match your Spotify App settings
 
 # Path to your local music library
-MUSIC_LIBRARY_PATH = 'C:/Users/YourUser/Music' # e.g., 'C:/Users/YourUser/Music' or '/home/YourUser/Music'
+MUSIC_LIBRARY_PATH = os.environ.get('MUSIC_LIBRARY_PATH', 'C:/Users/YourUser/Music') # e.g., 'C:/Users/YourUser/Music' or '/home/YourUser/Music'
 
 # Cache file for local song data (shared with Spotify_GeneratePlaylist.py)
-CACHE_FILE = 'local_music_cache.json'
+CACHE_FILE = os.environ.get('LOCAL_MUSIC_CACHE_FILE', 'local_music_cache.json')
 
-# --- Functions ---
+# SQLite library index, used instead of CACHE_FILE when the script is run with '--sqlite'
+LIBRARY_INDEX_FILE = 'local_music_library.db'
 
-def get_songs_from_local_library_with_cache(library_path, cache_file, force_rescan=False):
-    """
-    Scans a local music library and extracts song details, with caching.
-    Returns a list of dictionaries, each with 'artist', 'title', 'album', 'filepath'.
-    The 'filepath' is included to check for file existence when loading from cache.
-    Includes progress output for large scans.
-    This function is designed to be compatible with both scripts.
-    """
-    if os.path.exists(cache_file) and not force_rescan:
-        print(f"Loading song data from cache file: {cache_file}")
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached_songs = json.load(f)
-            
-            # Basic validation: Check if files still exist from the cached data
-            valid_cached_songs = []
-            missing_files_count = 0
-            for song in cached_songs:
-                if 'filepath' in song and os.path.exists(song['filepath']):
-                    valid_cached_songs.append(song)
-                else:
-                    missing_files_count += 1
-            
-            # If a significant portion of files are missing (e.g., >10%), force rescan
-            if len(cached_songs) > 0 and (missing_files_count / len(cached_songs)) > 0.1:
-                print(f"More than 10% ({missing_files_count}/{len(cached_songs)}) of cached files are missing. Forcing a full rescan.")
-            elif missing_files_count > 0:
-                print(f"Loaded {len(valid_cached_songs)} valid songs from cache ({missing_files_count} missing files).")
-                return valid_cached_songs
-            else:
-                print(f"Loaded {len(valid_cached_songs)} valid songs from cache (no missing files detected).")
-                return valid_cached_songs
-
-        except json.JSONDecodeError as e:
-            print(f"Error reading cache file {cache_file}: {e}. Forcing a full rescan.")
-        except Exception as e:
-            print(f"An unexpected error occurred while loading cache: {e}. Forcing a full rescan.")
-
-    # If cache not found, invalid, or force_rescan is True, perform full scan
-    print(f"Performing a full scan of local music library at: {library_path} (This may take a while for large libraries)")
-    all_songs = []
-    supported_extensions = ('.mp3', '.flac', '.wav', '.m4a', '.ogg', '.wma', '.aiff')
-
-    files_scanned_count = 0
-    songs_found_count = 0
-    current_directory_progress = ""
-    
-    # Iterate over directories and files
-    for root, dirs, files in os.walk(library_path):
-        # Update current directory if it changes
-        if root != current_directory_progress:
-            current_directory_progress = root
-            print(f"\nScanning directory: {current_directory_progress}")
-
-        for file in files:
-            files_scanned_count += 1
-            filepath = os.path.join(root, file)
-            
-            if file.lower().endswith(supported_extensions):
-                try:
-                    tag = TinyTag.get(filepath)
-                    if tag.title and tag.artist:
-                        song_info = {
-                            'artist': tag.artist.strip(),
-                            'title': tag.title.strip(),
-                            'album': tag.album.strip() if tag.album else "",
-                            'filepath': filepath # Store the full path
-                        }
-                        all_songs.append(song_info)
-                        songs_found_count += 1
-                except Exception as e:
-                    # print(f"  Warning: Could not read metadata from {filepath} - {e}")
-                    pass # Suppress frequent warnings for unreadable files
-            
-            # Print progress every 1000 files (adjust as needed)
-            if files_scanned_count % 1000 == 0:
-                print(f"  Processed {files_scanned_count} files, found {songs_found_count} valid songs.")
-
-    print(f"\nFinished scanning. Processed {files_scanned_count} files, found {songs_found_count} songs with title and artist.")
-
-    # Save the scanned data to cache
-    if all_songs:
-        try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(all_songs, f, indent=4)
-            print(f"Saved {len(all_songs)} songs to cache file: {cache_file}")
-        except Exception as e:
-            print(f"Error saving data to cache file {cache_file}: {e}")
-    else:
-        print("No songs found to save to cache.")
+# Cache of Spotify search results, shared with Spotify_GeneratePlaylist.py
+RESOLUTION_CACHE_FILE = 'spotify_resolution_cache.db'
+RESOLUTION_CACHE_TTL_DAYS = 30 # How long found tracks/artists are remembered
+RESOLUTION_CACHE_NOT_FOUND_TTL_DAYS = 3 # How long "not found" answers are remembered
+
+# Concurrent Spotify searches, used when the script is run with '--concurrent'
+SEARCH_WORKERS = 8 # Number of searches in flight at the same time
+SEARCH_RATE_LIMIT = 10 # Maximum Spotify API calls per second across all workers
+
+# Parallel tag reading, used when the script is run with '--parallel'
+SCAN_WORKERS = 8 # Number of files read at the same time (higher values help on network shares)
+SCAN_FILE_TIMEOUT = 30 # Seconds before a single unreadable file is skipped (only with SCAN_USE_PROCESSES)
+SCAN_USE_PROCESSES = False # True uses worker processes instead of threads (helps on fast local disks)
+
+# Watch mode ('--watch'), which keeps CACHE_FILE up to date while the library changes
+WATCH_DEBOUNCE_SECONDS = 2 # Quiet period before a burst of changes (e.g. an album being copied) is applied
+WATCH_POLL_INTERVAL = 60 # Seconds between library walks when inotify is not available
+
+# Journal of the current run, used by '--resume' to continue an interrupted run
+RUN_JOURNAL_FILE = 'follow_run_journal.jsonl'
+
+# Run metrics, written when the script is run with '--metrics'
+METRICS_FILE = 'follow_run_metrics.json' # JSON report of phase timings, API calls and cache hit rates
+METRICS_PROMETHEUS_FILE = None # Set to a .prom path (e.g. in node_exporter's textfile directory) to also write Prometheus metrics
 
-    return all_songs
+# Artist name variants ("The Beatles", "Beatles, The", "Beyoncé feat. JAY-Z") are searched once (see song_dedupe.py)
+DEDUPE_ARTISTS = True
 
-def authenticate_spotify():
+# --- Functions ---
+
+def authenticate_spotify(rate_limit=None, metrics=None):
     """
     Authenticates with the Spotify API using OAuth 2.0 Authorization Code Flow.
     Requires user interaction for the first time to grant permissions.
+    If rate_limit is given, the client is wrapped in a RateLimitedSpotify allowing at most
+    rate_limit calls per second and handling 429 responses, for use with concurrent searches.
+    If an enabled RunMetrics is given, every API call (including retried attempts) is recorded in it.
     """
-    # Scope for following artists
-    scope = "user-follow-modify"
+    # Scopes for following artists and reading the artists already followed
+    scope = "user-follow-modify user-follow-read"
     sp_oauth = SpotifyOAuth(client_id=SPOTIPY_CLIENT_ID,
                             client_secret=SPOTIPY_CLIENT_SECRET,
                             redirect_uri=SPOTIPY_REDIRECT_URI,
@@ -127,100 +74,314 @@ def authenticate_spotify():
                             cache_path=".spotipyoauthcache") # Stores token for future use
 
     print(f"Authenticating with Spotify. Please open the URL in your browser if it doesn't open automatically:")
-    sp = spotipy.Spotify(auth_manager=sp_oauth)
+    if metrics is None:
+        metrics = NO_METRICS
+    if rate_limit:
+        sp = spotipy.Spotify(auth_manager=sp_oauth, requests_session=build_requests_session(SEARCH_WORKERS))
+        sp = RateLimitedSpotify(metrics.instrument(sp), TokenBucket(rate_limit))
+    else:
+        sp = metrics.instrument(spotipy.Spotify(auth_manager=sp_oauth))
     print("Successfully authenticated with Spotify.")
     return sp
 
-def search_and_follow_artists(sp, local_songs_data):
+def find_spotify_artist_id(sp, artist_name):
     """
-    Extracts unique artists from local_songs_data, searches for them on Spotify and follows them.
+    Searches Spotify for an artist and returns the ID of the top result, or None if nothing was found.
+    Spotify API errors are raised to the caller.
     """
+    results = sp.search(q=f'artist:"{artist_name}"', type='artist', limit=1)
+    if results['artists']['items']:
+        return results['artists']['items'][0]['id']
+    return None
+
+def get_followed_artists(sp):
+    """
+    Pages through the artists the user already follows (50 per call, using the 'after' cursor).
+    Returns a tuple (canonical artist names, see song_dedupe.canonical_artist, and artist IDs), both sets.
+    """
+    followed_names = set()
+    followed_ids = set()
+    after = None
+    while True:
+        results = sp.current_user_followed_artists(limit=50, after=after)['artists']
+        for artist in results['items']:
+            followed_ids.add(artist['id'])
+            followed_names.add(canonical_artist(artist['name']))
+        after = (results.get('cursors') or {}).get('after')
+        if not results.get('next') or not after:
+            break
+    return followed_names, followed_ids
+
+def search_and_follow_artists(sp, artist_song_counts, resolution_cache=None, search_workers=1, journal=None,
+                              metrics=None):
+    """
+    Searches for the local artists in artist_song_counts ({artist name: number of songs}, see
+    SongTable.artist_song_counts and library_index.iter_artists) on Spotify and follows them.
+    With DEDUPE_ARTISTS, spellings of the same artist are merged first and searched once.
+    If a ResolutionCache is given, artists resolved on earlier runs are not searched again.
+    With search_workers > 1, searches run concurrently (sp should then be a RateLimitedSpotify).
+    If a RunJournal is given, every completed batch is recorded in it; when the journal was resumed,
+    the artists handled by the interrupted run are neither searched nor followed again.
+    A RunMetrics, if given, records the 'followed_artists' and 'search_and_follow' phases.
+    """
+    if metrics is None:
+        metrics = NO_METRICS
     unique_artists = set()
-    for song in local_songs_data:
-        if 'artist' in song and song['artist']:
-            unique_artists.add(song['artist'].strip())
+    for artist_name in artist_song_counts:
+        if artist_name:
+            unique_artists.add(artist_name.strip())
+    if DEDUPE_ARTISTS:
+        # One spelling per canonical artist name, so variants of the same name cost a single search
+        name_count = len(unique_artists)
+        unique_artists = set(canonical_artist_names(artist_song_counts).values())
+        merged_count = name_count - len(unique_artists)
+        metrics.count('search_and_follow', 'searches_saved_by_dedupe', merged_count)
+        if merged_count:
+            print(f"Merged {name_count} artist names into {len(unique_artists)} distinct artists, "
+                  f"saving {merged_count} searches.")
     
-    artists_to_follow = list(unique_artists)
-    print(f"\nFound {len(artists_to_follow)} unique artists from your local library to consider following.")
+    total_artist_count = len(unique_artists)
+    print(f"\nFound {total_artist_count} unique artists from your local library to consider following.")
 
     followed_count = 0
     not_found_count = 0
     already_followed_count = 0
-    
+    error_count = 0
+    followed_in_journal = journal.records_of('followed') if journal is not None else []
+    if followed_in_journal:
+        handled_artists = set()
+        for record in followed_in_journal:
+            handled_artists.update(record['artists'])
+            followed_count += len(record['ids'])
+            already_followed_count += record['already_followed']
+            not_found_count += record['not_found']
+        unique_artists -= handled_artists
+        print(f"Resuming: {len(handled_artists)} artists were handled by the interrupted run, {len(unique_artists)} left.")
+
+    # Artists that are already followed are skipped before searching, so repeated runs only cost the paging calls
+    print("\nFetching the artists you already follow on Spotify...")
+    try:
+        with metrics.phase('followed_artists'):
+            followed_names, followed_ids = get_followed_artists(sp)
+        metrics.count('followed_artists', 'artists', len(followed_ids))
+        print(f"You already follow {len(followed_ids)} artists on Spotify.")
+    except spotipy.SpotifyException as e:
+        print(f"  Could not fetch followed artists ({e}). All local artists will be searched.")
+        followed_names, followed_ids = set(), set()
+
+    artists_to_follow = [artist_name for artist_name in sorted(unique_artists)
+                         if canonical_artist(artist_name) not in followed_names]
+    skipped_count = len(unique_artists) - len(artists_to_follow)
+    already_followed_count += skipped_count
+    print(f"Skipping {skipped_count} artists you already follow; {len(artists_to_follow)} artists left to search.")
+
     print("\nStarting to search and follow artists on Spotify...")
     # Spotify API limits following to batches of 50
     batch_size = 50 
     
-    for i in range(0, len(artists_to_follow), batch_size):
-        batch = artists_to_follow[i:i + batch_size]
-        artist_ids_to_follow_in_batch = []
-        
-        for artist_name in batch:
-            try:
-                results = sp.search(q=f'artist:"{artist_name}"', type='artist', limit=1)
-                
-                if results['artists']['items']:
-                    spotify_artist = results['artists']['items'][0]
-                    spotify_artist_id = spotify_artist['id']
-                    spotify_artist_name = spotify_artist['name']
-                    
-                    # We can't directly check if already followed in a batch efficiently without
-                    # fetching all followed artists first. The API will gracefully handle duplicates.
-                    artist_ids_to_follow_in_batch.append(spotify_artist_id)
-                else:
-                    print(f"  Artist not found on Spotify: {artist_name}")
-                    not_found_count += 1
-            except spotipy.SpotifyException as e:
-                print(f"  Error searching for '{artist_name}': {e}")
-            except Exception as e:
-                print(f"  An unexpected error occurred for '{artist_name}': {e}")
-
-        if artist_ids_to_follow_in_batch:
-            try:
-                # The API itself will handle if you try to follow an artist you already follow
-                sp.user_follow_artists(artist_ids_to_follow_in_batch)
-                followed_count += len(artist_ids_to_follow_in_batch)
-                print(f"  Followed {len(artist_ids_to_follow_in_batch)} artists in this batch. Total followed: {followed_count}")
-            except spotipy.SpotifyException as e:
-                # Specific error handling for "already follows" if needed, but batch follow is more robust
-                print(f"  Error following batch of artists: {e}")
-            except Exception as e:
-                print(f"  An unexpected error occurred while following artists: {e}")
+    def resolve_artist(artist_name):
+        # Runs on the worker threads when search_workers > 1
+        cached, spotify_artist_id = False, None
+        if resolution_cache is not None:
+            cached, spotify_artist_id = resolution_cache.lookup_artist(artist_name)
+        if not cached:
+            spotify_artist_id = find_spotify_artist_id(sp, artist_name)
+            if resolution_cache is not None:
+                resolution_cache.store_artist(artist_name, spotify_artist_id)
+        return spotify_artist_id
+
+    artist_ids_to_follow_in_batch = []
+    # Artists of the current batch that were searched without errors, for the journal: those already followed or
+    # not found, and those waiting for the follow call (including other names of an artist in the same batch)
+    batch_handled_artists = []
+    batch_following_artists = []
+    batch_already_followed_count = 0
+    batch_not_found_count = 0
+    batch_duplicate_count = 0
+    with metrics.phase('search_and_follow'):
+        for i, artist_name, spotify_artist_id, error in resolve_in_order(artists_to_follow, resolve_artist, search_workers):
+            if isinstance(error, spotipy.SpotifyException):
+                print(f"  Error searching for '{artist_name}': {error}")
+                error_count += 1
+            elif error is not None:
+                print(f"  An unexpected error occurred for '{artist_name}': {error}")
+                error_count += 1
+            elif spotify_artist_id in followed_ids:
+                # Followed under a different name, or by an earlier batch under another local name
+                batch_handled_artists.append(artist_name)
+                batch_already_followed_count += 1
+            elif spotify_artist_id in artist_ids_to_follow_in_batch:
+                # Another local name of an artist this batch is about to follow
+                batch_following_artists.append(artist_name)
+                batch_duplicate_count += 1
+            elif spotify_artist_id:
+                batch_following_artists.append(artist_name)
+                artist_ids_to_follow_in_batch.append(spotify_artist_id)
+            else:
+                print(f"  Artist not found on Spotify: {artist_name}")
+                batch_handled_artists.append(artist_name)
+                batch_not_found_count += 1
+
+            # Follow once a full batch of local artists has been searched (or at the end)
+            if (i + 1) % batch_size != 0 and (i + 1) != len(artists_to_follow):
+                continue
+
+            batch_followed = True
+            if artist_ids_to_follow_in_batch:
+                try:
+                    sp.user_follow_artists(artist_ids_to_follow_in_batch)
+                    followed_count += len(artist_ids_to_follow_in_batch)
+                    # Only now are they followed, so later names of the same artists count as already followed
+                    followed_ids.update(artist_ids_to_follow_in_batch)
+                    print(f"  Followed {len(artist_ids_to_follow_in_batch)} artists in this batch. Total newly followed: {followed_count}")
+                except spotipy.SpotifyException as e:
+                    print(f"  Error following batch of artists: {e}")
+                    batch_followed = False
+                except Exception as e:
+                    print(f"  An unexpected error occurred while following artists: {e}")
+                    batch_followed = False
+            # The already followed and not found artists were handled either way; the others only if the call succeeded
+            if batch_followed:
+                batch_already_followed_count += batch_duplicate_count
+                handled_artists = batch_handled_artists + batch_following_artists
+                followed_batch_ids = artist_ids_to_follow_in_batch
+            else:
+                error_count += len(artist_ids_to_follow_in_batch) + batch_duplicate_count
+                handled_artists = batch_handled_artists
+                followed_batch_ids = []
+            already_followed_count += batch_already_followed_count
+            not_found_count += batch_not_found_count
+            if journal is not None and handled_artists:
+                journal.append('followed', sync=True, artists=handled_artists, ids=followed_batch_ids,
+                               already_followed=batch_already_followed_count, not_found=batch_not_found_count)
+            artist_ids_to_follow_in_batch = []
+            batch_handled_artists = []
+            batch_following_artists = []
+            batch_already_followed_count = 0
+            batch_not_found_count = 0
+            batch_duplicate_count = 0
+    metrics.count('search_and_follow', 'artists', len(artists_to_follow))
 
     print(f"\n--- Summary ---")
-    print(f"Artists processed (from local library): {len(artists_to_follow)}")
-    print(f"Artists attempted to follow on Spotify: {followed_count + not_found_count + already_followed_count}") # This is a rough count
-    print(f"Artists followed (newly or confirmed): {followed_count}")
-    # Note: spotipy's user_follow_artists doesn't return how many were *newly* followed vs. already.
-    # The 'already_followed_count' from previous version was based on individual error messages, less reliable in batch.
+    print(f"Artists processed (from local library): {total_artist_count}")
+    print(f"Artists already followed: {already_followed_count}")
+    print(f"Artists newly followed: {followed_count}")
     print(f"Artists not found on Spotify: {not_found_count}")
-
+    if error_count:
+        print(f"Artists skipped because of errors: {error_count}")
+        print("Run the script again with '--resume' to retry only these artists.")
+    elif journal is not None:
+        journal.complete()
 
 # --- Main execution ---
-if __name__ == "__main__":
+def main(argv=None):
+    """
+    Runs the script with the given command-line flags (sys.argv[1:] by default).
+    """
+    if argv is None:
+        argv = sys.argv[1:]
     force_rescan_arg = False
-    if '--rescan' in sys.argv:
+    if '--rescan' in argv:
         force_rescan_arg = True
         print("Forcing a full library rescan due to '--rescan' argument.")
 
-    if SPOTIPY_CLIENT_ID == 'YOUR_SPOTIPY_CLIENT_ID' or SPOTIPY_CLIENT_SECRET == 'YOUR_SPOTIPY_CLIENT_SECRET':
-        print("ERROR: Please update SPOTIPY_CLIENT_ID and SPOTIPY_CLIENT_SECRET in the script with your Spotify App credentials.")
+    incremental_arg = '--incremental' in argv
+    if incremental_arg and not force_rescan_arg:
+        print("Re-reading only new or changed files due to '--incremental' argument.")
+
+    scan_workers_arg = 1
+    if '--parallel' in argv:
+        scan_workers_arg = SCAN_WORKERS
+        print(f"Reading tags with {SCAN_WORKERS} workers due to '--parallel' argument.")
+
+    header_only_arg = '--header-only' in argv
+    if header_only_arg:
+        print("Reading only the tag regions of audio files due to '--header-only' argument.")
+
+    metrics_arg = '--metrics' in argv
+    if metrics_arg:
+        print(f"Recording run metrics in {METRICS_FILE} due to '--metrics' argument.")
+    metrics = RunMetrics('follow', enabled=metrics_arg)
+
+    use_library_index_arg = '--sqlite' in argv
+    if use_library_index_arg:
+        print(f"Using the SQLite library index {LIBRARY_INDEX_FILE} due to '--sqlite' argument.")
+
+    use_resolution_cache_arg = '--no-resolution-cache' not in argv
+    if not use_resolution_cache_arg:
+        print("Searching Spotify without the resolution cache due to '--no-resolution-cache' argument.")
+    clear_resolution_cache_arg = '--clear-resolution-cache' in argv and use_resolution_cache_arg
+
+    search_workers_arg = 1
+    search_rate_limit_arg = None
+    if '--concurrent' in argv:
+        search_workers_arg = SEARCH_WORKERS
+        search_rate_limit_arg = SEARCH_RATE_LIMIT
+        print(f"Searching Spotify with {SEARCH_WORKERS} workers (at most {SEARCH_RATE_LIMIT} calls per second) due to '--concurrent' argument.")
+
+    resume_arg = '--resume' in argv
+    watch_arg = '--watch' in argv
+
+    if not watch_arg and (SPOTIPY_CLIENT_ID == 'YOUR_SPOTIPY_CLIENT_ID' or SPOTIPY_CLIENT_SECRET == 'YOUR_SPOTIPY_CLIENT_SECRET'):
+        print("ERROR: Please set SPOTIPY_CLIENT_ID and SPOTIPY_CLIENT_SECRET (as environment variables or in the script) to your Spotify App credentials.")
     elif not os.path.exists(MUSIC_LIBRARY_PATH):
         print(f"ERROR: The specified music library path does not exist: {MUSIC_LIBRARY_PATH}")
-        print("Please update MUSIC_LIBRARY_PATH in the script to your actual music library location.")
+        print("Please set MUSIC_LIBRARY_PATH (as an environment variable or in the script) to your actual music library location.")
+    elif watch_arg:
+        # Keep the shared cache current until interrupted, instead of running against Spotify
+        watch_library(MUSIC_LIBRARY_PATH, CACHE_FILE, WATCH_DEBOUNCE_SECONDS, WATCH_POLL_INTERVAL,
+                      workers=scan_workers_arg, file_timeout=SCAN_FILE_TIMEOUT, use_processes=SCAN_USE_PROCESSES,
+                      header_only=header_only_arg)
     else:
         # 1. Get songs from local library (with caching)
-        local_songs_data = get_songs_from_local_library_with_cache(
-            MUSIC_LIBRARY_PATH, CACHE_FILE, force_rescan=force_rescan_arg
-        )
+        with metrics.phase('library_load'):
+            if use_library_index_arg:
+                # Only the artists are needed, so the index answers from its artist index without reading the songs
+                artist_song_counts = get_artists_from_library_index(
+                    MUSIC_LIBRARY_PATH, LIBRARY_INDEX_FILE, cache_file=CACHE_FILE, refresh=incremental_arg,
+                    force_rescan=force_rescan_arg, workers=scan_workers_arg, file_timeout=SCAN_FILE_TIMEOUT,
+                    use_processes=SCAN_USE_PROCESSES, header_only=header_only_arg
+                )
+            else:
+                artist_song_counts = get_songs_from_local_library_with_cache(
+                    MUSIC_LIBRARY_PATH, CACHE_FILE, force_rescan=force_rescan_arg, incremental=incremental_arg,
+                    workers=scan_workers_arg, file_timeout=SCAN_FILE_TIMEOUT, use_processes=SCAN_USE_PROCESSES,
+                    metrics=metrics, header_only=header_only_arg
+                ).artist_song_counts()
+        metrics.count('library_load', 'songs', sum(artist_song_counts.values()))
 
-        if not local_songs_data:
+        if not artist_song_counts:
             print("No suitable songs found in your local music library or cache. Exiting.")
         else:
             # 2. Authenticate with Spotify
-            spotify_client = authenticate_spotify()
+            with metrics.phase('authentication'):
+                spotify_client = authenticate_spotify(rate_limit=search_rate_limit_arg, metrics=metrics)
 
             # 3. Search and follow artists on Spotify
-            search_and_follow_artists(spotify_client, local_songs_data)
+            resolution_cache = ResolutionCache(RESOLUTION_CACHE_FILE, RESOLUTION_CACHE_TTL_DAYS,
+                                               RESOLUTION_CACHE_NOT_FOUND_TTL_DAYS, enabled=use_resolution_cache_arg)
+            if clear_resolution_cache_arg:
+                print(f"Cleared {resolution_cache.invalidate()} entries from the resolution cache due to '--clear-resolution-cache' argument.")
+            journal = RunJournal(RUN_JOURNAL_FILE, 'follow', resume=resume_arg)
+            if resume_arg and not journal.resumed:
+                print(f"No interrupted run found in {RUN_JOURNAL_FILE}; starting a new run.")
+            try:
+                search_and_follow_artists(spotify_client, artist_song_counts, resolution_cache, search_workers_arg, journal,
+                                          metrics)
+            except KeyboardInterrupt:
+                print("\nInterrupted. Run the script again with '--resume' to continue where this run stopped.")
+            finally:
+                journal.close()
+                resolution_cache.print_stats()
+                metrics.record_cache('resolution_cache', resolution_cache.stats, resolution_cache.hit_rate())
+                resolution_cache.close()
+                if isinstance(spotify_client, RateLimitedSpotify):
+                    spotify_client.print_stats()
+                    metrics.record_client(spotify_client.stats)
 
+    metrics.write_reports(METRICS_FILE, METRICS_PROMETHEUS_FILE)
     print("\nScript finished.")
+
+
+if __name__ == "__main__":
+    main()
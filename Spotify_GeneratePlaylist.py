@@ -1,135 +1,92 @@
 import os
 import random
-import json
 import sys
-from tinytag import TinyTag
+import threading
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
+from local_library import normalize_text, get_songs_from_local_library_with_cache
+from library_index import get_songs_from_library_index
+from resolution_cache import ResolutionCache
+from spotify_resolver import TokenBucket, RateLimitedSpotify, build_requests_session, resolve_in_order
+from playlist_sampler import select_songs
+from playlist_batch import MAX_PLAYLIST_SIZE, load_playlist_specs
+from library_query import LibraryIndex, validate_filter
+from song_table import SongTable
+from song_dedupe import dedupe_songs
+from playlist_sync import PLAYLIST_BATCH_SIZE, find_user_playlist, sync_playlist
+from run_journal import RunJournal
+from run_metrics import RunMetrics, NO_METRICS
+from library_watcher import watch_library
 # import time # You can uncomment this if you want to add small delays for testing purposes
 
 # --- Configuration (rest of your configuration remains the same) ---
-SPOTIPY_CLIENT_ID = 'YOUR_SPOTIPY_CLIENT_ID'
-SPOTIPY_CLIENT_SECRET = 'YOUR_SPOTIPY_CLIENT_SECRET'
-SPOTIPY_REDIRECT_URI = 'http://127.0.0.1:8888/callback' # IMPORTANT: Must match Spotify App settings exactly
+SPOTIPY_CLIENT_ID = os.environ.get('SPOTIPY_CLIENT_ID', 'YOUR_SPOTIPY_CLIENT_ID')
+SPOTIPY_CLIENT_SECRET = os.environ.get('SPOTIPY_CLIENT_SECRET', 'YOUR_SPOTIPY_CLIENT_SECRET')
+SPOTIPY_REDIRECT_URI = os.environ.get('SPOTIPY_REDIRECT_URI', 'http://127.0.0.1:8888/callback') # IMPORTANT: Must match Spotify App settings exactly
 
 # Path to your local music library
-MUSIC_LIBRARY_PATH = 'C:/Users/YourUser/Music' # Adjust for your Windows path
+MUSIC_LIBRARY_PATH = os.environ.get('MUSIC_LIBRARY_PATH', 'C:/Users/YourUser/Music') # Adjust for your Windows path
 
 # Cache file for local song data
-CACHE_FILE = 'local_music_cache.json'
+CACHE_FILE = os.environ.get('LOCAL_MUSIC_CACHE_FILE', 'local_music_cache.json')
+
+# SQLite library index, used instead of CACHE_FILE when the script is run with '--sqlite'
+LIBRARY_INDEX_FILE = 'local_music_library.db'
+
+# Cache of Spotify search results, shared with Spotify_FollowArtists.py
+RESOLUTION_CACHE_FILE = 'spotify_resolution_cache.db'
+RESOLUTION_CACHE_TTL_DAYS = 30 # How long found tracks/artists are remembered
+RESOLUTION_CACHE_NOT_FOUND_TTL_DAYS = 3 # How long "not found" answers are remembered
+
+# Concurrent Spotify searches, used when the script is run with '--concurrent'
+SEARCH_WORKERS = 8 # Number of searches in flight at the same time
+SEARCH_RATE_LIMIT = 10 # Maximum Spotify API calls per second across all workers
+
+# Album-level resolution: selected songs from the same local album are matched against the album's track list
+ALBUM_GROUP_MIN_SONGS = 2 # Selected songs from one album needed before the album is resolved as a whole
+ALBUMS_BATCH_SIZE = 20 # Albums fetched per request (Spotify maximum)
+
+# Parallel tag reading, used when the script is run with '--parallel'
+SCAN_WORKERS = 8 # Number of files read at the same time (higher values help on network shares)
+SCAN_FILE_TIMEOUT = 30 # Seconds before a single unreadable file is skipped (only with SCAN_USE_PROCESSES)
+SCAN_USE_PROCESSES = False # True uses worker processes instead of threads (helps on fast local disks)
+
+# Watch mode ('--watch'), which keeps CACHE_FILE up to date while the library changes
+WATCH_DEBOUNCE_SECONDS = 2 # Quiet period before a burst of changes (e.g. an album being copied) is applied
+WATCH_POLL_INTERVAL = 60 # Seconds between library walks when inotify is not available
+
+# Journal of the current run, used by '--resume' to continue an interrupted run
+RUN_JOURNAL_FILE = 'playlist_run_journal.jsonl'
+
+# Run metrics, written when the script is run with '--metrics'
+METRICS_FILE = 'playlist_run_metrics.json' # JSON report of phase timings, API calls and cache hit rates
+METRICS_PROMETHEUS_FILE = None # Set to a .prom path (e.g. in node_exporter's textfile directory) to also write Prometheus metrics
 
 # Playlist settings
 PLAYLIST_NAME = "My Random Local Library Jams"
 PLAYLIST_DESCRIPTION = "Randomly generated playlist from my local music library."
 PLAYLIST_PUBLIC = False # Set to True for a public playlist, False for private
+PLAYLIST_ID = None # Playlist updated by '--sync'; None looks for your playlist named PLAYLIST_NAME (created if missing)
+PLAYLIST_SYNC_STATE_FILE = 'playlist_sync_state.json' # Tracks and snapshot ID of each synced playlist, to skip re-reading unchanged playlists
+PLAYLIST_BATCH_FILE = 'playlists.json' # Playlist specs generated together by '--batch' (see playlist_batch.py)
 NUMBER_OF_SONGS_TO_ADD = 10000 # Max is around 10,000 for Spotify playlists
+MAX_SONGS_PER_ARTIST = 3 # Limit songs per artist to keep the playlist diverse
+SELECTION_WEIGHTING = None # None (uniform), 'albums' (artists with more albums first) or 'recent' (favour recently added files)
+SELECTION_SEED = None # Set to an integer to get the same selection on every run
+SELECTION_FILTER = None # Only select songs matching these tags (see library_query.py), e.g. {'genres': ['Jazz'], 'min_year': 1955, 'max_year': 1965, 'max_duration_seconds': 360}
+DEDUPE_SONGS = True # Select each song once, however many copies (formats, compilations) the library holds
 
 # --- Functions ---
 
-def get_songs_from_local_library_with_cache(library_path, cache_file, force_rescan=False):
-    """
-    Scans a local music library and extracts song details, with caching.
-    Returns a list of dictionaries, each with 'artist', 'title', 'album', 'filepath'.
-    The 'filepath' is included to check for file existence when loading from cache.
-    Includes progress output for large scans.
-    """
-    if os.path.exists(cache_file) and not force_rescan:
-        print(f"Loading song data from cache file: {cache_file}")
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached_songs = json.load(f)
-            
-            # Basic validation: Check if files still exist from the cached data
-            valid_cached_songs = []
-            missing_files_count = 0
-            for song in cached_songs:
-                if 'filepath' in song and os.path.exists(song['filepath']):
-                    valid_cached_songs.append(song)
-                else:
-                    missing_files_count += 1
-            
-            # If a significant portion of files are missing (e.g., >10%), force rescan
-            if len(cached_songs) > 0 and (missing_files_count / len(cached_songs)) > 0.1:
-                print(f"More than 10% ({missing_files_count}/{len(cached_songs)}) of cached files are missing. Forcing a full rescan.")
-            elif missing_files_count > 0:
-                print(f"Loaded {len(valid_cached_songs)} valid songs from cache ({missing_files_count} missing files).")
-                return valid_cached_songs
-            else:
-                print(f"Loaded {len(valid_cached_songs)} valid songs from cache (no missing files detected).")
-                return valid_cached_songs
-
-        except json.JSONDecodeError as e:
-            print(f"Error reading cache file {cache_file}: {e}. Forcing a full rescan.")
-        except Exception as e:
-            print(f"An unexpected error occurred while loading cache: {e}. Forcing a full rescan.")
-
-    # If cache not found, invalid, or force_rescan is True, perform full scan
-    print(f"Performing a full scan of local music library at: {library_path} (This may take a while for large libraries)")
-    all_songs = []
-    supported_extensions = ('.mp3', '.flac', '.wav', '.m4a', '.ogg', '.wma', '.aiff')
-
-    files_scanned_count = 0
-    songs_found_count = 0
-    current_directory_progress = ""
-    
-    # Iterate over directories and files
-    for root, dirs, files in os.walk(library_path):
-        # Update current directory if it changes
-        if root != current_directory_progress:
-            current_directory_progress = root
-            print(f"\nScanning directory: {current_directory_progress}")
-
-        for file in files:
-            files_scanned_count += 1
-            filepath = os.path.join(root, file)
-            
-            if file.lower().endswith(supported_extensions):
-                try:
-                    tag = TinyTag.get(filepath)
-                    if tag.title and tag.artist:
-                        song_info = {
-                            'artist': tag.artist.strip(),
-                            'title': tag.title.strip(),
-                            'album': tag.album.strip() if tag.album else "",
-                            'filepath': filepath # Store the full path
-                        }
-                        all_songs.append(song_info)
-                        songs_found_count += 1
-                except Exception as e:
-                    # You can uncomment the line below for more detailed warnings, but it can be noisy
-                    # print(f"  Warning: Could not read metadata from {filepath} - {e}")
-                    pass # Suppress frequent warnings for unreadable files
-            
-            # Print progress every 1000 files (adjust as needed)
-            if files_scanned_count % 1000 == 0:
-                print(f"  Processed {files_scanned_count} files, found {songs_found_count} valid songs.")
-                # time.sleep(0.01) # Small delay for observing output, remove in production
-
-    print(f"\nFinished scanning. Processed {files_scanned_count} files, found {songs_found_count} songs with title and artist.")
-
-    # Save the scanned data to cache
-    if all_songs:
-        try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(all_songs, f, indent=4)
-            print(f"Saved {len(all_songs)} songs to cache file: {cache_file}")
-        except Exception as e:
-            print(f"Error saving data to cache file {cache_file}: {e}")
-    else:
-        print("No songs found to save to cache.")
-
-    return all_songs
-
-
-# --- Rest of the script (authenticate_spotify, create_spotify_playlist, search_and_add_tracks_to_playlist, main execution) remains the same ---
-# (Pasting the full script for completeness, but the changes are only in the function above)
-
-def authenticate_spotify():
+def authenticate_spotify(rate_limit=None, metrics=None):
     """
     Authenticates with the Spotify API using OAuth 2.0 Authorization Code Flow.
     Requires user interaction for the first time to grant permissions.
+    If rate_limit is given, the client is wrapped in a RateLimitedSpotify allowing at most
+    rate_limit calls per second and handling 429 responses, for use with concurrent searches.
+    If an enabled RunMetrics is given, every API call (including retried attempts) is recorded in it.
     """
-    scope = "user-read-private playlist-modify-public playlist-modify-private"
+    scope = "user-read-private playlist-read-private playlist-modify-public playlist-modify-private"
     sp_oauth = SpotifyOAuth(client_id=SPOTIPY_CLIENT_ID,
                             client_secret=SPOTIPY_CLIENT_SECRET,
                             redirect_uri=SPOTIPY_REDIRECT_URI,
@@ -137,7 +94,13 @@ def authenticate_spotify():
                             cache_path=".spotipyoauthcache")
 
     print(f"Authenticating with Spotify. Please open the URL in your browser if it doesn't open automatically:")
-    sp = spotipy.Spotify(auth_manager=sp_oauth)
+    if metrics is None:
+        metrics = NO_METRICS
+    if rate_limit:
+        sp = spotipy.Spotify(auth_manager=sp_oauth, requests_session=build_requests_session(SEARCH_WORKERS))
+        sp = RateLimitedSpotify(metrics.instrument(sp), TokenBucket(rate_limit))
+    else:
+        sp = metrics.instrument(spotipy.Spotify(auth_manager=sp_oauth))
     print("Successfully authenticated with Spotify.")
     return sp
 
@@ -154,190 +117,714 @@ def create_spotify_playlist(sp, user_id, name, description, public):
         print(f"Error creating playlist: {e}")
         return None
 
-def search_and_add_tracks_to_playlist(sp, playlist_id, local_songs, num_songs_to_add):
+def find_or_create_sync_playlist(sp, user_id):
     """
-    Searches for a random sample of local songs on Spotify and adds them to a playlist.
+    Returns the playlist updated by '--sync': PLAYLIST_ID if set, otherwise the user's playlist named
+    PLAYLIST_NAME, which is created if it does not exist yet.
     """
-    if not local_songs:
-        print("No songs found in your local library to add.")
-        return
+    if PLAYLIST_ID:
+        print(f"\nSyncing playlist ID {PLAYLIST_ID}.")
+        return {'id': PLAYLIST_ID}
+    try:
+        playlist = find_user_playlist(sp, user_id, PLAYLIST_NAME)
+    except spotipy.SpotifyException as e:
+        print(f"Error looking up your playlists: {e}")
+        return None
+    if playlist:
+        print(f"\nSyncing existing playlist '{playlist['name']}' (ID: {playlist['id']}).")
+        return playlist
+    print(f"\nNo playlist named '{PLAYLIST_NAME}' found.")
+    return create_spotify_playlist(sp, user_id, PLAYLIST_NAME, PLAYLIST_DESCRIPTION, PLAYLIST_PUBLIC)
 
-    actual_num_to_add = min(num_songs_to_add, len(local_songs), 10000)
-    if actual_num_to_add == 0:
-        print("No songs to add to the playlist.")
-        return
+def find_spotify_track_uri(sp, song):
+    """
+    Searches Spotify for a local song and returns (URI of the best match, strategy that found it),
+    or (None, None) if there is no strong match.
+    Songs with an ISRC tag are looked up with an exact 'isrc:' query first (strategy 'isrc'). Otherwise, or if
+    the ISRC is unknown to Spotify, a text search on title and artist is used (strategy 'text'): a match must
+    have the same first artist, a match on the album is preferred, and among equal candidates the one whose
+    duration is closest to the local file's wins.
+    Spotify API errors are raised to the caller.
+    """
+    isrc = song.get('isrc')
+    if isrc:
+        results = sp.search(q=f"isrc:{isrc}", type='track', limit=1)
+        if results['tracks']['items']:
+            return results['tracks']['items'][0]['uri'], 'isrc'
+
+    query = f"track:\"{song['title']}\" artist:\"{song['artist']}\""
+    results = sp.search(q=query, type='track', limit=5)
+
+    artist = normalize_text(song['artist'])
+    album = normalize_text(song['album']) if song['album'] else None
+    duration_ms = song.get('duration_ms')
+
+    def match_rank(candidate):
+        position, track = candidate
+        album_matches = album is not None and normalize_text(track.get('album', {}).get('name') or "") == album
+        duration_difference = abs(track['duration_ms'] - duration_ms) if duration_ms and track.get('duration_ms') else 0
+        return not album_matches, duration_difference, position
+
+    candidates = [(position, track) for position, track in enumerate(results['tracks']['items'])
+                  if track['artists'] and normalize_text(track['artists'][0]['name']) == artist]
+    if not candidates:
+        return None, None
+    return min(candidates, key=match_rank)[1]['uri'], 'text'
+
+def find_spotify_album_id(sp, artist, album):
+    """
+    Searches Spotify for a local album and returns its ID, or None if there is no album by the same first artist.
+    An album with exactly the same name is preferred over other matches (e.g. a deluxe edition).
+    Spotify API errors are raised to the caller.
+    """
+    query = f"album:\"{album}\" artist:\"{artist}\""
+    results = sp.search(q=query, type='album', limit=5)
 
-    print(f"\nSelecting {actual_num_to_add} random songs from your local library...")
-    if len(local_songs) < actual_num_to_add:
-        print(f"Warning: Only {len(local_songs)} unique songs available, reducing target to this number.")
-        actual_num_to_add = len(local_songs)
-
-   # Add a new configuration for max songs per artist
-    MAX_SONGS_PER_ARTIST = 3 # Or any number you prefer
-
-    print(f"\nSelecting {actual_num_to_add} random songs from your local library with a limit of {MAX_SONGS_PER_ARTIST} songs per artist...")
-
-    # Group songs by artist
-    songs_by_artist = {}
-    for song in local_songs:
-        artist = song['artist']
-        if artist not in songs_by_artist:
-            songs_by_artist[artist] = []
-        songs_by_artist[artist].append(song)
-
-    selected_local_songs = []
-    
-    # Create a list of all artist keys
-    artists = list(songs_by_artist.keys())
-
-    # Shuffle the artists to randomize the order in which we pick from them
-    random.shuffle(artists)
-
-    # Iterate through artists, picking up to MAX_SONGS_PER_ARTIST from each
-    # until we reach the desired number of songs or run out of unique songs.
-    current_artist_idx = 0
-    while len(selected_local_songs) < actual_num_to_add and artists:
-        artist_name = artists[current_artist_idx % len(artists)]
-        artist_songs = songs_by_artist[artist_name]
-
-        # If we haven't already taken MAX_SONGS_PER_ARTIST from this artist
-        # and there are still songs left for them
-        songs_already_taken_from_artist = sum(1 for s in selected_local_songs if s['artist'] == artist_name)
-        
-        if songs_already_taken_from_artist < MAX_SONGS_PER_ARTIST and artist_songs:
-            # Pick a random song from this artist that hasn't been picked yet
-            available_songs_for_artist = [s for s in artist_songs if s not in selected_local_songs]
-            
-            if available_songs_for_artist:
-                song_to_add = random.choice(available_songs_for_artist)
-                selected_local_songs.append(song_to_add)
-            else:
-                # No more unique songs for this artist
-                pass
-        
-        # Move to the next artist (circularly)
-        current_artist_idx += 1
-        
-        # If we've gone through all artists and still need more songs,
-        # but couldn't find any new unique ones under the quota, break to avoid infinite loop
-        if current_artist_idx >= len(artists) * MAX_SONGS_PER_ARTIST and len(selected_local_songs) < actual_num_to_add:
-            # This is a heuristic: if we've cycled through artists a few times
-            # and are stuck, it means we can't meet the target with current constraints.
-            print("Warning: Could not find enough unique songs while adhering to artist limits. Adding fewer songs.")
-            break
-            
-        # Add a check to prevent infinite loops if we run out of unique songs
-        # before reaching actual_num_to_add while still trying to respect the quota
-        if len(selected_local_songs) == len(set(frozenset(s.items()) for s in local_songs)): # If all unique songs are picked
-            break
+    artist = normalize_text(artist)
+    candidates = [item for item in results['albums']['items']
+                  if item and item['artists'] and normalize_text(item['artists'][0]['name']) == artist]
+    exact_matches = [item for item in candidates if normalize_text(item['name']) == normalize_text(album)]
+    best_matches = exact_matches or candidates
+    return best_matches[0]['id'] if best_matches else None
 
-    # Now `selected_local_songs` contains your selection respecting the artist limit
-    # The rest of the function (Spotify search and add) remains the same
+def get_spotify_album_tracks(sp, album_ids):
+    """
+    Fetches up to ALBUMS_BATCH_SIZE albums in one request and returns ({album ID: tracks}, number of API calls).
+    Albums with more tracks than the first page are paged through with sp.album_tracks().
+    """
+    api_calls = 1
+    tracks_by_album = {}
+    for album in sp.albums(album_ids)['albums']:
+        if not album:
+            continue
+        page = album['tracks']
+        tracks = list(page['items'])
+        while page.get('next'):
+            page = sp.album_tracks(album['id'], limit=50, offset=len(tracks))
+            tracks.extend(page['items'])
+            api_calls += 1
+        tracks_by_album[album['id']] = tracks
+    return tracks_by_album, api_calls
+
+def match_album_track(song, album_tracks):
+    """
+    Returns the URI of the album track with the same title as the local song, or None.
+    Tracks with the same title (e.g. on different discs) are told apart by track number, then by duration.
+    """
+    title = normalize_text(song['title'])
+    candidates = [track for track in album_tracks if track.get('uri') and normalize_text(track['name']) == title]
+    track_number = song.get('track_number')
+    duration_ms = song.get('duration_ms')
 
+    def match_rank(track):
+        duration_difference = abs(track['duration_ms'] - duration_ms) if duration_ms and track.get('duration_ms') else 0
+        return track_number is not None and track.get('track_number') != track_number, duration_difference
 
-    spotify_track_uris = []
+    return min(candidates, key=match_rank)['uri'] if candidates else None
+
+def resolve_songs(sp, songs, indexes, resolution_cache=None, search_workers=1, album_stats=None):
+    """
+    Resolves songs[i] for every i in indexes and yields (i, track URI or None, strategy, error) in three stages:
+      1. songs found in the ResolutionCache (strategy 'cache'),
+      2. songs sharing a local album with at least ALBUM_GROUP_MIN_SONGS - 1 other songs: the album is searched once,
+         the albums' track lists are fetched as soon as ALBUMS_BATCH_SIZE albums were found and the songs are
+         matched on them ('album'),
+      3. every other song, with find_spotify_track_uri ('isrc' or 'text').
+    Searches run on search_workers threads. album_stats, if given, receives the number of 'albums' matched,
+    the 'songs' resolved through them and the 'api_calls' spent on album searches and track lists.
+    """
+    if album_stats is None:
+        album_stats = {'albums': 0, 'songs': 0, 'api_calls': 0}
+    pending = []
+    for i in indexes:
+        song = songs[i]
+        if resolution_cache is not None:
+            cached, track_uri = resolution_cache.lookup_track(song['artist'], song['title'], song['album'])
+            if cached:
+                yield i, track_uri, 'cache' if track_uri else None, None
+                continue
+        pending.append(i)
+
+    groups = {}
+    for i in pending:
+        if songs[i]['album']:
+            groups.setdefault((normalize_text(songs[i]['artist']), normalize_text(songs[i]['album'])), []).append(i)
+    groups = [group for group in groups.values() if len(group) >= ALBUM_GROUP_MIN_SONGS]
+
+    def search_album(group):
+        # Runs on the worker threads when search_workers > 1
+        return find_spotify_album_id(sp, songs[group[0]]['artist'], songs[group[0]]['album'])
+
+    resolved_by_album = set()
+
+    def match_found_albums(found_albums):
+        # Fetches the track lists of the found albums in one go and yields the songs matched on them
+        tracks_by_album = {}
+        try:
+            tracks_by_album, api_calls = get_spotify_album_tracks(sp, list(dict.fromkeys(found_albums.values())))
+            album_stats['api_calls'] += api_calls
+        except Exception as e:
+            # Connection errors and timeouts too: the songs of these albums still get their own searches
+            album_stats['api_calls'] += 1
+            print(f"  Error fetching album track lists, searching their songs one by one: {e}")
+        for position, album_id in found_albums.items():
+            matched = False
+            for i in groups[position]:
+                track_uri = match_album_track(songs[i], tracks_by_album.get(album_id, []))
+                if track_uri:
+                    matched = True
+                    resolved_by_album.add(i)
+                    album_stats['songs'] += 1
+                    if resolution_cache is not None:
+                        resolution_cache.store_track(songs[i]['artist'], songs[i]['title'], songs[i]['album'], track_uri)
+                    yield i, track_uri, 'album', None
+            if matched:
+                album_stats['albums'] += 1
+
+    # Position in groups -> Spotify album ID, for albums whose track lists have not been fetched yet.
+    # They are fetched as soon as ALBUMS_BATCH_SIZE different albums were found, so matches stream out early.
+    found_albums = {}
+    for position, _, album_id, error in resolve_in_order(groups, search_album, search_workers):
+        album_stats['api_calls'] += 1
+        if error is None and album_id:
+            found_albums[position] = album_id
+            if len(set(found_albums.values())) >= ALBUMS_BATCH_SIZE:
+                yield from match_found_albums(found_albums)
+                found_albums = {}
+    if found_albums:
+        yield from match_found_albums(found_albums)
+
+    def search_song(i):
+        # Runs on the worker threads when search_workers > 1
+        song = songs[i]
+        track_uri, strategy = find_spotify_track_uri(sp, song)
+        if resolution_cache is not None:
+            resolution_cache.store_track(song['artist'], song['title'], song['album'], track_uri)
+        return track_uri, strategy
+
+    remaining = [i for i in pending if i not in resolved_by_album]
+    for _, i, result, error in resolve_in_order(remaining, search_song, search_workers):
+        track_uri, strategy = result if error is None else (None, None)
+        yield i, track_uri, strategy, error
+
+def search_and_add_tracks_to_playlist(sp, playlist_id, local_songs, num_songs_to_add, resolution_cache=None,
+                                      search_workers=1, journal=None, metrics=None, sync=False):
+    """
+    Searches for a random sample of local songs on Spotify and adds them to a playlist.
+    Found tracks are added in batches of PLAYLIST_BATCH_SIZE while the search goes on, so only the searches in
+    flight and one batch are held at a time and the first tracks show up in the playlist right away.
+    With sync=True the playlist is changed to hold exactly the found tracks with playlist_sync.sync_playlist,
+    instead of adding them all to a new playlist.
+    If a ResolutionCache is given, songs resolved on earlier runs are not searched again.
+    With search_workers > 1, searches run concurrently (sp should then be a RateLimitedSpotify).
+    If a RunJournal is given, the selection, every resolved song and the songs of every added batch are recorded
+    in it; when the journal was resumed, the recorded selection is reused and only the remaining work is done.
+    With DEDUPE_SONGS, copies of the same song are left out before the selection (see song_dedupe.py), and with
+    SELECTION_FILTER only the songs matching it are selected from (see library_query.py).
+    A RunMetrics, if given, records the 'dedupe', 'filter', 'selection', 'resolution' and 'upload' phases.
+    """
+    if metrics is None:
+        metrics = NO_METRICS
+    if journal is not None and journal.last('selection'):
+        selected_local_songs = journal.last('selection')['songs']
+        actual_num_to_add = len(selected_local_songs)
+        print(f"\nResuming with the {actual_num_to_add} songs selected by the interrupted run.")
+    else:
+        if not local_songs:
+            print("No songs found in your local library to add.")
+            return
+
+        if DEDUPE_SONGS:
+            # One canonical copy per artist and title (see song_dedupe.py), so copies take no searches or playlist slots
+            with metrics.phase('dedupe'):
+                local_songs, duplicate_count = dedupe_songs(local_songs)
+            metrics.count('dedupe', 'duplicates', duplicate_count)
+            if duplicate_count:
+                print(f"Left out {duplicate_count} duplicate copies of songs (same artist and title); "
+                      f"selecting from {len(local_songs)} distinct songs.")
+
+        if SELECTION_FILTER:
+            # Answered from the tag indexes of library_query.py instead of a pass over every song
+            if not isinstance(local_songs, SongTable):
+                local_songs = SongTable.from_songs(local_songs)
+            with metrics.phase('filter'):
+                matching_rows = LibraryIndex(local_songs).query(SELECTION_FILTER)
+            metrics.count('filter', 'songs', len(matching_rows))
+            print(f"{len(matching_rows)} of {len(local_songs)} songs match SELECTION_FILTER.")
+            local_songs = local_songs.select(matching_rows)
+
+        actual_num_to_add = min(num_songs_to_add, len(local_songs), 10000)
+        if actual_num_to_add == 0:
+            print("No songs to add to the playlist.")
+            return
+
+        print(f"\nSelecting {actual_num_to_add} random songs from your local library...")
+        if len(local_songs) < actual_num_to_add:
+            print(f"Warning: Only {len(local_songs)} unique songs available, reducing target to this number.")
+            actual_num_to_add = len(local_songs)
+
+        print(f"\nSelecting {actual_num_to_add} random songs from your local library with a limit of {MAX_SONGS_PER_ARTIST} songs per artist...")
+
+        # Round-robin over the artists, picking up to MAX_SONGS_PER_ARTIST from each (see playlist_sampler.py)
+        rng = random.Random(SELECTION_SEED)
+        with metrics.phase('selection'):
+            selected_local_songs = select_songs(local_songs, actual_num_to_add, MAX_SONGS_PER_ARTIST, rng, SELECTION_WEIGHTING)
+        metrics.count('selection', 'songs', len(selected_local_songs))
+        if len(selected_local_songs) < actual_num_to_add:
+            print("Warning: Could not find enough unique songs while adhering to artist limits. Adding fewer songs.")
+        if journal is not None:
+            journal.append('selection', sync=True, songs=[dict(song) for song in selected_local_songs])
+
+    # Songs resolved before an interruption: found tracks that were not added yet go into the first batch.
+    # Only sync mode keeps every found URI, since the sync diff needs the whole target set.
+    resolved_indexes = set()
+    added_indexes = set()
+    pending_batch = [] # (index in selected_local_songs, track URI) waiting to be added
+    sync_uris = []
     found_count = 0
     not_found_count = 0
-
-    print(f"Searching Spotify for {len(selected_local_songs)} selected songs (this may take a while)...")
-    for i, song in enumerate(selected_local_songs):
-        query = f"track:\"{song['title']}\" artist:\"{song['artist']}\""
+    # Strategy ('cache', 'album', 'isrc' or 'text') -> number of songs it resolved
+    strategy_counts = {}
+    if journal is not None:
+        for record in journal.records_of('added'):
+            added_indexes.update(record['indexes'])
+        for record in journal.records_of('resolved'):
+            resolved_indexes.add(record['index'])
+            if not record['uri']:
+                not_found_count += 1
+                continue
+            found_count += 1
+            if record.get('strategy'):
+                strategy_counts[record['strategy']] = strategy_counts.get(record['strategy'], 0) + 1
+            if sync:
+                sync_uris.append(record['uri'])
+            elif record['index'] not in added_indexes:
+                pending_batch.append((record['index'], record['uri']))
+    songs_to_resolve = [i for i in range(len(selected_local_songs)) if i not in resolved_indexes]
+
+    added_to_playlist_count = len(added_indexes)
+    failed_batch_count = 0
+
+    def add_batch(batch):
+        # Adds one batch of (index, track URI) and records its indexes, so a resumed run skips them
+        nonlocal added_to_playlist_count, failed_batch_count
         try:
-            results = sp.search(q=query, type='track', limit=5)
-
-            if results['tracks']['items']:
-                best_match = None
-                for track in results['tracks']['items']:
-                    if track['artists'][0]['name'].lower() == song['artist'].lower():
-                        if not best_match:
-                            best_match = track
-                        if song['album'] and 'album' in track and track['album']['name'].lower() == song['album'].lower():
-                            best_match = track
-                            break
-                
-                if best_match:
-                    spotify_track_uris.append(best_match['uri'])
-                    found_count += 1
+            with metrics.phase('upload'):
+                sp.playlist_add_items(playlist_id, [track_uri for _, track_uri in batch])
+        except spotipy.SpotifyException as e:
+            print(f"  Error adding batch of tracks: {e}")
+            failed_batch_count += 1
+            return
+        except Exception as e:
+            print(f"  An unexpected error occurred while adding tracks: {e}")
+            failed_batch_count += 1
+            return
+        added_to_playlist_count += len(batch)
+        metrics.count('upload', 'tracks', len(batch))
+        if journal is not None:
+            journal.append('added', sync=True, indexes=[i for i, _ in batch])
+        print(f"  Added {added_to_playlist_count} tracks to playlist.")
+
+    if resolved_indexes:
+        print(f"{len(resolved_indexes)} songs were already resolved by the interrupted run.")
+    if sync:
+        print(f"Searching Spotify for {len(songs_to_resolve)} selected songs (this may take a while)...")
+    else:
+        print(f"Searching Spotify for {len(songs_to_resolve)} selected songs and adding them to the playlist "
+              f"as they are found (this may take a while)...")
+    while len(pending_batch) >= PLAYLIST_BATCH_SIZE:
+        add_batch(pending_batch[:PLAYLIST_BATCH_SIZE])
+        pending_batch = pending_batch[PLAYLIST_BATCH_SIZE:]
+
+    # Resolution and upload overlap: each batch is added as soon as it is full, so the 'resolution' phase
+    # includes the time of the uploads made while searching
+    album_stats = {'albums': 0, 'songs': 0, 'api_calls': 0}
+    with metrics.phase('resolution'):
+        results = resolve_songs(sp, selected_local_songs, songs_to_resolve, resolution_cache, search_workers, album_stats)
+        for position, (i, track_uri, strategy, error) in enumerate(results):
+            song = selected_local_songs[i]
+            if isinstance(error, spotipy.SpotifyException):
+                print(f"  Error searching for '{song['title']}' by '{song['artist']}': {error}")
+                continue
+            elif error is not None:
+                print(f"  An unexpected error occurred for '{song['title']}' by '{song['artist']}': {error}")
+                continue
+
+            if journal is not None:
+                journal.append('resolved', index=i, uri=track_uri, strategy=strategy)
+            if track_uri:
+                found_count += 1
+                strategy_counts[strategy] = strategy_counts.get(strategy, 0) + 1
+                metrics.count('resolution', f"{strategy}_matches")
+                if sync:
+                    sync_uris.append(track_uri)
                 else:
-                    not_found_count += 1
+                    pending_batch.append((i, track_uri))
+                    if len(pending_batch) == PLAYLIST_BATCH_SIZE:
+                        add_batch(pending_batch)
+                        pending_batch = []
             else:
                 not_found_count += 1
 
-            if (i + 1) % 100 == 0 or (i + 1) == len(selected_local_songs):
-                print(f"  Processed {i + 1} songs. Found {found_count}, not found {not_found_count}.")
-
-        except spotipy.SpotifyException as e:
-            print(f"  Error searching for '{song['title']}' by '{song['artist']}': {e}")
-        except Exception as e:
-            print(f"  An unexpected error occurred for '{song['title']}' by '{song['artist']}': {e}")
+            if (position + 1) % 100 == 0 or (position + 1) == len(songs_to_resolve):
+                print(f"  Processed {position + 1} songs. Found {found_count}, not found {not_found_count}.")
+    metrics.count('resolution', 'tracks', len(songs_to_resolve))
+    if pending_batch:
+        add_batch(pending_batch)
 
     print(f"\nFound {found_count} out of {actual_num_to_add} selected songs on Spotify.")
     print(f"{not_found_count} songs were not found or had no strong match.")
-
-    if not spotify_track_uris:
+    if strategy_counts:
+        print("Resolved by: " + ", ".join(f"{strategy} {count}" for strategy, count in sorted(strategy_counts.items())))
+    # Each song matched on an album track list would otherwise have needed at least one search. Albums that were
+    # searched without a match cost calls too, so grouping can also save nothing.
+    calls_saved = max(0, album_stats['songs'] - album_stats['api_calls'])
+    if calls_saved:
+        print(f"Album grouping matched {album_stats['songs']} songs on {album_stats['albums']} albums with "
+              f"{album_stats['api_calls']} API calls, saving {calls_saved} calls.")
+        metrics.count('resolution', 'api_calls_saved', calls_saved)
+
+    if not found_count:
         print("No Spotify tracks found to add to the playlist. Exiting.")
+        if journal is not None:
+            journal.complete()
         return
 
-    added_to_playlist_count = 0
-    print("\nAdding tracks to the Spotify playlist...")
-    for i in range(0, len(spotify_track_uris), 100):
-        batch = spotify_track_uris[i:i + 100]
+    if sync:
+        # The diff is recomputed from the playlist itself, so a resumed run simply syncs again
+        print("\nSyncing the Spotify playlist...")
         try:
-            sp.playlist_add_items(playlist_id, batch)
-            added_to_playlist_count += len(batch)
-            print(f"  Added {added_to_playlist_count}/{len(spotify_track_uris)} tracks to playlist.")
+            with metrics.phase('upload'):
+                stats = sync_playlist(sp, playlist_id, sync_uris, PLAYLIST_SYNC_STATE_FILE)
         except spotipy.SpotifyException as e:
-            print(f"  Error adding batch of tracks: {e}")
-            break
-        except Exception as e:
-            print(f"  An unexpected error occurred while adding tracks: {e}")
-            break
+            print(f"  Error syncing the playlist: {e}")
+            print("Run the script again with '--sync --resume' to finish the sync.")
+            return
+        metrics.count('upload', 'tracks', stats['added'] + stats['removed'])
+        print(f"\nSynced your Spotify playlist '{PLAYLIST_NAME}': {stats['kept']} tracks kept, "
+              f"{stats['removed']} removed, {stats['added']} added.")
+        if journal is not None:
+            journal.complete()
+        return
 
     print(f"\nSuccessfully added {added_to_playlist_count} tracks to your Spotify playlist '{PLAYLIST_NAME}'.")
+    if failed_batch_count:
+        print(f"{failed_batch_count} batches could not be added. Run the script again with '--resume' to retry only those batches.")
+    elif journal is not None:
+        journal.complete()
 
+def upload_batch_playlist(sp, user_id, spec, track_uris, sync_lock):
+    """
+    Creates the playlist of a batch spec and adds track_uris to it, or with spec['sync'] syncs the user's
+    playlist named spec['name'] (created if missing) to hold exactly track_uris.
+    Returns a short summary of the upload. Spotify API errors are raised to the caller.
+    """
+    if spec['sync']:
+        # PLAYLIST_SYNC_STATE_FILE is shared by every synced playlist, so syncs run one at a time
+        with sync_lock:
+            playlist = find_user_playlist(sp, user_id, spec['name'])
+            if not playlist:
+                playlist = sp.user_playlist_create(user=user_id, name=spec['name'], public=spec['public'],
+                                                   description=spec['description'])
+            stats = sync_playlist(sp, playlist['id'], track_uris, PLAYLIST_SYNC_STATE_FILE)
+        return f"synced, {stats['kept']} tracks kept, {stats['removed']} removed, {stats['added']} added"
+    playlist = sp.user_playlist_create(user=user_id, name=spec['name'], public=spec['public'],
+                                       description=spec['description'])
+    for start in range(0, len(track_uris), PLAYLIST_BATCH_SIZE):
+        sp.playlist_add_items(playlist['id'], track_uris[start:start + PLAYLIST_BATCH_SIZE])
+    return f"created with {len(track_uris)} tracks (ID: {playlist['id']})"
+
+def generate_playlist_batch(sp, user_id, local_songs, specs, resolution_cache=None, search_workers=1, metrics=None):
+    """
+    Generates every playlist of a batch file ('--batch', see playlist_batch.py) from one library load.
+    Songs are selected for each spec from the songs matching its filter, which are looked up in one LibraryIndex
+    shared by all specs; the union of all selections is then
+    resolved in a single pass, so a song picked for several playlists is looked up once. Finally the playlists
+    are created (or synced) and filled on search_workers threads.
+    A RunMetrics, if given, records the 'dedupe', 'filter', 'selection', 'resolution' and 'upload' phases.
+    """
+    if metrics is None:
+        metrics = NO_METRICS
+    if DEDUPE_SONGS:
+        with metrics.phase('dedupe'):
+            local_songs, duplicate_count = dedupe_songs(local_songs)
+        metrics.count('dedupe', 'duplicates', duplicate_count)
+        if duplicate_count:
+            print(f"Left out {duplicate_count} duplicate copies of songs (same artist and title); "
+                  f"selecting from {len(local_songs)} distinct songs.")
+    elif not isinstance(local_songs, SongTable):
+        local_songs = SongTable.from_songs(local_songs)
+
+    print(f"\nSelecting songs for {len(specs)} playlists...")
+    query_index = LibraryIndex(local_songs)
+    selections = []  # Selected songs of each spec, in playlist order
+    for spec in specs:
+        with metrics.phase('filter'):
+            rows = query_index.query(spec['filter'])
+        metrics.count('filter', 'songs', len(rows))
+        with metrics.phase('selection'):
+            selected = select_songs(local_songs.select(rows), min(spec['size'], len(rows)),
+                                    spec['max_songs_per_artist'], random.Random(spec['seed']), spec['weighting'])
+        selections.append(selected)
+        print(f"  '{spec['name']}': {len(selected)} songs selected from {len(rows)} matching songs.")
+    selected_count = sum(len(selected) for selected in selections)
+    metrics.count('selection', 'songs', selected_count)
+
+    # Songs picked for several playlists are resolved once, keyed on their file
+    songs_by_path = {}
+    for selected in selections:
+        for song in selected:
+            songs_by_path.setdefault(song['filepath'], song)
+    songs_to_resolve = list(songs_by_path.values())
+    lookups_saved = selected_count - len(songs_to_resolve)
+    print(f"\nSearching Spotify for {len(songs_to_resolve)} distinct songs ({lookups_saved} selected for more than "
+          f"one playlist are looked up only once)...")
+
+    uris_by_path = {}
+    not_found_count = 0
+    strategy_counts = {}
+    album_stats = {'albums': 0, 'songs': 0, 'api_calls': 0}
+    with metrics.phase('resolution'):
+        results = resolve_songs(sp, songs_to_resolve, range(len(songs_to_resolve)), resolution_cache, search_workers,
+                                album_stats)
+        for position, (i, track_uri, strategy, error) in enumerate(results):
+            song = songs_to_resolve[i]
+            if isinstance(error, spotipy.SpotifyException):
+                print(f"  Error searching for '{song['title']}' by '{song['artist']}': {error}")
+            elif error is not None:
+                print(f"  An unexpected error occurred for '{song['title']}' by '{song['artist']}': {error}")
+            elif track_uri:
+                uris_by_path[song['filepath']] = track_uri
+                strategy_counts[strategy] = strategy_counts.get(strategy, 0) + 1
+                metrics.count('resolution', f"{strategy}_matches")
+            else:
+                not_found_count += 1
+            if (position + 1) % 100 == 0 or (position + 1) == len(songs_to_resolve):
+                print(f"  Processed {position + 1} songs. Found {len(uris_by_path)}, not found {not_found_count}.")
+    metrics.count('resolution', 'tracks', len(songs_to_resolve))
+    metrics.count('resolution', 'lookups_saved', lookups_saved)
+    if strategy_counts:
+        print("Resolved by: " + ", ".join(f"{strategy} {count}" for strategy, count in sorted(strategy_counts.items())))
+
+    sync_lock = threading.Lock()
+
+    def upload(position):
+        # Runs on the worker threads when search_workers > 1
+        track_uris = [uris_by_path[song['filepath']] for song in selections[position] if song['filepath'] in uris_by_path]
+        track_uris = list(dict.fromkeys(track_uris))  # Two local files may resolve to the same track
+        if not track_uris:
+            return "skipped, no matching songs found on Spotify", 0
+        return upload_batch_playlist(sp, user_id, specs[position], track_uris, sync_lock), len(track_uris)
+
+    print(f"\nUploading {len(specs)} playlists...")
+    failed_count = 0
+    with metrics.phase('upload'):
+        for position, _, result, error in resolve_in_order(range(len(specs)), upload, search_workers):
+            if error is not None:
+                failed_count += 1
+                print(f"  Error uploading playlist '{specs[position]['name']}': {error}")
+                continue
+            summary, track_count = result
+            if track_count:
+                metrics.count('upload', 'playlists')
+                metrics.count('upload', 'tracks', track_count)
+            print(f"  '{specs[position]['name']}': {summary}.")
+
+    print(f"\nGenerated {len(specs) - failed_count} of {len(specs)} playlists.")
+    if failed_count:
+        print("Run the script again with '--batch' to retry; playlists with \"sync\": true are updated in place "
+              "instead of being created again.")
+
+def open_resolution_cache(enabled, clear):
+    """
+    Opens the ResolutionCache of RESOLUTION_CACHE_FILE, emptied first if clear is True.
+    """
+    resolution_cache = ResolutionCache(RESOLUTION_CACHE_FILE, RESOLUTION_CACHE_TTL_DAYS,
+                                       RESOLUTION_CACHE_NOT_FOUND_TTL_DAYS, enabled=enabled)
+    if clear:
+        print(f"Cleared {resolution_cache.invalidate()} entries from the resolution cache due to '--clear-resolution-cache' argument.")
+    return resolution_cache
+
+def finish_spotify_run(spotify_client, resolution_cache, metrics):
+    """
+    Prints and records the resolution cache and API client statistics of a run, and closes the cache.
+    """
+    resolution_cache.print_stats()
+    metrics.record_cache('resolution_cache', resolution_cache.stats, resolution_cache.hit_rate())
+    resolution_cache.close()
+    if isinstance(spotify_client, RateLimitedSpotify):
+        spotify_client.print_stats()
+        metrics.record_client(spotify_client.stats)
 
 # --- Main execution ---
-if __name__ == "__main__":
+def main(argv=None):
+    """
+    Runs the script with the given command-line flags (sys.argv[1:] by default).
+    """
+    if argv is None:
+        argv = sys.argv[1:]
     force_rescan_arg = False
-    if '--rescan' in sys.argv:
+    if '--rescan' in argv:
         force_rescan_arg = True
         print("Forcing a full library rescan due to '--rescan' argument.")
 
-    if SPOTIPY_CLIENT_ID == 'YOUR_SPOTIPY_CLIENT_ID' or SPOTIPY_CLIENT_SECRET == 'YOUR_SPOTIPY_CLIENT_SECRET':
-        print("ERROR: Please update SPOTIPY_CLIENT_ID and SPOTIPY_CLIENT_SECRET in the script with your Spotify App credentials.")
+    incremental_arg = '--incremental' in argv
+    if incremental_arg and not force_rescan_arg:
+        print("Re-reading only new or changed files due to '--incremental' argument.")
+
+    scan_workers_arg = 1
+    if '--parallel' in argv:
+        scan_workers_arg = SCAN_WORKERS
+        print(f"Reading tags with {SCAN_WORKERS} workers due to '--parallel' argument.")
+
+    header_only_arg = '--header-only' in argv
+    if header_only_arg:
+        print("Reading only the tag regions of audio files due to '--header-only' argument.")
+
+    metrics_arg = '--metrics' in argv
+    if metrics_arg:
+        print(f"Recording run metrics in {METRICS_FILE} due to '--metrics' argument.")
+    metrics = RunMetrics('playlist', enabled=metrics_arg)
+
+    use_library_index_arg = '--sqlite' in argv
+    if use_library_index_arg:
+        print(f"Using the SQLite library index {LIBRARY_INDEX_FILE} due to '--sqlite' argument.")
+
+    use_resolution_cache_arg = '--no-resolution-cache' not in argv
+    if not use_resolution_cache_arg:
+        print("Searching Spotify without the resolution cache due to '--no-resolution-cache' argument.")
+    clear_resolution_cache_arg = '--clear-resolution-cache' in argv and use_resolution_cache_arg
+
+    search_workers_arg = 1
+    search_rate_limit_arg = None
+    if '--concurrent' in argv:
+        search_workers_arg = SEARCH_WORKERS
+        search_rate_limit_arg = SEARCH_RATE_LIMIT
+        print(f"Searching Spotify with {SEARCH_WORKERS} workers (at most {SEARCH_RATE_LIMIT} calls per second) due to '--concurrent' argument.")
+
+    resume_arg = '--resume' in argv
+
+    sync_arg = '--sync' in argv
+    if sync_arg:
+        print("Updating the existing playlist instead of creating a new one due to '--sync' argument.")
+    watch_arg = '--watch' in argv
+
+    settings_error = None
+    try:
+        validate_filter(SELECTION_FILTER, "SELECTION_FILTER")
+    except ValueError as e:
+        settings_error = e
+
+    batch_specs = None
+    if '--batch' in argv and settings_error is None:
+        print(f"Generating every playlist in {PLAYLIST_BATCH_FILE} due to '--batch' argument.")
+        # Settings a spec leaves out; '--sync' makes syncing the default for every playlist
+        batch_defaults = {'description': PLAYLIST_DESCRIPTION, 'public': PLAYLIST_PUBLIC,
+                          'size': min(NUMBER_OF_SONGS_TO_ADD, MAX_PLAYLIST_SIZE),
+                          'max_songs_per_artist': MAX_SONGS_PER_ARTIST, 'weighting': SELECTION_WEIGHTING,
+                          'seed': SELECTION_SEED, 'sync': sync_arg, 'filter': SELECTION_FILTER}
+        try:
+            batch_specs = load_playlist_specs(PLAYLIST_BATCH_FILE, batch_defaults)
+        except ValueError as e:
+            settings_error = e
+        if resume_arg:
+            print("Note: '--resume' does not apply to '--batch' runs, which are not journaled.")
+
+    if not watch_arg and (SPOTIPY_CLIENT_ID == 'YOUR_SPOTIPY_CLIENT_ID' or SPOTIPY_CLIENT_SECRET == 'YOUR_SPOTIPY_CLIENT_SECRET'):
+        print("ERROR: Please set SPOTIPY_CLIENT_ID and SPOTIPY_CLIENT_SECRET (as environment variables or in the script) to your Spotify App credentials.")
     elif not os.path.exists(MUSIC_LIBRARY_PATH):
         print(f"ERROR: The specified music library path does not exist: {MUSIC_LIBRARY_PATH}")
-        print("Please update MUSIC_LIBRARY_PATH in the script to your actual music library location.")
+        print("Please set MUSIC_LIBRARY_PATH (as an environment variable or in the script) to your actual music library location.")
+    elif settings_error is not None:
+        print(f"ERROR: {settings_error}")
+    elif watch_arg:
+        # Keep the shared cache current until interrupted, instead of running against Spotify
+        watch_library(MUSIC_LIBRARY_PATH, CACHE_FILE, WATCH_DEBOUNCE_SECONDS, WATCH_POLL_INTERVAL,
+                      workers=scan_workers_arg, file_timeout=SCAN_FILE_TIMEOUT, use_processes=SCAN_USE_PROCESSES,
+                      header_only=header_only_arg)
     else:
         # 1. Get songs from local library (with caching)
-        local_songs_data = get_songs_from_local_library_with_cache(
-            MUSIC_LIBRARY_PATH, CACHE_FILE, force_rescan=force_rescan_arg
-        )
+        with metrics.phase('library_load'):
+            if use_library_index_arg:
+                # Selection needs random access to every song, so the streamed rows are kept in a SongTable
+                local_songs_data = SongTable.from_songs(get_songs_from_library_index(
+                    MUSIC_LIBRARY_PATH, LIBRARY_INDEX_FILE, cache_file=CACHE_FILE, refresh=incremental_arg,
+                    force_rescan=force_rescan_arg, workers=scan_workers_arg, file_timeout=SCAN_FILE_TIMEOUT,
+                    use_processes=SCAN_USE_PROCESSES, header_only=header_only_arg
+                ))
+            else:
+                local_songs_data = get_songs_from_local_library_with_cache(
+                    MUSIC_LIBRARY_PATH, CACHE_FILE, force_rescan=force_rescan_arg, incremental=incremental_arg,
+                    workers=scan_workers_arg, file_timeout=SCAN_FILE_TIMEOUT, use_processes=SCAN_USE_PROCESSES,
+                    metrics=metrics, header_only=header_only_arg
+                )
+        metrics.count('library_load', 'songs', len(local_songs_data))
 
         if not local_songs_data:
             print("No suitable songs found in your local music library or cache. Exiting.")
         else:
             # 2. Authenticate with Spotify
-            spotify_client = authenticate_spotify()
+            with metrics.phase('authentication'):
+                spotify_client = authenticate_spotify(rate_limit=search_rate_limit_arg, metrics=metrics)
 
             # Get current user's ID
             user_profile = spotify_client.current_user()
             user_id = user_profile['id']
             print(f"Authenticated as Spotify user: {user_profile['display_name']} (ID: {user_id})")
 
-            # 3. Create a new Spotify playlist
-            new_playlist = create_spotify_playlist(
-                sp=spotify_client,
-                user_id=user_id,
-                name=PLAYLIST_NAME,
-                description=PLAYLIST_DESCRIPTION,
-                public=PLAYLIST_PUBLIC
-            )
-
-            if new_playlist:
-                # 4. Search for local songs on Spotify and add them to the playlist
-                search_and_add_tracks_to_playlist(spotify_client, new_playlist['id'], local_songs_data, NUMBER_OF_SONGS_TO_ADD)
+            if batch_specs:
+                # 3. Select, resolve and upload every playlist of the batch file
+                resolution_cache = open_resolution_cache(use_resolution_cache_arg, clear_resolution_cache_arg)
+                try:
+                    generate_playlist_batch(spotify_client, user_id, local_songs_data, batch_specs, resolution_cache,
+                                            search_workers_arg, metrics)
+                except KeyboardInterrupt:
+                    print("\nInterrupted.")
+                finally:
+                    finish_spotify_run(spotify_client, resolution_cache, metrics)
             else:
-                print("Could not create the Spotify playlist. Exiting.")
+                journal = RunJournal(RUN_JOURNAL_FILE, 'playlist', resume=resume_arg)
+                if resume_arg and not journal.resumed:
+                    print(f"No interrupted run found in {RUN_JOURNAL_FILE}; starting a new run.")
+
+                # 3. Create a new Spotify playlist (or continue with the playlist of the interrupted run)
+                if journal.last('playlist'):
+                    new_playlist = journal.last('playlist')
+                    print(f"Resuming the interrupted run for playlist ID {new_playlist['id']} due to '--resume' argument.")
+                elif sync_arg:
+                    new_playlist = find_or_create_sync_playlist(spotify_client, user_id)
+                    if new_playlist:
+                        journal.append('playlist', sync=True, id=new_playlist['id'])
+                else:
+                    new_playlist = create_spotify_playlist(
+                        sp=spotify_client,
+                        user_id=user_id,
+                        name=PLAYLIST_NAME,
+                        description=PLAYLIST_DESCRIPTION,
+                        public=PLAYLIST_PUBLIC
+                    )
+                    if new_playlist:
+                        journal.append('playlist', sync=True, id=new_playlist['id'])
+
+                if new_playlist:
+                    # 4. Search for local songs on Spotify and add them to the playlist
+                    resolution_cache = open_resolution_cache(use_resolution_cache_arg, clear_resolution_cache_arg)
+                    try:
+                        search_and_add_tracks_to_playlist(spotify_client, new_playlist['id'], local_songs_data,
+                                                          NUMBER_OF_SONGS_TO_ADD, resolution_cache, search_workers_arg, journal,
+                                                          metrics, sync_arg)
+                    except KeyboardInterrupt:
+                        print("\nInterrupted. Run the script again with '--resume' to continue where this run stopped.")
+                    finally:
+                        journal.close()
+                        finish_spotify_run(spotify_client, resolution_cache, metrics)
+                else:
+                    journal.close()
+                    print("Could not create the Spotify playlist. Exiting.")
 
-    print("\nScript finished.")
\ No newline at end of file
+    metrics.write_reports(METRICS_FILE, METRICS_PROMETHEUS_FILE)
+    print("\nScript finished.")
+
+
+if __name__ == "__main__":
+    main()
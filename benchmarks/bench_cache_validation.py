@@ -0,0 +1,95 @@
+"""
+Compares the existence check of a cache load done file by file (os.path.exists per song, as before) with
+local_library.validate_cached_files, which stats every directory once and lists only the changed ones.
+The directory check runs twice: without a state file (every directory is listed) and with the state file
+the first run wrote (unchanged directories are skipped). A few files are deleted first, and every method
+must report the same missing files.
+
+A local tree answers from memory, so --latency adds a delay to every os.stat and os.scandir call to stand
+in for the round trip of a network share; the number of calls is reported as well.
+
+Usage: python benchmarks/bench_cache_validation.py [--files N] [--latency MS] [--workers N] [--delete N]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+import local_library
+from local_library import scan_audio_files, validate_cached_files
+from song_table import SongTable
+from synthetic_library import generate_library
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="File-by-file against directory-based cache validation.")
+    parser.add_argument('--files', type=int, default=20_000, help="audio files in the synthetic library")
+    parser.add_argument('--latency', type=float, default=0.0, help="milliseconds added to every stat and listing")
+    parser.add_argument('--workers', type=int, default=8, help="directories checked at the same time")
+    parser.add_argument('--delete', type=int, default=10, help="files deleted before validating")
+    return parser.parse_args()
+
+
+class SlowFileSystem:
+    """
+    Wraps os.stat and os.scandir with a fixed delay and counts the calls. os.path.exists goes through os.stat.
+    """
+
+    def __init__(self, latency_seconds):
+        self.latency_seconds = latency_seconds
+        self.calls = 0
+        self.original = (os.stat, os.scandir)
+
+    def _wrap(self, function):
+        def slow(*args, **kwargs):
+            self.calls += 1
+            if self.latency_seconds:
+                time.sleep(self.latency_seconds)
+            return function(*args, **kwargs)
+        return slow
+
+    def __enter__(self):
+        self.calls = 0
+        os.stat, os.scandir = self._wrap(self.original[0]), self._wrap(self.original[1])
+        return self
+
+    def __exit__(self, *exc_info):
+        os.stat, os.scandir = self.original
+
+
+def validate_file_by_file(songs):
+    return sum(1 for song in songs if not ('filepath' in song and os.path.exists(song['filepath'])))
+
+
+def run(library, state_file):
+    generate_library(library, arguments.files)
+    songs = SongTable.from_songs({'artist': "", 'title': "", 'album': "", 'filepath': filepath}
+                                 for filepath, _ in scan_audio_files(library) if filepath)
+    for row in range(0, len(songs), max(1, len(songs) // max(1, arguments.delete)))[:arguments.delete]:
+        os.remove(songs[row]['filepath'])
+    # Record the directories at once instead of waiting for their mtimes to settle
+    local_library.DIRECTORY_MTIME_SETTLE_SECONDS = -3600
+
+    print(f"Validating {len(songs)} cached songs in {len(songs.directories)} directories "
+          f"({arguments.latency:g} ms per call, {arguments.workers} workers):")
+    methods = [
+        ('file by file', lambda: validate_file_by_file(songs)),
+        ('directories, no state', lambda: validate_cached_files(songs, state_file, arguments.workers)[1]),
+        ('directories, with state', lambda: validate_cached_files(songs, state_file, arguments.workers)[1]),
+    ]
+    for name, method in methods:
+        with SlowFileSystem(arguments.latency / 1000) as file_system:
+            start = time.perf_counter()
+            missing = method()
+            elapsed = time.perf_counter() - start
+        status = "" if missing == arguments.delete else f"  MISMATCH (expected {arguments.delete})"
+        print(f"  {name:<24} {elapsed:>8.2f}s {file_system.calls:>9} calls {missing:>6} missing{status}")
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        run(os.path.join(temp_dir, 'library'), os.path.join(temp_dir, 'cache.json.dirs'))
@@ -0,0 +1,237 @@
+"""
+Times every phase of both scripts on a synthetic library against the local mock Spotify API,
+and writes the timings as one JSON line so runs can be compared over time.
+
+Phases:
+  scan                 full scan with get_songs_from_local_library_with_cache (force_rescan=True)
+  cache_load           loading and validating the JSON cache (also writes the SongTable snapshot)
+  cache_load_snapshot  loading and validating the cache through the snapshot
+  selection            playlist_sampler.select_songs
+  resolution           track resolution with resolve_songs (album grouping, then per-track searches)
+  upload               creating the playlist and adding the tracks in batches of 100
+  playlist             search_and_add_tracks_to_playlist end to end, where searches and uploads overlap
+                       (also records first_batch_seconds, the time until the first batch was in the playlist)
+  follow               search_and_follow_artists for every artist in the library
+
+Usage: python benchmarks/bench_pipeline.py [--files N] [--select N] [--latency MS] [--output results.jsonl] ...
+Run with --help for all options.
+"""
+import os
+import io
+import sys
+import json
+import time
+import logging
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+import spotipy
+import Spotify_GeneratePlaylist as generate_playlist
+import Spotify_FollowArtists as follow_artists
+from local_library import get_songs_from_local_library_with_cache
+from playlist_sampler import select_songs
+from spotify_resolver import TokenBucket, RateLimitedSpotify, build_requests_session
+from mock_spotify_server import MockSpotifyServer, MOCK_USER_ID
+from synthetic_library import generate_library, iter_synthetic_songs
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Per-phase benchmark of the library scan and Spotify loops.")
+    parser.add_argument('--files', type=int, default=5_000, help="audio files in the synthetic library (up to ~500k)")
+    parser.add_argument('--select', type=int, default=500, help="songs to select, resolve and upload")
+    parser.add_argument('--library', help="directory for the synthetic library (kept between runs); default: a temporary directory")
+    parser.add_argument('--scan-workers', type=int, default=1, help="tag reading workers for the scan phase")
+    parser.add_argument('--latency', type=float, default=10, help="mock API latency per request, in ms")
+    parser.add_argument('--server-rate-limit', type=int, default=None, help="mock API requests per second before 429s")
+    parser.add_argument('--workers', type=int, default=8, help="concurrent Spotify searches")
+    parser.add_argument('--client-rate-limit', type=float, default=500, help="client-side limit on API calls per second")
+    parser.add_argument('--skip', action='append', default=[], help="phase to skip (repeatable)")
+    parser.add_argument('--output', help="append the results as one JSON line to this file")
+    parser.add_argument('--verbose', action='store_true', help="show the output of the scripts' functions")
+    return parser.parse_args()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARKS_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class PhaseTimer:
+    """
+    Runs the phases, keeps their timings and hides the scripts' progress output unless verbose.
+    """
+
+    def __init__(self, skip=(), verbose=False):
+        self.skip = set(skip)
+        self.verbose = verbose
+        self.phases = {}
+
+    def run(self, name, func, count=len):
+        """
+        Times func() and records it under name, with the number of items count(result) processed.
+        Returns func's result, or None if the phase is skipped.
+        """
+        if name in self.skip:
+            return None
+        output = contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+        items = count(result)
+        self.phases[name] = {'seconds': round(elapsed, 4), 'items': items,
+                             'items_per_second': round(items / elapsed, 1) if elapsed else None}
+        print(f"  {name:<20} {elapsed:9.3f} s  {items:>8} items")
+        return result
+
+
+def make_client(server, workers, rate_limit):
+    sp = spotipy.Spotify(auth='mock-token', requests_session=build_requests_session(max(1, workers)))
+    sp.prefix = server.api_prefix
+    return RateLimitedSpotify(sp, TokenBucket(rate_limit))
+
+
+def build_album_catalog(number_of_files):
+    """
+    Returns the mock server's album_catalog for the synthetic library: (artist, album) -> its tracks.
+    """
+    catalog = {}
+    for _, _, frames in iter_synthetic_songs(number_of_files):
+        catalog.setdefault((frames['TPE1'], frames['TALB']), []).append(
+            (frames['TIT2'], int(frames['TRCK'].split('/')[0]), int(frames['TLEN'])))
+    return lambda artist, album: catalog.get((artist, album), [])
+
+
+def resolve_tracks(sp, songs, workers):
+    uris = []
+    strategies = {}
+    album_stats = {'albums': 0, 'songs': 0, 'api_calls': 0}
+    for _, uri, strategy, error in generate_playlist.resolve_songs(sp, songs, range(len(songs)), None, workers,
+                                                                  album_stats):
+        if error is None and uri:
+            uris.append(uri)
+            strategies[strategy] = strategies.get(strategy, 0) + 1
+    return uris, strategies, album_stats
+
+
+def upload_tracks(sp, uris):
+    playlist = sp.user_playlist_create(user=MOCK_USER_ID, name="Benchmark playlist", public=False, description="")
+    for i in range(0, len(uris), 100):
+        sp.playlist_add_items(playlist['id'], uris[i:i + 100])
+    return uris
+
+
+class FirstBatchTimer:
+    """
+    Wraps a Spotify client and records how long after its creation the first playlist_add_items call returned.
+    """
+
+    def __init__(self, sp):
+        self.sp = sp
+        self.start = time.perf_counter()
+        self.first_batch_seconds = None
+
+    def __getattr__(self, name):
+        return getattr(self.sp, name)
+
+    def playlist_add_items(self, playlist_id, items, position=None):
+        result = self.sp.playlist_add_items(playlist_id, items, position)
+        if self.first_batch_seconds is None:
+            self.first_batch_seconds = time.perf_counter() - self.start
+        return result
+
+
+def stream_playlist(sp, songs, workers):
+    playlist = sp.user_playlist_create(user=MOCK_USER_ID, name="Benchmark playlist", public=False, description="")
+    timed_sp = FirstBatchTimer(sp)
+    generate_playlist.search_and_add_tracks_to_playlist(timed_sp, playlist['id'], songs, len(songs),
+                                                        search_workers=workers)
+    return timed_sp
+
+
+def run_benchmark(arguments, library_root, work_dir):
+    timer = PhaseTimer(arguments.skip, arguments.verbose)
+    cache_file = os.path.join(work_dir, 'local_music_cache.json')
+    load_library = get_songs_from_local_library_with_cache
+
+    print(f"Generating a synthetic library of {arguments.files} files in {library_root}...")
+    manifest = generate_library(library_root, arguments.files)
+    print(f"  {manifest['tagged_songs']} tagged songs in {manifest['directories']} album folders.\n")
+
+    timer.run('scan', lambda: load_library(library_root, cache_file, force_rescan=True,
+                                           workers=arguments.scan_workers, file_timeout=30))
+    if os.path.exists(cache_file + '.table'):
+        os.remove(cache_file + '.table')
+    timer.run('cache_load', lambda: load_library(library_root, cache_file))
+    songs = timer.run('cache_load_snapshot', lambda: load_library(library_root, cache_file))
+    if songs is None:
+        songs = load_library(library_root, cache_file)
+
+    rng = random.Random(1)
+    selection = timer.run('selection', lambda: select_songs(songs, arguments.select,
+                                                            generate_playlist.MAX_SONGS_PER_ARTIST, rng))
+    if selection is None:
+        selection = select_songs(songs, arguments.select, generate_playlist.MAX_SONGS_PER_ARTIST, rng)
+
+    server = MockSpotifyServer(latency=arguments.latency / 1000, rate_limit=arguments.server_rate_limit,
+                               not_found_every=10, album_catalog=build_album_catalog(arguments.files))
+    server.start_in_background()
+    try:
+        sp = make_client(server, arguments.workers, arguments.client_rate_limit)
+        resolved = timer.run('resolution', lambda: resolve_tracks(sp, selection, arguments.workers),
+                             count=lambda _: len(selection))
+        if resolved is not None:
+            uris, strategies, album_stats = resolved
+            timer.phases['resolution']['strategies'] = strategies
+            timer.phases['resolution']['album_grouping'] = album_stats
+            timer.run('upload', lambda: upload_tracks(sp, uris))
+        streamed = timer.run('playlist', lambda: stream_playlist(sp, selection, arguments.workers),
+                             count=lambda _: len(selection))
+        if streamed is not None:
+            timer.phases['playlist']['first_batch_seconds'] = round(streamed.first_batch_seconds or 0, 4)
+        timer.run('follow', lambda: follow_artists.search_and_follow_artists(sp, songs.artist_song_counts(), None,
+                                                                             arguments.workers),
+                  count=lambda _: len(songs.artists))
+        server_stats = {'requests': server.counters['requests'], 'rate_limited': server.counters['rate_limited'],
+                        'by_endpoint': dict(server.counters_by_endpoint), 'client': dict(sp.stats)}
+    finally:
+        server.shutdown()
+
+    return {
+        'benchmark': 'pipeline',
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(arguments).items() if key not in ('output', 'verbose', 'library')},
+        'library': {key: manifest[key] for key in ('audio_files', 'tagged_songs', 'directories')},
+        'phases': timer.phases,
+        'server': server_stats
+    }
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    if not arguments.verbose:
+        logging.getLogger('spotipy').setLevel(logging.CRITICAL) # 429s are expected with --server-rate-limit
+    with tempfile.TemporaryDirectory() as work_dir:
+        library_root = arguments.library or os.path.join(work_dir, 'library')
+        results = run_benchmark(arguments, library_root, work_dir)
+
+    line = json.dumps(results, sort_keys=True)
+    if arguments.output:
+        with open(arguments.output, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+        print(f"\nAppended the results to {arguments.output}")
+    else:
+        print(f"\n{line}")
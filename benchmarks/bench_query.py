@@ -0,0 +1,114 @@
+"""
+Compares playlist filters answered by library_query.LibraryIndex with a linear pass over every song,
+on an in-memory synthetic library (no files are written), and checks that both find the same songs.
+
+The index is built on the first query that needs it; the build time is reported separately, since a batch
+of playlists (or a second filter on the same library) reuses it.
+
+Usage: python benchmarks/bench_query.py [--songs N] [--repeat N]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+from song_table import SongTable, MISSING_SIGNED
+from song_dedupe import canonical_text
+from library_query import LibraryIndex, GENRE_SEPARATORS
+from synthetic_library import iter_synthetic_songs
+
+NOW = 1_750_000_000
+
+FILTERS = {
+    'jazz 1955-1965 <6m': {'genres': ['jazz'], 'min_year': 1955, 'max_year': 1965, 'max_duration_seconds': 360},
+    'rock >=256 kbit/s': {'genres': ['Rock', 'Metal'], 'min_bitrate': 256},
+    'one artist': {'artists': ['artist 00042']},
+    'added in 30 days': {'added_within_days': 30},
+    'under 6 minutes': {'max_duration_seconds': 360},
+    'folder + year': {'path_contains': 'album 0001', 'min_year': 1990},
+}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Indexed against linear playlist filters.")
+    parser.add_argument('--songs', type=int, default=300_000, help="songs in the synthetic library")
+    parser.add_argument('--repeat', type=int, default=5, help="runs of each filter (the best one is reported)")
+    return parser.parse_args()
+
+
+def make_songs(number_of_songs, seed=1):
+    rng = random.Random(seed)
+    songs = []
+    for directory, filename, frames in iter_synthetic_songs(number_of_songs, seed):
+        song = {'artist': frames['TPE1'], 'title': frames['TIT2'], 'album': frames['TALB'],
+                'filepath': os.path.join('/music', directory, filename), 'duration_ms': int(frames['TLEN']),
+                'mtime': (NOW - rng.randrange(3 * 365 * 86400)) * 1_000_000_000}
+        if rng.random() < 0.9: # Some files carry no genre, year or bitrate
+            song['genre'] = frames['TCON'] if rng.random() < 0.8 else f"{frames['TCON']}; Blues"
+            song['year'] = int(frames['TDRC']) - 10
+            song['bitrate'] = rng.choice((128, 192, 256, 320))
+        songs.append(song)
+    return songs
+
+
+def linear_query(songs, song_filter):
+    # What a filter costs without indexes: every song is tested against every condition
+    genres = {canonical_text(genre) for genre in song_filter.get('genres', ())}
+    artists = {canonical_text(artist) for artist in song_filter.get('artists', ())}
+    bounds = [(column, song_filter.get(low), song_filter.get(high), scale) for column, low, high, scale in (
+        ('year', 'min_year', 'max_year', 1), ('duration_ms', 'min_duration_seconds', 'max_duration_seconds', 1000),
+        ('bitrate', 'min_bitrate', 'max_bitrate', 1))]
+    oldest = None
+    if song_filter.get('added_within_days') is not None:
+        oldest = (NOW - song_filter['added_within_days'] * 86400) * 1_000_000_000
+    text = song_filter.get('path_contains', "").casefold()
+    rows = []
+    for row, song in enumerate(songs):
+        if genres and not genres & {canonical_text(g) for g in GENRE_SEPARATORS.split(song.get('genre', ""))}:
+            continue
+        if artists and canonical_text(song['artist']) not in artists:
+            continue
+        if any(low is not None or high is not None for _, low, high, _ in bounds):
+            values = [(song.get(column), low, high, scale) for column, low, high, scale in bounds
+                      if low is not None or high is not None]
+            if any(value is None or (low is not None and value < low * scale) or (high is not None and value > high * scale)
+                   for value, low, high, scale in values):
+                continue
+        if oldest is not None and song['mtime'] < oldest:
+            continue
+        if text and text not in song['filepath'].casefold():
+            continue
+        rows.append(row)
+    return rows
+
+
+def best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    songs = make_songs(arguments.songs)
+    table = SongTable.from_songs(songs)
+    assert all(table.integers['year'][row] != MISSING_SIGNED for row, song in enumerate(songs) if 'year' in song)
+    print(f"Filtering {len(table)} songs (best of {arguments.repeat} runs):")
+    print(f"  {'filter':<22} {'matches':>8} {'linear':>10} {'index build':>12} {'indexed':>10}")
+    index = LibraryIndex(table)
+    for name, song_filter in FILTERS.items():
+        linear_seconds, expected = best_time(lambda: linear_query(songs, song_filter), 1)
+        start = time.perf_counter()
+        index.query(song_filter, NOW) # Builds the indexes this filter needs, if an earlier filter did not
+        build_seconds = time.perf_counter() - start
+        indexed_seconds, rows = best_time(lambda: index.query(song_filter, NOW), arguments.repeat)
+        status = "" if rows == expected else "  MISMATCH"
+        print(f"  {name:<22} {len(rows):>8} {linear_seconds * 1000:>8.1f}ms {build_seconds * 1000:>10.1f}ms "
+              f"{indexed_seconds * 1000:>8.2f}ms{status}")
@@ -0,0 +1,60 @@
+"""
+Runs the track resolution loop against the local mock Spotify API, sequentially and with the concurrent resolver,
+and checks that both produce the same URIs in the same order.
+
+Usage: python benchmarks/bench_resolver.py [number_of_songs] [latency_ms] [server_rate_limit] [workers] [client_rate_limit]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import spotipy
+from spotify_resolver import TokenBucket, RateLimitedSpotify, build_requests_session, resolve_in_order
+from Spotify_GeneratePlaylist import find_spotify_track_uri
+from mock_spotify_server import MockSpotifyServer
+
+
+def make_songs(number_of_songs):
+    return [{'artist': f"Artist {index % 500}", 'title': f"Song {index}", 'album': ""} for index in range(number_of_songs)]
+
+
+def make_client(server, workers=1):
+    sp = spotipy.Spotify(auth='mock-token', requests_session=build_requests_session(workers))
+    sp.prefix = server.api_prefix
+    return sp
+
+
+def run(label, songs, sp, workers):
+    start = time.perf_counter()
+    uris = [uri for _, _, uri, error in resolve_in_order(songs, lambda song: find_spotify_track_uri(sp, song), workers)]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed:7.2f} s  {len(songs) / elapsed:8.1f} songs/s")
+    return uris
+
+
+if __name__ == "__main__":
+    number_of_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    server_rate_limit = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else 16
+    client_rate_limit = float(sys.argv[5]) if len(sys.argv) > 5 else 120
+
+    server = MockSpotifyServer(latency=latency, rate_limit=server_rate_limit, not_found_every=7)
+    server.start_in_background()
+    songs = make_songs(number_of_songs)
+    print(f"Resolving {number_of_songs} songs against {server.api_prefix} "
+          f"(latency {latency * 1000:.0f} ms, server limit {server_rate_limit}/s)\n")
+
+    # The sequential run also goes through RateLimitedSpotify so that it survives the server's 429s
+    sequential_client = RateLimitedSpotify(make_client(server), TokenBucket(client_rate_limit))
+    sequential_uris = run("sequential", songs, sequential_client, 1)
+
+    concurrent_client = RateLimitedSpotify(make_client(server, workers), TokenBucket(client_rate_limit))
+    concurrent_uris = run(f"concurrent ({workers} workers, {client_rate_limit:g}/s)", songs, concurrent_client, workers)
+    concurrent_client.print_stats()
+    print(f"Server: {server.counters['requests']} requests, {server.counters['rate_limited']} answered with 429.")
+
+    assert concurrent_uris == sequential_uris, "Concurrent results differ from the sequential results"
+    print("Concurrent results match the sequential results, in input order.")
+    server.shutdown()
@@ -0,0 +1,95 @@
+"""
+Compares the original playlist selection loop with playlist_sampler.select_songs on a synthetic library.
+
+Usage: python benchmarks/bench_sampler.py [number_of_songs] [songs_to_pick] [max_songs_per_artist]
+The original loop is quadratic; keep the sizes moderate (the defaults take well under a minute).
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from song_table import SongTable
+from playlist_sampler import select_songs
+
+
+def make_songs(number_of_songs, seed=1):
+    rng = random.Random(seed)
+    artist_count = max(1, number_of_songs // 30)
+    songs = []
+    for index in range(number_of_songs):
+        artist = f"Artist {rng.randrange(artist_count)}"
+        songs.append({
+            'artist': artist,
+            'title': f"Song {index}",
+            'album': f"{artist} album {rng.randrange(3)}",
+            'filepath': f"/music/{artist}/{index}.mp3",
+            'mtime': 1_600_000_000_000_000_000 + rng.randrange(10 ** 15)
+        })
+    return songs
+
+
+def original_selection(local_songs, actual_num_to_add, max_songs_per_artist):
+    # The selection loop from search_and_add_tracks_to_playlist before playlist_sampler, on a list of dicts
+    songs_by_artist = {}
+    for song in local_songs:
+        songs_by_artist.setdefault(song['artist'], []).append(song)
+    selected_local_songs = []
+    artists = list(songs_by_artist.keys())
+    random.shuffle(artists)
+    current_artist_idx = 0
+    while len(selected_local_songs) < actual_num_to_add and artists:
+        artist_name = artists[current_artist_idx % len(artists)]
+        artist_songs = songs_by_artist[artist_name]
+        songs_already_taken_from_artist = sum(1 for s in selected_local_songs if s['artist'] == artist_name)
+        if songs_already_taken_from_artist < max_songs_per_artist and artist_songs:
+            available_songs_for_artist = [s for s in artist_songs if s not in selected_local_songs]
+            if available_songs_for_artist:
+                selected_local_songs.append(random.choice(available_songs_for_artist))
+        current_artist_idx += 1
+        if current_artist_idx >= len(artists) * max_songs_per_artist and len(selected_local_songs) < actual_num_to_add:
+            break
+        if len(selected_local_songs) == len(set(frozenset(s.items()) for s in local_songs)):
+            break
+    return selected_local_songs
+
+
+def check_selection(selection, num_songs, max_songs_per_artist):
+    per_artist = {}
+    for song in selection:
+        per_artist[song['artist']] = per_artist.get(song['artist'], 0) + 1
+    assert len(selection) <= num_songs
+    assert len({song['filepath'] for song in selection}) == len(selection), "A song was picked twice"
+    assert max(per_artist.values(), default=0) <= max_songs_per_artist, "Artist limit exceeded"
+
+
+def timed(label, select):
+    start = time.perf_counter()
+    selection = select()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed:9.3f} s  picked {len(selection)}")
+    return selection
+
+
+if __name__ == "__main__":
+    number_of_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    songs_to_pick = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    max_songs_per_artist = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    songs = make_songs(number_of_songs)
+    table = SongTable.from_songs(songs)
+    print(f"Library of {number_of_songs} songs by {len(table.artists)} artists, picking {songs_to_pick} "
+          f"(max {max_songs_per_artist} per artist)\n")
+
+    selection = timed("original loop", lambda: original_selection(songs, songs_to_pick, max_songs_per_artist))
+    check_selection(selection, songs_to_pick, max_songs_per_artist)
+    for weighting in (None, 'albums', 'recent'):
+        selection = timed(f"select_songs (weighting={weighting})",
+                          lambda: select_songs(table, songs_to_pick, max_songs_per_artist, random.Random(7), weighting))
+        check_selection(selection, songs_to_pick, max_songs_per_artist)
+
+    first = [song['filepath'] for song in select_songs(table, songs_to_pick, max_songs_per_artist, random.Random(7))]
+    second = [song['filepath'] for song in select_songs(table, songs_to_pick, max_songs_per_artist, random.Random(7))]
+    assert first == second, "The same seed gave a different selection"
+    print("\nSelections respect the artist limit and are reproducible with a fixed seed.")
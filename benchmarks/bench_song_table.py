@@ -0,0 +1,94 @@
+"""
+Compares the memory use and load time of the JSON cache loaded as a list of dictionaries
+against the same cache loaded into a SongTable, both from the JSON file and from its binary snapshot.
+
+Usage: python benchmarks/bench_song_table.py [number_of_songs]
+"""
+import os
+import sys
+import gc
+import json
+import time
+import random
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from song_table import SongTable, load_song_table
+
+
+def generate_cache_file(path, number_of_songs, seed=1):
+    """
+    Writes a synthetic cache file shaped like a real library: ~12 songs per album, ~3 albums per artist.
+    """
+    rng = random.Random(seed)
+    songs = []
+    album_count = max(1, number_of_songs // 12)
+    for index in range(number_of_songs):
+        album_index = rng.randrange(album_count)
+        artist = f"Artist {album_index // 3}"
+        album = f"Album {album_index}"
+        songs.append({
+            'artist': artist,
+            'title': f"Song title {index}",
+            'album': album,
+            'filepath': f"/mnt/music/{artist}/{album}/{index:06d} Song title {index}.flac",
+            'size': rng.randrange(3_000_000, 60_000_000),
+            'mtime': 1_600_000_000_000_000_000 + rng.randrange(10 ** 15),
+            'inode': rng.randrange(10 ** 9)
+        })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(songs, f, indent=4)
+
+
+def measure(label, load, repeats=3):
+    """
+    Reports the best of several timed runs of load(), then the memory still held by its result
+    (measured in a separate run, since tracing allocations slows the load down).
+    """
+    timings = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        result = load()
+        timings.append(time.perf_counter() - start)
+        del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {min(timings):8.2f} s  retained {retained / 2 ** 20:8.1f} MiB  peak {peak / 2 ** 20:8.1f} MiB")
+    return result
+
+
+def load_dicts_grouped(cache_file):
+    # What the scripts did before: list of dicts, then group by artist
+    with open(cache_file, 'r', encoding='utf-8') as f:
+        songs = json.load(f)
+    songs_by_artist = {}
+    for song in songs:
+        songs_by_artist.setdefault(song['artist'], []).append(song)
+    return songs, songs_by_artist
+
+
+if __name__ == "__main__":
+    number_of_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_file = os.path.join(temp_dir, 'local_music_cache.json')
+        print(f"Generating a synthetic cache with {number_of_songs} songs...")
+        generate_cache_file(cache_file, number_of_songs)
+
+        print()
+        dicts = measure("list of dicts + grouping", lambda: load_dicts_grouped(cache_file))
+        del dicts
+        measure("SongTable from JSON (fallback)", lambda: SongTable.from_json_file(cache_file))
+        load_song_table(cache_file) # Writes the snapshot next to the cache
+        table = measure("SongTable from snapshot", lambda: load_song_table(cache_file))
+
+        # Sanity check: the view returns the same data as the cache
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            first_song = json.load(f)[0]
+        assert dict(table[0]) == first_song, "SongTable row does not match the cache entry"
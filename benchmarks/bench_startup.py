@@ -0,0 +1,69 @@
+"""
+Measures the cold-start time of spotify_library.py subcommands that do not talk to Spotify,
+and lists the heavy modules each one imports (they should not load spotipy, and 'stats' not even tinytag).
+
+Every command runs in a fresh interpreter, as it would from a shell. A synthetic library is generated
+and scanned once first so that 'scan' and 'stats' work on a warm cache.
+
+Usage: python benchmarks/bench_startup.py [number_of_files] [runs]
+"""
+import os
+import sys
+import statistics
+import subprocess
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPOSITORY_DIR)
+from synthetic_library import generate_library
+
+CLI = os.path.join(REPOSITORY_DIR, 'spotify_library.py')
+HEAVY_MODULES = ('spotipy', 'requests', 'tinytag', 'sqlite3', 'concurrent.futures.process')
+
+
+def imported_modules(command):
+    """
+    Returns the names of the modules the command imports, from python -X importtime.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', CLI] + command,
+                            capture_output=True, text=True, check=True)
+    return {line.split('|')[-1].strip() for line in result.stderr.splitlines() if line.startswith('import time:')}
+
+
+def time_command(command, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, CLI] + command, stdout=subprocess.DEVNULL, check=True)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+if __name__ == "__main__":
+    number_of_files = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        library = os.path.join(work_dir, 'library')
+        cache = os.path.join(work_dir, 'local_music_cache.json')
+        generate_library(library, number_of_files)
+        subprocess.run([sys.executable, CLI, 'scan', '--library', library, '--cache', cache],
+                       stdout=subprocess.DEVNULL, check=True)
+
+        interpreter_durations = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', 'pass'], check=True)
+            interpreter_durations.append(time.perf_counter() - start)
+
+        print(f"Cold start of spotify_library.py with a {number_of_files}-file library (median of {runs} runs):")
+        print(f"  {'python -c pass':<36} {statistics.median(interpreter_durations) * 1000:8.1f} ms")
+        print(f"  {'--help':<36} {time_command(['--help'], runs) * 1000:8.1f} ms")
+        for command in (['stats', '--cache', cache],
+                        ['scan', '--library', library, '--cache', cache],
+                        ['scan', '--incremental', '--library', library, '--cache', cache]):
+            heavy = sorted(module for module in imported_modules(command) if module in HEAVY_MODULES)
+            label = ' '.join(argument for argument in command if not argument.startswith(work_dir))
+            print(f"  {label:<36} {time_command(command, runs) * 1000:8.1f} ms   heavy imports: {', '.join(heavy) or 'none'}")
@@ -0,0 +1,68 @@
+"""
+Compares tag reading with TinyTag (the default scan) against the header-only reads of header_tags.py
+(scan --header-only) on the same tree: seconds and bytes read per file, and the songs each one finds.
+
+Bytes are taken from the read counter of /proc/self/io where available (Linux), which counts what the
+process actually requested from the file system, so both readers are measured the same way.
+Point --library at a tree on the network share to measure what matters; otherwise a synthetic library is
+generated. Reads of a local tree are served from the page cache after the first pass, so compare the
+bytes there rather than the seconds.
+
+Usage: python benchmarks/bench_tag_reading.py [--library PATH | --files N --padding BYTES] [--workers N]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+from local_library import scan_audio_files, read_song_infos
+from header_tags import HeaderReadStats
+from synthetic_library import generate_library
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="TinyTag against header-only tag reading.")
+    parser.add_argument('--library', help="existing music library to read (default: a synthetic library)")
+    parser.add_argument('--files', type=int, default=1_000, help="audio files in the synthetic library")
+    parser.add_argument('--padding', type=int, default=100_000, help="audio bytes after the tag of each synthetic file")
+    parser.add_argument('--workers', type=int, default=1, help="files read at the same time")
+    return parser.parse_args()
+
+
+def bytes_read_by_process():
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def measure(label, files, workers, header_stats=None):
+    bytes_before = bytes_read_by_process()
+    start = time.perf_counter()
+    songs = sum(1 for _, song_info in read_song_infos(files, workers, header_stats=header_stats) if song_info)
+    elapsed = time.perf_counter() - start
+    bytes_after = bytes_read_by_process()
+    per_file = f"{(bytes_after - bytes_before) / len(files) / 1024:10.1f} KB" if bytes_before is not None else "         n/a"
+    print(f"  {label:<12} {elapsed / len(files) * 1000:8.3f} ms/file {per_file}/file {songs:>8} songs")
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    with tempfile.TemporaryDirectory() as work_dir:
+        library = arguments.library
+        if not library:
+            library = os.path.join(work_dir, 'library')
+            generate_library(library, arguments.files, padding_bytes=arguments.padding)
+        files = [(filepath, stat_result) for filepath, stat_result in scan_audio_files(library) if filepath]
+        print(f"Reading the tags of {len(files)} audio files in {library} with {arguments.workers} workers:")
+        measure('tinytag', files, arguments.workers)
+        header_stats = HeaderReadStats()
+        measure('header-only', files, arguments.workers, header_stats)
+        print(f"  {header_stats.summary()}")
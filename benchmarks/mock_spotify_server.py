@@ -0,0 +1,411 @@
+"""
+Local stand-in for the Spotify Web API, for testing and benchmarking without a real account.
+
+Answers search (tracks, albums and artists), album track lists, the current user's profile, following artists
+(and listing them with cursor paging), listing, creating and reading playlists and adding and removing their
+tracks (with snapshot IDs), after a configurable latency.
+Searches return deterministic results; follows and playlists are kept in memory for the life of the server.
+A server-side rate limit answers excess requests with 429 and a Retry-After header, like Spotify does.
+Point a spotipy client at it by setting sp.prefix = server.api_prefix.
+
+Usage: python benchmarks/mock_spotify_server.py [port] [latency_ms] [requests_per_second]
+"""
+import re
+import sys
+import json
+import time
+import zlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+QUERY_FIELD_PATTERN = re.compile(r'(\w+):"([^"]*)"')
+ISRC_QUERY_PATTERN = re.compile(r'^isrc:(\w+)$')
+
+MOCK_USER_ID = 'mock-user'
+
+# (method, path pattern, handler name); path groups are passed to the handler after the query parameters.
+# Both the older (me/following, playlists/{id}/tracks) and newer (me/library, playlists/{id}/items)
+# endpoints used by different spotipy versions are answered.
+ROUTES = [
+    ('GET', r'/v1/search', 'handle_search'),
+    ('GET', r'/v1/me', 'handle_me'),
+    ('GET', r'/v1/me/following', 'handle_followed_artists'),
+    ('PUT', r'/v1/me/following', 'handle_follow'),
+    ('PUT', r'/v1/me/library', 'handle_save_to_library'),
+    ('POST', r'/v1/users/([^/]+)/playlists', 'handle_create_playlist'),
+    ('GET', r'/v1/albums', 'handle_albums'),
+    ('GET', r'/v1/albums/([^/]+)/tracks', 'handle_album_tracks'),
+    ('GET', r'/v1/me/playlists', 'handle_user_playlists'),
+    ('GET', r'/v1/playlists/([^/]+)', 'handle_playlist'),
+    ('GET', r'/v1/playlists/([^/]+)/(?:tracks|items)', 'handle_playlist_items'),
+    ('POST', r'/v1/playlists/([^/]+)/(?:tracks|items)', 'handle_add_to_playlist'),
+    ('DELETE', r'/v1/playlists/([^/]+)/(?:tracks|items)', 'handle_remove_from_playlist'),
+]
+
+
+def find_route(method, path):
+    """
+    Returns (handler name, path groups) of the route matching the request, or (None, ()).
+    """
+    for route_method, pattern, handler_name in ROUTES:
+        match = re.fullmatch(pattern, path)
+        if route_method == method and match:
+            return handler_name, match.groups()
+    return None, ()
+
+
+def stable_id(*parts):
+    """
+    Returns a deterministic 22-character ID (like a Spotify ID) for the given strings.
+    """
+    text = '\x1f'.join(parts)
+    return f"{zlib.crc32(text.encode('utf-8')):010d}{zlib.adler32(text.encode('utf-8')):012d}"[:22]
+
+
+def snapshot_id(playlist_id, playlist):
+    return stable_id('snapshot', playlist_id, str(playlist['version']))
+
+
+class MockSpotifyServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server holding the simulation settings and request counters.
+    not_found_every makes every Nth distinct query return no results (0 = everything is found).
+    album_catalog(artist, album) returns the [(title, track number, duration in ms), ...] of an album, so that
+    album searches and track lists can be answered; without it, album searches find nothing.
+    """
+    daemon_threads = True
+    request_queue_size = 128 # The default backlog of 5 drops connections from many concurrent workers
+
+    def __init__(self, port=0, latency=0.0, rate_limit=None, retry_after=1, not_found_every=0, album_catalog=None):
+        super().__init__(('127.0.0.1', port), MockSpotifyRequestHandler)
+        self.album_catalog = album_catalog
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.not_found_every = not_found_every
+        self.counters = {'requests': 0, 'rate_limited': 0}
+        self.counters_by_endpoint = {}
+        self.artist_names = {} # Artist ID -> name, for artists returned by searches
+        self.albums = {} # Album ID -> (artist, album name), for albums returned by searches
+        self.followed_artist_ids = [] # In the order they were followed
+        self.playlists = {} # Playlist ID -> {'name', 'owner', 'tracks', 'version'}
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+
+    @property
+    def api_prefix(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/"
+
+    def count(self, endpoint):
+        with self.lock:
+            self.counters['requests'] += 1
+            self.counters_by_endpoint[endpoint] = self.counters_by_endpoint.get(endpoint, 0) + 1
+
+    def is_rate_limited(self):
+        """
+        Fixed one-second window limit: more than rate_limit requests in the current window get a 429.
+        """
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            if self.window_count > self.rate_limit:
+                self.counters['rate_limited'] += 1
+                return True
+            return False
+
+    def is_found(self, *parts):
+        if not self.not_found_every:
+            return True
+        return zlib.crc32('\x1f'.join(parts).encode('utf-8')) % self.not_found_every != 0
+
+    def start_in_background(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class MockSpotifyRequestHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass # Keep benchmark output readable
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_empty(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def handle_request(self, method):
+        url = urlparse(self.path)
+        path = url.path.rstrip('/')
+        handler_name, path_arguments = find_route(method, path)
+        # Counted per route, so that IDs in the path don't make every request a separate endpoint
+        endpoint = f"{method} {handler_name or path}"
+        self.server.count(endpoint)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        body = None
+        if int(self.headers.get('Content-Length') or 0):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.server.is_rate_limited():
+            self.send_json(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}},
+                           {'Retry-After': str(self.server.retry_after)})
+            return
+        if handler_name is None:
+            self.send_json(404, {'error': {'status': 404, 'message': f'No mock for {endpoint}'}})
+            return
+        getattr(self, handler_name)(parse_qs(url.query), body, *path_arguments)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+    def handle_search(self, params, body):
+        query = params.get('q', [""])[0]
+        search_type = params.get('type', ['track'])[0]
+        limit = int(params.get('limit', ['10'])[0])
+        fields = dict(QUERY_FIELD_PATTERN.findall(query))
+        artist = fields.get('artist', "")
+        artist_id = stable_id('artist', artist)
+
+        if search_type == 'artist':
+            items = []
+            if self.server.is_found('artist', artist):
+                with self.server.lock:
+                    self.server.artist_names[artist_id] = artist
+                items.append({'id': artist_id, 'name': artist, 'uri': f"spotify:artist:{artist_id}"})
+            self.send_json(200, {'artists': {'items': items[:limit], 'total': len(items)}})
+            return
+
+        if search_type == 'album':
+            album = fields.get('album', "")
+            items = []
+            if self.server.album_catalog and self.server.album_catalog(artist, album) \
+                    and self.server.is_found('album', artist, album):
+                album_id = stable_id('album', artist, album)
+                with self.server.lock:
+                    self.server.albums[album_id] = (artist, album)
+                items.append({'id': album_id, 'name': album, 'uri': f"spotify:album:{album_id}",
+                              'artists': [{'id': artist_id, 'name': artist}]})
+            self.send_json(200, {'albums': {'items': items[:limit], 'total': len(items)}})
+            return
+
+        isrc_match = ISRC_QUERY_PATTERN.match(query)
+        if isrc_match:
+            # Exact ISRC lookups: the mock cannot know the artist, so the track is named after the ISRC
+            isrc = isrc_match.group(1)
+            items = []
+            if self.server.is_found('isrc', isrc):
+                track_id = stable_id('isrc', isrc)
+                items.append({
+                    'id': track_id,
+                    'uri': f"spotify:track:{track_id}",
+                    'name': isrc,
+                    'artists': [{'id': stable_id('artist', isrc), 'name': isrc}],
+                    'album': {'id': stable_id('album', isrc), 'name': f"{isrc} album"},
+                    'external_ids': {'isrc': isrc}
+                })
+            self.send_json(200, {'tracks': {'items': items[:limit], 'total': len(items)}})
+            return
+
+        title = fields.get('track', "")
+        items = []
+        if self.server.is_found('track', artist, title):
+            track_id = stable_id('track', artist, title)
+            items.append({
+                'id': track_id,
+                'uri': f"spotify:track:{track_id}",
+                'name': title,
+                'artists': [{'id': artist_id, 'name': artist}],
+                'album': {'id': stable_id('album', artist), 'name': f"{artist} album"}
+            })
+        self.send_json(200, {'tracks': {'items': items[:limit], 'total': len(items)}})
+
+    def album_track_items(self, album_id):
+        artist, album = self.server.albums[album_id]
+        return [{'id': stable_id('track', artist, title), 'uri': f"spotify:track:{stable_id('track', artist, title)}",
+                 'name': title, 'track_number': track_number, 'disc_number': 1, 'duration_ms': duration_ms,
+                 'artists': [{'id': stable_id('artist', artist), 'name': artist}]}
+                for title, track_number, duration_ms in self.server.album_catalog(artist, album)]
+
+    def handle_albums(self, params, body):
+        album_ids = params.get('ids', [""])[0].split(',')
+        if len(album_ids) > 20:
+            self.send_json(400, {'error': {'status': 400, 'message': 'Too many ids requested'}})
+            return
+        albums = []
+        for album_id in album_ids:
+            if album_id not in self.server.albums:
+                albums.append(None)
+                continue
+            tracks = self.album_track_items(album_id)
+            next_url = f"{self.server.api_prefix}albums/{album_id}/tracks?offset=50&limit=50" if len(tracks) > 50 else None
+            albums.append({'id': album_id, 'name': self.server.albums[album_id][1],
+                           'tracks': {'items': tracks[:50], 'total': len(tracks), 'next': next_url}})
+        self.send_json(200, {'albums': albums})
+
+    def handle_album_tracks(self, params, body, album_id):
+        if album_id not in self.server.albums:
+            self.send_json(404, {'error': {'status': 404, 'message': 'Invalid album id'}})
+            return
+        limit = int(params.get('limit', ['20'])[0])
+        offset = int(params.get('offset', ['0'])[0])
+        tracks = self.album_track_items(album_id)
+        next_url = f"{self.server.api_prefix}albums/{album_id}/tracks?offset={offset + limit}&limit={limit}" \
+            if offset + limit < len(tracks) else None
+        self.send_json(200, {'items': tracks[offset:offset + limit], 'total': len(tracks), 'next': next_url})
+
+    def handle_me(self, params, body):
+        self.send_json(200, {'id': MOCK_USER_ID, 'display_name': 'Mock User', 'uri': f"spotify:user:{MOCK_USER_ID}"})
+
+    def handle_followed_artists(self, params, body):
+        # Cursor paging like Spotify: 'after' is the last artist ID of the previous page
+        limit = int(params.get('limit', ['20'])[0])
+        after = params.get('after', [None])[0]
+        with self.server.lock:
+            followed = list(self.server.followed_artist_ids)
+            names = dict(self.server.artist_names)
+        start = followed.index(after) + 1 if after in followed else 0
+        page = followed[start:start + limit]
+        has_next = start + limit < len(followed)
+        items = [{'id': artist_id, 'name': names.get(artist_id, artist_id), 'uri': f"spotify:artist:{artist_id}"}
+                 for artist_id in page]
+        self.send_json(200, {'artists': {
+            'items': items,
+            'total': len(followed),
+            'limit': limit,
+            'cursors': {'after': page[-1] if has_next else None},
+            'next': f"{self.server.api_prefix}me/following?type=artist&limit={limit}&after={page[-1]}" if has_next else None
+        }})
+
+    def follow_artists(self, artist_ids):
+        with self.server.lock:
+            for artist_id in artist_ids:
+                if artist_id not in self.server.followed_artist_ids:
+                    self.server.followed_artist_ids.append(artist_id)
+
+    def handle_follow(self, params, body):
+        artist_ids = params.get('ids', [""])[0].split(',') if params.get('ids') else (body or {}).get('ids', [])
+        self.follow_artists([artist_id for artist_id in artist_ids if artist_id])
+        self.send_empty(204)
+
+    def handle_save_to_library(self, params, body):
+        uris = params.get('uris', [""])[0].split(',')
+        self.follow_artists([uri.rsplit(':', 1)[-1] for uri in uris if uri.startswith('spotify:artist:')])
+        self.send_empty(200)
+
+    def handle_create_playlist(self, params, body, user_id):
+        body = body or {}
+        with self.server.lock:
+            playlist_id = stable_id('playlist', str(len(self.server.playlists)), body.get('name', ""))
+            self.server.playlists[playlist_id] = {'name': body.get('name', ""), 'owner': user_id, 'tracks': [],
+                                                  'version': 0}
+        self.send_json(201, {'id': playlist_id, 'name': body.get('name', ""), 'public': body.get('public', True),
+                             'uri': f"spotify:playlist:{playlist_id}", 'owner': {'id': user_id}})
+
+    def handle_add_to_playlist(self, params, body, playlist_id):
+        uris = body.get('uris', []) if isinstance(body, dict) else (body or [])
+        if len(uris) > 100:
+            self.send_json(400, {'error': {'status': 400, 'message': 'Too many ids requested'}})
+            return
+        with self.server.lock:
+            playlist = self.server.playlists.get(playlist_id)
+            if playlist is not None:
+                playlist['tracks'].extend(uris)
+                playlist['version'] += 1
+        if playlist is None:
+            self.send_json(404, {'error': {'status': 404, 'message': 'Invalid playlist Id'}})
+            return
+        self.send_json(201, {'snapshot_id': snapshot_id(playlist_id, playlist)})
+
+    def handle_remove_from_playlist(self, params, body, playlist_id):
+        # Newer spotipy versions send {'items': [...]}, older ones {'tracks': [...]}
+        body = body or {}
+        uris = {item['uri'] for item in body.get('items', body.get('tracks', []))}
+        if len(uris) > 100:
+            self.send_json(400, {'error': {'status': 400, 'message': 'Too many ids requested'}})
+            return
+        with self.server.lock:
+            playlist = self.server.playlists.get(playlist_id)
+            if playlist is not None:
+                playlist['tracks'] = [uri for uri in playlist['tracks'] if uri not in uris]
+                playlist['version'] += 1
+        if playlist is None:
+            self.send_json(404, {'error': {'status': 404, 'message': 'Invalid playlist Id'}})
+            return
+        self.send_json(200, {'snapshot_id': snapshot_id(playlist_id, playlist)})
+
+    def handle_user_playlists(self, params, body):
+        limit = int(params.get('limit', ['50'])[0])
+        offset = int(params.get('offset', ['0'])[0])
+        with self.server.lock:
+            playlists = [{'id': playlist_id, 'name': playlist['name'], 'owner': {'id': playlist['owner']},
+                          'snapshot_id': snapshot_id(playlist_id, playlist),
+                          'tracks': {'total': len(playlist['tracks'])}}
+                         for playlist_id, playlist in self.server.playlists.items()]
+        next_url = f"{self.server.api_prefix}me/playlists?limit={limit}&offset={offset + limit}" \
+            if offset + limit < len(playlists) else None
+        self.send_json(200, {'items': playlists[offset:offset + limit], 'total': len(playlists), 'limit': limit,
+                             'offset': offset, 'next': next_url})
+
+    def handle_playlist(self, params, body, playlist_id):
+        with self.server.lock:
+            playlist = self.server.playlists.get(playlist_id)
+            if playlist is not None:
+                playlist = dict(playlist, tracks=list(playlist['tracks']))
+        if playlist is None:
+            self.send_json(404, {'error': {'status': 404, 'message': 'Invalid playlist Id'}})
+            return
+        self.send_json(200, {'id': playlist_id, 'name': playlist['name'], 'owner': {'id': playlist['owner']},
+                             'snapshot_id': snapshot_id(playlist_id, playlist),
+                             'tracks': {'total': len(playlist['tracks'])}})
+
+    def handle_playlist_items(self, params, body, playlist_id):
+        limit = int(params.get('limit', ['100'])[0])
+        offset = int(params.get('offset', ['0'])[0])
+        with self.server.lock:
+            playlist = self.server.playlists.get(playlist_id)
+            tracks = list(playlist['tracks']) if playlist is not None else None
+        if tracks is None:
+            self.send_json(404, {'error': {'status': 404, 'message': 'Invalid playlist Id'}})
+            return
+        next_url = f"{self.server.api_prefix}playlists/{playlist_id}/items?limit={limit}&offset={offset + limit}" \
+            if offset + limit < len(tracks) else None
+        self.send_json(200, {'items': [{'track': {'uri': uri, 'type': 'track'}} for uri in tracks[offset:offset + limit]],
+                             'total': len(tracks), 'limit': limit, 'offset': offset, 'next': next_url})
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8899
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rate_limit = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    server = MockSpotifyServer(port, latency_ms / 1000, rate_limit)
+    print(f"Mock Spotify API listening on {server.api_prefix} (latency {latency_ms} ms, rate limit {rate_limit or 'none'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,126 @@
+"""
+Generates a synthetic music library: a tree of small MP3 files carrying real ID3v2.4 tags, readable by tinytag.
+
+Layout: <root>/<artist>/<album>/<track> <title>.mp3, 10 tracks per album and 2 albums per artist,
+plus a cover.jpg in every album folder. Every untagged_every-th file has no title tag, so it is skipped by
+the scanners like a badly tagged file would be. Files carry no audio unless padding_bytes is given.
+The same arguments always produce the same tree; a manifest file records them so an existing tree
+is reused instead of being written again.
+
+Usage: python benchmarks/synthetic_library.py <root> [number_of_files] [padding_bytes]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+
+MANIFEST_FILE = '.synthetic_library.json'
+GENRES = ('Rock', 'Pop', 'Jazz', 'Electronic', 'Hip-Hop', 'Classical', 'Folk', 'Metal')
+
+
+def _syncsafe(value):
+    return bytes(((value >> 21) & 0x7f, (value >> 14) & 0x7f, (value >> 7) & 0x7f, value & 0x7f))
+
+
+def id3_tag(frames):
+    """
+    Returns an ID3v2.4 tag holding the given text frames ({'TIT2': 'Title', ...}), encoded as UTF-8.
+    """
+    body = b''
+    for frame_id, text in frames.items():
+        data = b'\x03' + text.encode('utf-8')
+        body += frame_id.encode('ascii') + _syncsafe(len(data)) + b'\x00\x00' + data
+    return b'ID3\x04\x00\x00' + _syncsafe(len(body)) + body
+
+
+def iter_synthetic_songs(number_of_files, seed=1, songs_per_album=10, albums_per_artist=2):
+    """
+    Yields (relative directory, file name, ID3 frames) for every file of the synthetic library.
+    """
+    rng = random.Random(seed)
+    album_count = max(1, -(-number_of_files // songs_per_album))
+    for album_index in range(album_count):
+        artist_index = album_index // albums_per_artist
+        artist = f"Artist {artist_index:05d}"
+        album = f"Album {album_index:06d}"
+        year = str(1960 + rng.randrange(65))
+        genre = GENRES[artist_index % len(GENRES)]
+        directory = os.path.join(artist, album)
+        first = album_index * songs_per_album
+        for track in range(1, min(songs_per_album, number_of_files - first) + 1):
+            index = first + track - 1
+            title = f"Song {index:07d}"
+            frames = {
+                'TIT2': title,
+                'TPE1': artist,
+                'TALB': album,
+                'TRCK': f"{track}/{songs_per_album}",
+                'TDRC': year,
+                'TCON': genre,
+                'TSRC': f"QZSYN{index:07d}",
+                'TLEN': str(rng.randrange(90_000, 420_000))
+            }
+            yield directory, f"{track:02d} {title}.mp3", frames
+
+
+def generate_library(root, number_of_files, seed=1, untagged_every=50, padding_bytes=0):
+    """
+    Writes the synthetic library under root, unless root already holds one generated with the same arguments.
+    An existing tree generated with other arguments (it has a manifest) is replaced; any other non-empty
+    directory is left alone and ValueError is raised.
+    Returns the manifest: the arguments plus the number of audio files, tagged songs and directories written.
+    """
+    settings = {'number_of_files': number_of_files, 'seed': seed, 'untagged_every': untagged_every,
+                'padding_bytes': padding_bytes}
+    manifest_path = os.path.join(root, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('settings') == settings:
+            return manifest
+        shutil.rmtree(root)
+    elif os.path.isdir(root) and os.listdir(root):
+        raise ValueError(f"{root} is not empty and was not created by this generator")
+
+    start = time.perf_counter()
+    padding = b'\x00' * padding_bytes
+    audio_files = 0
+    tagged_songs = 0
+    directories = 0
+    current_directory = None
+    for directory, filename, frames in iter_synthetic_songs(number_of_files, seed):
+        full_directory = os.path.join(root, directory)
+        if directory != current_directory:
+            os.makedirs(full_directory, exist_ok=True)
+            with open(os.path.join(full_directory, 'cover.jpg'), 'wb') as f:
+                f.write(b'\xff\xd8\xff\xd9')
+            current_directory = directory
+            directories += 1
+        audio_files += 1
+        if untagged_every and audio_files % untagged_every == 0:
+            del frames['TIT2']
+        else:
+            tagged_songs += 1
+        with open(os.path.join(full_directory, filename), 'wb') as f:
+            f.write(id3_tag(frames))
+            f.write(padding)
+
+    manifest = {'settings': settings, 'audio_files': audio_files, 'tagged_songs': tagged_songs,
+                'directories': directories, 'generation_seconds': round(time.perf_counter() - start, 3)}
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    root = sys.argv[1]
+    number_of_files = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    padding_bytes = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    manifest = generate_library(root, number_of_files, padding_bytes=padding_bytes)
+    print(f"{root}: {manifest['audio_files']} audio files ({manifest['tagged_songs']} with title and artist) "
+          f"in {manifest['directories']} album folders, generated in {manifest['generation_seconds']} s.")
@@ -0,0 +1,550 @@
+import os
+import re
+import struct
+
+# Header-only tag reading, used by library scans with header_only=True (e.g. 'spotify_library.py scan --header-only').
+# TinyTag reads whatever it needs to compute a duration, which on an NFS/SMB share can mean pulling a good part
+# of every file over the network. Here only the tag regions are read:
+#   MP3   the ID3v2 tag at the start (and the ID3v1 tag in the last 128 bytes if it has no title/artist),
+#         plus the first MPEG frame after it for the duration when there is no TLEN frame
+#   FLAC  the metadata blocks (STREAMINFO and VORBIS_COMMENT)
+#   M4A   the 'moov' atom (mvhd and the udta/meta/ilst items), wherever it is in the file
+#   Ogg   the first pages up to the comment header, plus the last page for the duration (Vorbis and Opus)
+# The bitrate is not read from the audio but averaged: the size of the audio (or of the file) over the duration.
+# Reads go through a WindowReader, which fetches at least READ_SIZE bytes at a time so a tag usually costs
+# one or two large sequential reads, seeks over embedded pictures, track tables and audio instead of reading
+# them, and stops at BYTE_BUDGET bytes per file. Other formats are left to TinyTag.
+
+READ_SIZE = 16 * 1024
+BYTE_BUDGET = 1024 * 1024
+
+ID3V1_SIZE = 128
+
+# ID3v2 text frames (v2.3/v2.4 and v2.2 IDs) -> tag name
+ID3_TEXT_FRAMES = {
+    b'TIT2': 'title', b'TPE1': 'artist', b'TALB': 'album', b'TRCK': 'track_number', b'TSRC': 'isrc', b'TLEN': 'tlen',
+    b'TCON': 'genre', b'TDRC': 'year', b'TYER': 'year',
+    b'TT2': 'title', b'TP1': 'artist', b'TAL': 'album', b'TRK': 'track_number', b'TRC': 'isrc', b'TLE': 'tlen',
+    b'TCO': 'genre', b'TYE': 'year'
+}
+VORBIS_COMMENT_FIELDS = {'TITLE': 'title', 'ARTIST': 'artist', 'ALBUM': 'album', 'TRACKNUMBER': 'track_number',
+                         'ISRC': 'isrc', 'GENRE': 'genre', 'DATE': 'year'}
+MP4_ITEMS = {b'\xa9nam': 'title', b'\xa9ART': 'artist', b'\xa9alb': 'album', b'\xa9gen': 'genre', b'\xa9day': 'year'}
+
+# The standard ID3v1 genres, which ID3v2 (as "(17)" or "17") and MP4 ('gnre') tags can refer to by number
+ID3V1_GENRES = (
+    'Blues', 'Classic Rock', 'Country', 'Dance', 'Disco', 'Funk', 'Grunge', 'Hip-Hop', 'Jazz', 'Metal', 'New Age',
+    'Oldies', 'Other', 'Pop', 'R&B', 'Rap', 'Reggae', 'Rock', 'Techno', 'Industrial', 'Alternative', 'Ska',
+    'Death Metal', 'Pranks', 'Soundtrack', 'Euro-Techno', 'Ambient', 'Trip-Hop', 'Vocal', 'Jazz+Funk', 'Fusion',
+    'Trance', 'Classical', 'Instrumental', 'Acid', 'House', 'Game', 'Sound Clip', 'Gospel', 'Noise', 'AlternRock',
+    'Bass', 'Soul', 'Punk', 'Space', 'Meditative', 'Instrumental Pop', 'Instrumental Rock', 'Ethnic', 'Gothic',
+    'Darkwave', 'Techno-Industrial', 'Electronic', 'Pop-Folk', 'Eurodance', 'Dream', 'Southern Rock', 'Comedy',
+    'Cult', 'Gangsta', 'Top 40', 'Christian Rap', 'Pop/Funk', 'Jungle', 'Native American', 'Cabaret', 'New Wave',
+    'Psychadelic', 'Rave', 'Showtunes', 'Trailer', 'Lo-Fi', 'Tribal', 'Acid Punk', 'Acid Jazz', 'Polka', 'Retro',
+    'Musical', 'Rock & Roll', 'Hard Rock'
+)
+ID3_GENRE_REFERENCE = re.compile(r'^\((\d+)\)(.*)$')
+
+# MPEG audio frame header tables, indexed by the header's version bits (3 = MPEG 1, 2 = MPEG 2, 0 = MPEG 2.5)
+MPEG_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+MPEG1_BITRATES = {
+    3: (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448), # Layer I
+    2: (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),    # Layer II
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)      # Layer III
+}
+MPEG2_BITRATES = {
+    3: (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    1: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+}
+
+
+class HeaderTagError(Exception):
+    """
+    A file that does not have the structure of its format, or whose tags do not fit in the byte budget.
+    """
+
+
+class WindowReader:
+    """
+    Reads byte ranges of an open file through one cached window of at least READ_SIZE bytes.
+    Counts the bytes actually read and raises HeaderTagError rather than read past byte_budget.
+    """
+
+    def __init__(self, f, file_size, byte_budget=BYTE_BUDGET):
+        self.f = f
+        self.file_size = file_size
+        self.byte_budget = byte_budget
+        self.bytes_read = 0
+        self.window = b''
+        self.window_offset = 0
+
+    def read(self, offset, length):
+        """
+        Returns the length bytes at offset, or fewer at the end of the file.
+        """
+        length = max(0, min(length, self.file_size - offset))
+        start = offset - self.window_offset
+        if 0 <= start and start + length <= len(self.window):
+            return self.window[start:start + length]
+        remaining_budget = self.byte_budget - self.bytes_read
+        if length > remaining_budget:
+            raise HeaderTagError(f"the tags do not fit in the byte budget of {self.byte_budget} bytes")
+        size = min(max(length, READ_SIZE), remaining_budget, self.file_size - offset)
+        self.f.seek(offset)
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.f.read(size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        self.bytes_read += len(data)
+        self.window = bytes(data)
+        self.window_offset = offset
+        return self.window[:length]
+
+    def read_exact(self, offset, length):
+        data = self.read(offset, length)
+        if len(data) < length:
+            raise HeaderTagError(f"truncated at byte {offset + len(data)}")
+        return data
+
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_id3_text(data):
+    """
+    Returns the first value of an ID3v2 text frame.
+    """
+    if not data:
+        return ""
+    encoding, text = data[0], data[1:]
+    if encoding in (1, 2):
+        text = text[:len(text) - len(text) % 2]
+        value = text.decode('utf-16' if encoding == 1 else 'utf-16-be', 'replace')
+    else:
+        value = text.decode('utf-8' if encoding == 3 else 'latin-1', 'replace')
+    return value.split('\x00')[0].strip()
+
+
+def id3_genre(value):
+    """
+    Returns the genre name of an ID3v2 genre frame, resolving numeric references like "(8)" or "8" to "Jazz".
+    Unknown numbers give "".
+    """
+    reference = ID3_GENRE_REFERENCE.match(value)
+    if reference:
+        # In "(8)Bebop" the name refines the number; the number is used, as TinyTag does
+        number, refinement = int(reference.group(1)), reference.group(2).strip()
+        return ID3V1_GENRES[number] if number < len(ID3V1_GENRES) else refinement
+    if value.isdigit():
+        return ID3V1_GENRES[int(value)] if int(value) < len(ID3V1_GENRES) else ""
+    return value
+
+
+def _read_id3v2_frames(read, position, end, major, tags):
+    """
+    Reads the text frames between position and end into tags, with read(offset, length) returning the tag's bytes.
+    Other frames (pictures, lyrics, private data) are skipped without being read.
+    Raises HeaderTagError if the file ends inside the tag, so a cut-off frame does not give a cut-off value.
+    """
+    id_size, header_size = (3, 6) if major == 2 else (4, 10)
+    while position + header_size <= end:
+        header = read(position, header_size)
+        if len(header) < header_size:
+            raise HeaderTagError(f"truncated ID3v2 frame at byte {position}")
+        if not header[:id_size].isalnum():
+            break # Padding, or the end of the valid frames
+        if major == 2:
+            frame_id, frame_size, flags = header[:3], int.from_bytes(header[3:6], 'big'), 0
+        else:
+            frame_id = header[:4]
+            frame_size = _syncsafe(header[4:8]) if major == 4 else int.from_bytes(header[4:8], 'big')
+            flags = int.from_bytes(header[8:10], 'big')
+        position += header_size
+        if position + frame_size > end:
+            break
+        name = ID3_TEXT_FRAMES.get(frame_id)
+        if name and name not in tags:
+            data = read(position, frame_size)
+            if len(data) < frame_size:
+                raise HeaderTagError(f"truncated ID3v2 frame at byte {position - header_size}")
+            if major == 4:
+                if flags & 0x000c: # Compressed or encrypted
+                    data = b''
+                if flags & 0x0040: # Group identifier
+                    data = data[1:]
+                if flags & 0x0001: # Data length indicator
+                    data = data[4:]
+                if flags & 0x0002: # Unsynchronised frame
+                    data = data.replace(b'\xff\x00', b'\xff')
+            elif major == 3:
+                if flags & 0x00c0:
+                    data = b''
+                if flags & 0x0020:
+                    data = data[1:]
+            value = _decode_id3_text(data)
+            if name == 'genre':
+                value = id3_genre(value)
+            if value:
+                tags[name] = value
+        position += frame_size
+
+
+def read_id3v2(reader, offset, tags):
+    """
+    Reads the ID3v2 tag at offset, if there is one, into tags. Returns the offset just after the tag.
+    """
+    header = reader.read(offset, 10)
+    if len(header) < 10 or header[:3] != b'ID3':
+        return offset
+    major, flags, size = header[3], header[5], _syncsafe(header[6:10])
+    end = offset + 10 + size
+    tag_end = end + (10 if major == 4 and flags & 0x10 else 0)
+    if major not in (2, 3, 4) or (major == 2 and flags & 0x40):
+        return tag_end # Unknown version, or a compressed ID3v2.2 tag
+    position = offset + 10
+    if flags & 0x40:
+        extended_size = reader.read_exact(position, 4)
+        position += _syncsafe(extended_size) if major == 4 else 4 + int.from_bytes(extended_size, 'big')
+    if flags & 0x80 and major < 4:
+        # The whole tag is unsynchronised, so frame offsets only make sense once it is undone
+        body = reader.read_exact(position, end - position).replace(b'\xff\x00', b'\xff')
+        _read_id3v2_frames(lambda start, length: body[start:start + length], 0, len(body), major, tags)
+    else:
+        _read_id3v2_frames(reader.read, position, end, major, tags)
+    return tag_end
+
+
+def read_id3v1(reader, tags):
+    """
+    Fills the tags missing from tags with those of the ID3v1 tag in the last 128 bytes, if there is one.
+    """
+    if reader.file_size < ID3V1_SIZE:
+        return
+    data = reader.read(reader.file_size - ID3V1_SIZE, ID3V1_SIZE)
+    if data[:3] != b'TAG':
+        return
+    fields = {'title': data[3:33], 'artist': data[33:63], 'album': data[63:93]}
+    for name, value in fields.items():
+        value = value.split(b'\x00')[0].decode('latin-1').strip()
+        if value and name not in tags:
+            tags[name] = value
+    if data[125] == 0 and data[126] and 'track_number' not in tags:
+        tags['track_number'] = str(data[126])
+    year = data[93:97].decode('latin-1')
+    if year.isdigit() and 'year' not in tags:
+        tags['year'] = year
+    if data[127] < len(ID3V1_GENRES) and 'genre' not in tags:
+        tags['genre'] = ID3V1_GENRES[data[127]]
+
+
+def _set_bitrate(tags, audio_bytes):
+    """
+    Sets the average 'bitrate' (kbit/s) of the audio from its size, once the duration is known.
+    """
+    if tags.get('duration_ms') and audio_bytes > 0:
+        tags['bitrate'] = audio_bytes * 8 // tags['duration_ms']
+
+
+def mpeg_duration_ms(reader, audio_start):
+    """
+    Returns the duration of the MPEG audio starting at audio_start, from the Xing/Info or VBRI header of
+    its first frame, or estimated from the first frame's bitrate for constant-bitrate files. None if unknown.
+    """
+    data = reader.read(audio_start, 4096)
+    for i in range(len(data) - 4):
+        if data[i] != 0xff or data[i + 1] & 0xe0 != 0xe0:
+            continue
+        version, layer = (data[i + 1] >> 3) & 3, (data[i + 1] >> 1) & 3
+        bitrate_index, sample_rate_index = data[i + 2] >> 4, (data[i + 2] >> 2) & 3
+        if version == 1 or layer == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+            continue
+        sample_rate = MPEG_SAMPLE_RATES[version][sample_rate_index]
+        bitrate = (MPEG1_BITRATES if version == 3 else MPEG2_BITRATES)[layer][bitrate_index]
+        samples_per_frame = 384 if layer == 3 else 1152 if layer == 2 or version == 3 else 576
+        mono = data[i + 3] >> 6 == 3
+        xing_offset = i + 4 + ((17 if mono else 32) if version == 3 else (9 if mono else 17))
+        frame_count = None
+        xing = data[xing_offset:xing_offset + 12]
+        if len(xing) == 12 and xing[:4] in (b'Xing', b'Info') and xing[7] & 1:
+            frame_count = int.from_bytes(xing[8:12], 'big')
+        elif data[i + 36:i + 40] == b'VBRI':
+            frame_count = int.from_bytes(data[i + 50:i + 54], 'big')
+        if frame_count:
+            return frame_count * samples_per_frame * 1000 // sample_rate
+        return (reader.file_size - audio_start - i) * 8 // bitrate
+    return None
+
+
+def _read_mp3(reader, tags):
+    audio_start = read_id3v2(reader, 0, tags)
+    tlen = tags.pop('tlen', "")
+    # The first frame is usually in the window that was just read, so it is read before the ID3v1 tag
+    duration_ms = int(tlen) if tlen.isdigit() and int(tlen) else mpeg_duration_ms(reader, audio_start)
+    if 'title' not in tags or 'artist' not in tags:
+        read_id3v1(reader, tags)
+    if duration_ms:
+        tags['duration_ms'] = duration_ms
+    _set_bitrate(tags, reader.file_size - audio_start)
+
+
+def read_vorbis_comment(data, tags):
+    """
+    Reads a Vorbis comment block (FLAC, Ogg Vorbis and Opus) into tags.
+    Comments cut off by the end of data are ignored, so a partly read block still yields the comments before it.
+    """
+    if len(data) < 8:
+        return
+    position = 4 + struct.unpack_from('<I', data, 0)[0]
+    if position + 4 > len(data):
+        return
+    count = struct.unpack_from('<I', data, position)[0]
+    position += 4
+    for _ in range(count):
+        if position + 4 > len(data):
+            return
+        length = struct.unpack_from('<I', data, position)[0]
+        position += 4
+        if position + length > len(data):
+            return
+        key, _, value = data[position:position + length].decode('utf-8', 'replace').partition('=')
+        position += length
+        name = VORBIS_COMMENT_FIELDS.get(key.upper())
+        if name and name not in tags and value.strip():
+            tags[name] = value.strip()
+
+
+def _read_flac(reader, tags):
+    position = read_id3v2(reader, 0, {})
+    if reader.read(position, 4) != b'fLaC':
+        raise HeaderTagError("no FLAC stream marker")
+    position += 4
+    while True:
+        header = reader.read_exact(position, 4)
+        block_type, length = header[0] & 0x7f, int.from_bytes(header[1:4], 'big')
+        position += 4
+        if block_type == 0: # STREAMINFO
+            data = reader.read_exact(position, 18)
+            sample_rate = (data[10] << 12) | (data[11] << 4) | (data[12] >> 4)
+            total_samples = ((data[13] & 0x0f) << 32) | int.from_bytes(data[14:18], 'big')
+            if sample_rate and total_samples:
+                tags['duration_ms'] = total_samples * 1000 // sample_rate
+        elif block_type == 4: # VORBIS_COMMENT
+            read_vorbis_comment(reader.read_exact(position, length), tags)
+        elif block_type == 127:
+            raise HeaderTagError("invalid FLAC metadata block")
+        position += length
+        if header[0] & 0x80: # Last metadata block
+            break
+    _set_bitrate(tags, reader.file_size - position)
+
+
+def _read_ogg_packets(reader, tags, count):
+    """
+    Returns the first count packets of the Ogg stream. If the byte budget runs out inside the last packet,
+    its Vorbis comment is read as far as it goes (cover art is usually stored after the text comments).
+    """
+    packets = []
+    packet = b''
+    position = 0
+    while len(packets) < count:
+        header = reader.read_exact(position, 27)
+        if header[:4] != b'OggS':
+            raise HeaderTagError(f"no Ogg page at byte {position}")
+        lacing = reader.read_exact(position + 27, header[26])
+        position += 27 + len(lacing)
+        try:
+            body = reader.read_exact(position, sum(lacing))
+        except HeaderTagError:
+            if len(packets) == count - 1:
+                read_vorbis_comment(packet[7 if packet[:1] == b'\x03' else 8:], tags)
+            raise
+        start = 0
+        for value in lacing:
+            packet += body[start:start + value]
+            start += value
+            if value < 255:
+                packets.append(packet)
+                packet = b''
+        position += len(body)
+    return packets
+
+
+def _read_ogg(reader, tags):
+    identification, comment = _read_ogg_packets(reader, tags, 2)[:2]
+    if identification[:7] == b'\x01vorbis' and comment[:7] == b'\x03vorbis':
+        sample_rate, pre_skip = struct.unpack_from('<I', identification, 12)[0], 0
+        read_vorbis_comment(comment[7:], tags)
+    elif identification[:8] == b'OpusHead' and comment[:8] == b'OpusTags':
+        sample_rate, pre_skip = 48000, struct.unpack_from('<H', identification, 10)[0]
+        read_vorbis_comment(comment[8:], tags)
+    else:
+        raise HeaderTagError("not an Ogg Vorbis or Opus file")
+
+    # The granule position of the last page is the stream's length in samples
+    footer_start = max(0, reader.file_size - READ_SIZE)
+    footer = reader.read(footer_start, reader.file_size - footer_start)
+    last_page = footer.rfind(b'OggS')
+    if sample_rate and last_page >= 0 and last_page + 14 <= len(footer):
+        granule = struct.unpack_from('<q', footer, last_page + 6)[0]
+        if granule > pre_skip:
+            tags['duration_ms'] = (granule - pre_skip) * 1000 // sample_rate
+    _set_bitrate(tags, reader.file_size)
+
+
+def _iter_atoms(reader, start, end):
+    """
+    Yields (type, content start, end) for the MP4 atoms between start and end, reading only their headers.
+    With end None, the atoms at the top level of the file are iterated: their ends are not cut to the file size,
+    so reading the contents of an atom that the file ends inside raises HeaderTagError instead of returning less.
+    """
+    limit = reader.file_size if end is None else end
+    position = start
+    while position + 8 <= limit:
+        header = reader.read_exact(position, 8)
+        size, atom_type, header_size = int.from_bytes(header[:4], 'big'), header[4:8], 8
+        if size == 1:
+            size, header_size = int.from_bytes(reader.read_exact(position + 8, 8), 'big'), 16
+        elif size == 0:
+            size = limit - position
+        if size < header_size:
+            raise HeaderTagError(f"invalid MP4 atom at byte {position}")
+        yield atom_type, position + header_size, position + size if end is None else min(position + size, end)
+        position += size
+
+
+def _find_atom(reader, start, end, atom_type):
+    for child_type, child_start, child_end in _iter_atoms(reader, start, end):
+        if child_type == atom_type:
+            return child_start, child_end
+    return None
+
+
+def _read_mp4_item(reader, item_type, start, end, tags):
+    if item_type not in MP4_ITEMS and item_type not in (b'trkn', b'gnre', b'----'):
+        return # Cover art and other items are skipped without being read
+    data = None
+    name = None
+    for child_type, child_start, child_end in _iter_atoms(reader, start, end):
+        if child_type == b'name':
+            name = reader.read_exact(child_start, child_end - child_start)[4:].decode('utf-8', 'replace')
+        elif child_type == b'data':
+            data = reader.read_exact(child_start, child_end - child_start)[8:]
+    if data is None:
+        return
+    if item_type in MP4_ITEMS:
+        tags.setdefault(MP4_ITEMS[item_type], data.decode('utf-8', 'replace').strip())
+    elif item_type == b'trkn' and len(data) >= 4:
+        tags.setdefault('track_number', str(int.from_bytes(data[2:4], 'big')))
+    elif item_type == b'gnre' and len(data) >= 2 and 0 < int.from_bytes(data[:2], 'big') <= len(ID3V1_GENRES):
+        tags.setdefault('genre', ID3V1_GENRES[int.from_bytes(data[:2], 'big') - 1])
+    elif item_type == b'----' and name and name.upper() == 'ISRC':
+        tags.setdefault('isrc', data.decode('utf-8', 'replace').strip())
+
+
+def _read_mp4(reader, tags):
+    moov = _find_atom(reader, 0, None, b'moov')
+    if moov is None:
+        raise HeaderTagError("no 'moov' atom")
+    for atom_type, start, end in _iter_atoms(reader, *moov):
+        if atom_type == b'mvhd':
+            data = reader.read_exact(start, 32)
+            if data[0] == 1:
+                timescale, duration = int.from_bytes(data[20:24], 'big'), int.from_bytes(data[24:32], 'big')
+            else:
+                timescale, duration = int.from_bytes(data[12:16], 'big'), int.from_bytes(data[16:20], 'big')
+            if timescale:
+                tags['duration_ms'] = duration * 1000 // timescale
+        elif atom_type == b'udta':
+            meta = _find_atom(reader, start, end, b'meta')
+            if meta is None:
+                continue
+            # ISO 'meta' is a full atom with 4 bytes of version and flags; the QuickTime one is not
+            meta_start = meta[0] if reader.read(meta[0] + 4, 4) == b'hdlr' else meta[0] + 4
+            ilst = _find_atom(reader, meta_start, meta[1], b'ilst')
+            if ilst is not None:
+                for item_type, item_start, item_end in _iter_atoms(reader, *ilst):
+                    _read_mp4_item(reader, item_type, item_start, item_end, tags)
+    _set_bitrate(tags, reader.file_size - (moov[1] - moov[0]))
+
+
+HEADER_READERS = {'.mp3': _read_mp3, '.flac': _read_flac, '.m4a': _read_mp4, '.ogg': _read_ogg}
+
+
+def can_read_headers(filepath):
+    return os.path.splitext(filepath)[1].lower() in HEADER_READERS
+
+
+def read_header_tags(filepath, file_size=None, byte_budget=BYTE_BUDGET):
+    """
+    Reads the tags of an MP3, FLAC, M4A or Ogg file from its tag regions only (see can_read_headers).
+    Returns (tags, bytes read, problem): tags holds whichever of 'title', 'artist', 'album', 'isrc', 'genre',
+    'year' (text, e.g. "1959-08-17"), 'duration_ms' and 'bitrate' (ints, the bitrate in kbit/s averaged over
+    the audio) and 'track_number' (text, e.g. "3/12") the file carries; problem is None,
+    or tells why the file could not be fully parsed (tags found before the problem are kept).
+    """
+    tags = {}
+    reader = None
+    try:
+        with open(filepath, 'rb', buffering=0) as f:
+            reader = WindowReader(f, os.fstat(f.fileno()).st_size if file_size is None else file_size, byte_budget)
+            HEADER_READERS[os.path.splitext(filepath)[1].lower()](reader, tags)
+        problem = None
+    except HeaderTagError as e:
+        problem = str(e)
+    except (struct.error, IndexError, ValueError) as e:
+        problem = f"malformed tags ({e})"
+    except OSError as e:
+        problem = f"could not be read ({e})"
+    return tags, reader.bytes_read if reader else 0, problem
+
+
+class HeaderReadStats:
+    """
+    Totals of a header-only scan: the files read, the bytes read from them, the files of other formats that were
+    read with TinyTag instead, and every audio file that gave no song, with the reason ('skipped').
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.bytes_read = 0
+        self.tinytag_files = 0
+        self.skipped = []
+
+    def add(self, filepath, result):
+        """
+        Records a (song_info, bytes read or None for TinyTag, problem) result of
+        local_library.read_song_info_from_headers and returns its song_info.
+        result is None for a file whose read failed or timed out in a worker pool.
+        """
+        if result is None:
+            self.skipped.append((filepath, "the read failed or timed out"))
+            return None
+        song_info, bytes_read, problem = result
+        if bytes_read is None:
+            self.tinytag_files += 1
+        else:
+            self.files += 1
+            self.bytes_read += bytes_read
+        if song_info is None:
+            self.skipped.append((filepath, problem or "no title or artist tag"))
+        return song_info
+
+    def summary(self):
+        per_file = self.bytes_read / self.files / 1024 if self.files else 0
+        return (f"Header-only read of {self.files} files: {self.bytes_read / 1_048_576:.1f} MB "
+                f"({per_file:.1f} KB per file), {self.tinytag_files} other files read with TinyTag, "
+                f"{len(self.skipped)} files skipped.")
+
+    def write_skipped(self, path):
+        """
+        Writes the skipped files as 'path<TAB>reason' lines, for later inspection.
+        """
+        temp_file = path + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            for filepath, reason in self.skipped:
+                f.write(f"{filepath}\t{reason}\n")
+        os.replace(temp_file, path)
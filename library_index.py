@@ -0,0 +1,332 @@
+import os
+import json
+import sqlite3
+from local_library import (PROGRESS_EVERY, get_file_signature, scan_audio_files, read_song_infos, normalize_text,
+                           report_header_read_stats, validate_cached_files, directory_state_path,
+                           load_untagged_files)
+from song_table import SongTable
+
+# Optional SQLite store for the local library, an alternative to the JSON cache file.
+# Rows are upserted while scanning, and readers can stream rows or query a single artist
+# without loading the whole library into memory. WAL mode lets both scripts read it at the same time.
+
+SONG_COLUMNS = ('artist', 'title', 'album', 'filepath', 'size', 'mtime', 'inode', 'isrc', 'duration_ms', 'track_number',
+                'genre', 'year', 'bitrate')
+
+# Columns added after the first version of the schema, added to existing databases by open_library_index
+ADDED_COLUMNS = {'isrc': 'TEXT', 'duration_ms': 'INTEGER', 'track_number': 'INTEGER', 'genre': 'TEXT',
+                 'year': 'INTEGER', 'bitrate': 'INTEGER'}
+
+# Commit every N upserts during a scan so other readers see progress and an interrupted scan keeps its work
+COMMIT_EVERY = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    filepath TEXT PRIMARY KEY,
+    artist TEXT NOT NULL,
+    title TEXT NOT NULL,
+    album TEXT NOT NULL DEFAULT '',
+    title_normalized TEXT NOT NULL,
+    size INTEGER,
+    mtime INTEGER,
+    inode INTEGER,
+    isrc TEXT,
+    duration_ms INTEGER,
+    track_number INTEGER,
+    genre TEXT,
+    year INTEGER,
+    bitrate INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_songs_artist ON songs (artist);
+CREATE INDEX IF NOT EXISTS idx_songs_title_normalized ON songs (title_normalized);
+CREATE TABLE IF NOT EXISTS untagged_files (
+    filepath TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime INTEGER,
+    inode INTEGER
+);
+"""
+
+
+def open_library_index(db_path):
+    """
+    Opens (and creates if needed) the SQLite library index.
+    The database is switched to WAL mode so one script can read while another one scans.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    existing_columns = {row['name'] for row in conn.execute("PRAGMA table_info(songs)")}
+    for column, column_type in ADDED_COLUMNS.items():
+        if column not in existing_columns:
+            conn.execute(f"ALTER TABLE songs ADD COLUMN {column} {column_type}")
+    return conn
+
+
+def upsert_song(conn, song):
+    """
+    Inserts a song row, or replaces the row already stored for the same filepath.
+    """
+    conn.execute(
+        "INSERT INTO songs (filepath, artist, title, album, title_normalized, size, mtime, inode, "
+        "isrc, duration_ms, track_number, genre, year, bitrate) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(filepath) DO UPDATE SET artist=excluded.artist, title=excluded.title, album=excluded.album, "
+        "title_normalized=excluded.title_normalized, size=excluded.size, mtime=excluded.mtime, inode=excluded.inode, "
+        "isrc=excluded.isrc, duration_ms=excluded.duration_ms, track_number=excluded.track_number, "
+        "genre=excluded.genre, year=excluded.year, bitrate=excluded.bitrate",
+        (song['filepath'], song['artist'], song['title'], song.get('album', ""), normalize_text(song['title']),
+         song.get('size'), song.get('mtime'), song.get('inode'),
+         song.get('isrc'), song.get('duration_ms'), song.get('track_number'),
+         song.get('genre'), song.get('year'), song.get('bitrate'))
+    )
+
+
+def delete_songs(conn, filepaths):
+    """
+    Removes the rows for the given file paths.
+    """
+    conn.executemany("DELETE FROM songs WHERE filepath = ?", ((filepath,) for filepath in filepaths))
+
+
+def record_untagged_file(conn, filepath, signature):
+    """
+    Remembers an audio file that gave no song, so a refresh does not read it again until its signature changes.
+    """
+    conn.execute("INSERT OR REPLACE INTO untagged_files (filepath, size, mtime, inode) VALUES (?, ?, ?, ?)",
+                 (filepath, signature['size'], signature['mtime'], signature['inode']))
+
+
+def delete_untagged_files(conn, filepaths):
+    conn.executemany("DELETE FROM untagged_files WHERE filepath = ?", ((filepath,) for filepath in filepaths))
+
+
+def count_songs(conn):
+    """
+    Returns the number of songs in the index.
+    """
+    return conn.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+
+
+def iter_songs(conn, artist=None):
+    """
+    Streams songs from the index as dictionaries with the same keys as the JSON cache entries.
+    If artist is given, only that artist's songs are returned (using the artist index).
+    """
+    query = f"SELECT {', '.join(SONG_COLUMNS)} FROM songs"
+    params = ()
+    if artist is not None:
+        query += " WHERE artist = ?"
+        params = (artist,)
+    for row in conn.execute(query, params):
+        yield dict(row)
+
+
+def iter_artists(conn):
+    """
+    Streams (artist name, number of songs) for the distinct artists in the index, grouped on the artist index.
+    """
+    for row in conn.execute("SELECT artist, COUNT(*) AS song_count FROM songs GROUP BY artist"):
+        yield row['artist'], row['song_count']
+
+
+def migrate_json_cache(conn, cache_file):
+    """
+    One-shot import of an existing JSON cache file into the index, with the files it lists as untagged.
+    Returns the number of songs imported.
+    """
+    with open(cache_file, 'r', encoding='utf-8') as f:
+        cached_songs = json.load(f)
+
+    imported_count = 0
+    with conn:
+        for song in cached_songs:
+            if song.get('filepath') and song.get('artist') and song.get('title'):
+                upsert_song(conn, song)
+                imported_count += 1
+        for filepath, signature in load_untagged_files(cache_file).items():
+            if isinstance(signature, dict):
+                record_untagged_file(conn, filepath, {key: signature.get(key) for key in ('size', 'mtime', 'inode')})
+    print(f"Migrated {imported_count} songs from cache file {cache_file} to the library index.")
+    return imported_count
+
+
+def refresh_library_index(conn, library_path, force_rescan=False, workers=1, file_timeout=None, use_processes=False,
+                          header_stats=None):
+    """
+    Brings the index up to date with the library on disk.
+    Tags are only re-read for new files and files whose size/mtime/inode changed (or every file with force_rescan).
+    Each song is upserted as soon as it has been read, and rows for deleted files are removed.
+    Files that give no song are recorded in the untagged_files table with their signature, and are not read
+    again until they change (like local_library.incremental_rescan does with its untagged files list).
+    With a header_tags.HeaderReadStats as header_stats, tags are read header-only (see local_library.read_song_infos).
+    Returns a dictionary with the 'added', 'changed', 'removed', 'unchanged' and 'untagged' (unchanged files
+    without a song, not read again) counts.
+    """
+    indexed = {row['filepath']: (row['size'], row['mtime'], row['inode'])
+               for row in conn.execute("SELECT filepath, size, mtime, inode FROM songs")}
+    untagged = {row['filepath']: (row['size'], row['mtime'], row['inode'])
+                for row in conn.execute("SELECT filepath, size, mtime, inode FROM untagged_files")}
+
+    print(f"Updating library index from: {library_path}")
+    stats = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0, 'untagged': 0}
+    files_scanned_count = 0
+    seen_paths = set()
+    signatures = {} # Files handed to the readers, until their result comes back
+
+    def files_to_read():
+        # Generator so tag reading (and upserting) starts while the walk is still running
+        nonlocal files_scanned_count
+        for filepath, stat_result in scan_audio_files(library_path):
+            files_scanned_count += 1
+            if files_scanned_count % PROGRESS_EVERY == 0:
+                print(f"  Processed {files_scanned_count} files, {stats['added']} added, {stats['changed']} changed.")
+            if filepath is None:
+                continue
+            seen_paths.add(filepath)
+            signature = get_file_signature(stat_result)
+            stored_signature = indexed.get(filepath)
+            if not force_rescan and stored_signature == (None, None, None):
+                # Row migrated from a cache written before signatures were stored: trust it and record its signature
+                conn.execute("UPDATE songs SET size = ?, mtime = ?, inode = ? WHERE filepath = ?",
+                             (signature['size'], signature['mtime'], signature['inode'], filepath))
+                stats['unchanged'] += 1
+                continue
+            signature_values = (signature['size'], signature['mtime'], signature['inode'])
+            if not force_rescan and stored_signature is not None and stored_signature == signature_values:
+                stats['unchanged'] += 1
+                continue
+            if not force_rescan and stored_signature is None and untagged.get(filepath) == signature_values:
+                stats['untagged'] += 1
+                continue
+            signatures[filepath] = signature
+            yield filepath, stat_result
+
+    pending_writes = 0
+    for filepath, song_info in read_song_infos(files_to_read(), workers, file_timeout, use_processes, header_stats):
+        signature = signatures.pop(filepath)
+        if song_info:
+            upsert_song(conn, song_info)
+            if filepath in untagged:
+                delete_untagged_files(conn, [filepath])
+            if filepath in indexed:
+                stats['changed'] += 1
+            else:
+                stats['added'] += 1
+        else:
+            record_untagged_file(conn, filepath, signature)
+            if filepath in indexed:
+                # File changed and no longer has usable tags
+                delete_songs(conn, [filepath])
+                stats['removed'] += 1
+        pending_writes += 1
+        if pending_writes >= COMMIT_EVERY:
+            conn.commit()
+            pending_writes = 0
+
+    removed_paths = [path for path in indexed if path not in seen_paths]
+    delete_songs(conn, removed_paths)
+    stats['removed'] += len(removed_paths)
+    delete_untagged_files(conn, [path for path in untagged if path not in seen_paths])
+    conn.commit()
+
+    print(f"\nFinished updating library index. Processed {files_scanned_count} files: "
+          f"{stats['added']} added, {stats['changed']} changed, {stats['removed']} removed, "
+          f"{stats['unchanged']} unchanged, {stats['untagged']} without tags skipped.")
+    return stats
+
+
+def validate_library_index(conn, db_path, workers=1):
+    """
+    Removes the rows of files that no longer exist, checking one directory at a time (see
+    local_library.validate_cached_files) with the directory mtimes recorded in directory_state_path(db_path).
+    Returns a tuple (number of songs checked, number of missing files removed).
+    """
+    filepaths = [row['filepath'] for row in conn.execute("SELECT filepath FROM songs")]
+    songs = SongTable.from_songs({'filepath': filepath} for filepath in filepaths)
+    valid_rows, missing_files_count, listed_count, unchanged_count = validate_cached_files(
+        songs, directory_state_path(db_path), workers)
+    print(f"Checked {listed_count + unchanged_count} folders ({unchanged_count} unchanged since the last check).")
+    if missing_files_count:
+        valid_rows = set(valid_rows)
+        with conn:
+            delete_songs(conn, [filepath for row, filepath in enumerate(filepaths) if row not in valid_rows])
+    return len(filepaths), missing_files_count
+
+
+def open_current_library_index(library_path, db_path, cache_file=None, refresh=False, force_rescan=False,
+                               workers=1, file_timeout=None, use_processes=False, header_only=False):
+    """
+    Opens the library index for reading and returns the connection.
+    The library is only walked when refresh or force_rescan is set (see refresh_library_index), or when the index
+    is still empty: on first use an existing JSON cache_file is migrated into it, and without one it is built by a scan.
+    Otherwise, like a JSON cache load, only the existence of the indexed files is checked (see validate_library_index):
+    the rows of missing files are removed, and if more than 10% are missing the index is refreshed.
+    With header_only=True, tags are read header-only and the skipped files are listed next to the index.
+    """
+    conn = open_library_index(db_path)
+    try:
+        empty = count_songs(conn) == 0
+        if empty and cache_file and os.path.exists(cache_file) and not force_rescan:
+            try:
+                empty = migrate_json_cache(conn, cache_file) == 0
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Error reading cache file {cache_file}: {e}. Building the library index from a scan.")
+        if not (refresh or force_rescan or empty):
+            song_count, missing_files_count = validate_library_index(conn, db_path, workers)
+            if missing_files_count > song_count * 0.1:
+                print(f"More than 10% ({missing_files_count}/{song_count}) of indexed files are missing. "
+                      f"Updating the library index.")
+                refresh = True
+            elif missing_files_count:
+                print(f"Removed {missing_files_count} missing files from the library index.")
+        if refresh or force_rescan or empty:
+            header_stats = None
+            if header_only:
+                from header_tags import HeaderReadStats
+                header_stats = HeaderReadStats()
+            refresh_library_index(conn, library_path, force_rescan, workers, file_timeout, use_processes, header_stats)
+            if header_stats is not None:
+                report_header_read_stats(header_stats, db_path)
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+def _stream_songs(conn):
+    try:
+        yield from iter_songs(conn)
+    finally:
+        conn.close()
+
+
+def get_songs_from_library_index(library_path, db_path, cache_file=None, refresh=False, force_rescan=False,
+                                 workers=1, file_timeout=None, use_processes=False, header_only=False):
+    """
+    SQLite counterpart of get_songs_from_local_library_with_cache.
+    Brings the index up to date as open_current_library_index does, then returns an iterator that streams
+    its songs as dictionaries (see iter_songs) and closes the database once it is exhausted.
+    """
+    conn = open_current_library_index(library_path, db_path, cache_file, refresh, force_rescan, workers,
+                                      file_timeout, use_processes, header_only)
+    print(f"Streaming {count_songs(conn)} songs from library index: {db_path}")
+    return _stream_songs(conn)
+
+
+def get_artists_from_library_index(library_path, db_path, cache_file=None, refresh=False, force_rescan=False,
+                                   workers=1, file_timeout=None, use_processes=False, header_only=False):
+    """
+    Returns {artist name: number of songs} from the index (see iter_artists), without reading the songs themselves.
+    The index is brought up to date as open_current_library_index does.
+    """
+    conn = open_current_library_index(library_path, db_path, cache_file, refresh, force_rescan, workers,
+                                      file_timeout, use_processes, header_only)
+    try:
+        artist_song_counts = dict(iter_artists(conn))
+    finally:
+        conn.close()
+    print(f"Loaded {len(artist_song_counts)} artists from library index: {db_path}")
+    return artist_song_counts
@@ -0,0 +1,187 @@
+import re
+import math
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain, compress
+from song_dedupe import canonical_artist, canonical_text
+from song_table import MISSING_SIGNED
+
+# Tag-indexed filtering of a SongTable, used by SELECTION_FILTER and the playlist specs of '--batch'.
+# Rather than testing every song against a filter, LibraryIndex answers it from indexes built on first use:
+#   inverted indexes  canonical artist, album or genre -> IDs of the interned names -> rows
+#   range indexes     the rows sorted by year, duration, bitrate or mtime, so a range is two binary searches
+# A query starts from the rows of its most selective condition and checks only those against the others, so
+# "genre jazz, 1955-1965, under 6 minutes" touches the jazz rows instead of the whole library.
+# The indexes belong to one table: build a new LibraryIndex when the library changes.
+
+# Filter keys: a song must match all of them
+#   artists, albums, genres   lists of names, compared like song_dedupe compares them (case, accents, punctuation);
+#                             a genre tag holding several genres ("Jazz; Blues") matches each of them
+#   path_contains             text that must occur in the file path (case-insensitive), e.g. a genre folder
+#   min_year, max_year,
+#   min_duration_seconds, max_duration_seconds,
+#   min_bitrate, max_bitrate  inclusive bounds on the tag (bitrate in kbit/s); songs without the tag are left out
+#   added_within_days         only files modified (added) in the last N days
+FILTER_KEYS = ('artists', 'albums', 'genres', 'path_contains', 'min_year', 'max_year', 'min_duration_seconds',
+               'max_duration_seconds', 'min_bitrate', 'max_bitrate', 'added_within_days')
+
+# Name filter key -> interned column of the SongTable
+NAME_FILTERS = {'artists': 'artist', 'albums': 'album', 'genres': 'genre'}
+
+# Range filter key -> (integer column of the SongTable, bound, column units per filter unit)
+RANGE_FILTERS = {
+    'min_year': ('year', 'min', 1), 'max_year': ('year', 'max', 1),
+    'min_duration_seconds': ('duration_ms', 'min', 1000), 'max_duration_seconds': ('duration_ms', 'max', 1000),
+    'min_bitrate': ('bitrate', 'min', 1), 'max_bitrate': ('bitrate', 'max', 1)
+}
+
+# Separators between the genres of a single genre tag
+GENRE_SEPARATORS = re.compile(r'\s*[;/,|]\s*')
+
+
+def validate_filter(song_filter, name="the filter"):
+    """
+    Raises ValueError if song_filter is not a dictionary of FILTER_KEYS with values of the right type.
+    """
+    if song_filter is None:
+        return
+    if not isinstance(song_filter, dict) or set(song_filter) - set(FILTER_KEYS):
+        raise ValueError(f"Invalid {name}; its keys can be {', '.join(FILTER_KEYS)}")
+    for key, value in song_filter.items():
+        if key in NAME_FILTERS:
+            valid = isinstance(value, list) and all(isinstance(item, str) for item in value)
+        elif key == 'path_contains':
+            valid = isinstance(value, str)
+        else:
+            valid = value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+        if not valid:
+            raise ValueError(f"Invalid value {value!r} for '{key}' in {name}")
+
+
+def _name_keys(key, name):
+    if key == 'artists':
+        return [canonical_artist(name)]
+    if key == 'genres':
+        return [canonical_text(genre) for genre in GENRE_SEPARATORS.split(name) if genre.strip()]
+    return [canonical_text(name)]
+
+
+class LibraryIndex:
+    """
+    Inverted and range indexes over a SongTable for query(). Each index is built the first time a query needs it
+    and reused by every later query, so many filters over one library (e.g. the specs of a batch) share them.
+    """
+
+    def __init__(self, songs):
+        self.songs = songs
+        # 'artists' / 'albums' / 'genres' -> (canonical name -> IDs in the interned column, ID -> rows)
+        self._inverted = {}
+        # Integer column -> (sorted known values, their rows in the same order)
+        self._sorted = {}
+
+    def inverted_index(self, key):
+        if key not in self._inverted:
+            column = NAME_FILTERS[key]
+            ids_by_name = {}
+            for string_id, name in enumerate(self.songs.interned[column].values):
+                for name_key in _name_keys(key, name) if name else ():
+                    ids_by_name.setdefault(name_key, []).append(string_id)
+            if column == 'artist':
+                rows_by_id = self.songs.rows_by_artist
+            else:
+                rows_by_id = [array('I') for _ in range(len(self.songs.interned[column]))]
+                for row, string_id in enumerate(self.songs.interned_ids[column]):
+                    rows_by_id[string_id].append(row)
+            self._inverted[key] = (ids_by_name, rows_by_id)
+        return self._inverted[key]
+
+    def range_index(self, column):
+        if column not in self._sorted:
+            values = self.songs.integers[column]
+            rows = sorted(range(len(values)), key=values.__getitem__)
+            sorted_values = array('q', map(values.__getitem__, rows))
+            known = bisect_right(sorted_values, MISSING_SIGNED) # Missing values sort first and are left out
+            self._sorted[column] = (sorted_values[known:], array('I', rows[known:]))
+        return self._sorted[column]
+
+    def _conditions(self, song_filter, now):
+        """
+        Returns (number of candidate rows, candidate row sequences, keep(rows)) for every condition of song_filter,
+        where keep returns the given rows that meet the condition.
+        """
+        songs = self.songs
+        conditions = []
+        for key, column in NAME_FILTERS.items():
+            if not song_filter.get(key):
+                continue
+            ids_by_name, rows_by_id = self.inverted_index(key)
+            wanted_ids = set()
+            for name in song_filter[key]:
+                for name_key in _name_keys(key, name):
+                    wanted_ids.update(ids_by_name.get(name_key, ()))
+            candidates = [rows_by_id[string_id] for string_id in wanted_ids]
+            conditions.append((sum(len(rows) for rows in candidates), candidates,
+                               lambda rows, ids=songs.interned_ids[column], wanted_ids=wanted_ids:
+                               [row for row in rows if ids[row] in wanted_ids]))
+
+        bounds = {}  # Integer column -> [lowest, highest] value
+        for key, (column, bound, scale) in RANGE_FILTERS.items():
+            if song_filter.get(key) is not None:
+                column_bounds = bounds.setdefault(column, [MISSING_SIGNED + 1, 2 ** 63 - 1])
+                if bound == 'min':
+                    column_bounds[0] = max(column_bounds[0], math.ceil(song_filter[key] * scale))
+                else:
+                    column_bounds[1] = min(column_bounds[1], math.floor(song_filter[key] * scale))
+        if song_filter.get('added_within_days') is not None:
+            oldest = int(((now or time.time()) - song_filter['added_within_days'] * 86400) * 1_000_000_000)
+            bounds['mtime'] = [oldest, 2 ** 63 - 1]
+        for column, (lowest, highest) in bounds.items():
+            values, rows = self.range_index(column)
+            start, end = bisect_left(values, lowest), bisect_right(values, highest)
+            conditions.append((max(0, end - start), [rows[start:end]],
+                               lambda rows, v=songs.integers[column], lo=lowest, hi=highest:
+                               [row for row in rows if lo <= v[row] <= hi]))
+
+        if song_filter.get('path_contains'):
+            # Substrings cannot be indexed: the directories are checked once each, file names row by row
+            text = song_filter['path_contains'].casefold()
+            directories, directory_ids, filenames = songs.directories.values, songs.directory_ids, songs.filenames
+            matching_directories = [text in directory.casefold() for directory in directories]
+            if '/' in text or '\\' in text:
+                # The text may span the directory and the file name
+                def keep_path(rows):
+                    return [row for row in rows if matching_directories[directory_ids[row]]
+                            or text in (directories[directory_ids[row]] + filenames[row]).casefold()]
+            else:
+                def keep_path(rows):
+                    return [row for row in rows
+                            if matching_directories[directory_ids[row]] or text in filenames[row].casefold()]
+
+            def all_matching_rows():
+                # Only run when no other condition narrows the rows down
+                yield from keep_path(range(len(songs)))
+
+            conditions.append((len(songs), [all_matching_rows()], keep_path))
+        return conditions
+
+    def query(self, song_filter, now=None):
+        """
+        Returns the rows of the table that match song_filter (see FILTER_KEYS), in table order.
+        An empty filter matches every row. now (a Unix time) is only used by 'added_within_days'.
+        """
+        conditions = sorted(self._conditions(song_filter or {}, now), key=lambda condition: condition[0])
+        if not conditions:
+            return list(range(len(self.songs)))
+        rows = list(chain.from_iterable(conditions[0][1]))
+        for _, _, keep in conditions[1:]:
+            if not rows:
+                break
+            rows = keep(rows)
+        if len(rows) * 32 < len(self.songs):
+            return sorted(rows)
+        # Back in table order without sorting: mark the rows, then walk the marks
+        marks = bytearray(len(self.songs))
+        for row in rows:
+            marks[row] = 1
+        return list(compress(range(len(self.songs)), marks))
@@ -0,0 +1,310 @@
+import os
+import sys
+import json
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from local_library import (SUPPORTED_EXTENSIONS, WATCH_HEARTBEAT_SECONDS, get_file_signature, scan_audio_files,
+                           read_song_infos, save_songs_to_cache, incremental_rescan, status_file_path)
+
+# Watch mode: keeps the shared JSON cache up to date while the library changes, so the scripts can load it
+# without validating every cached path first.
+# On Linux the library is watched with inotify (through ctypes, no extra package needed); elsewhere, or when
+# inotify is unavailable or out of watches, the library is polled by comparing file signatures.
+# Events are collected until the library has been quiet for the debounce period (a whole album being copied
+# in becomes one update), then only the affected files are re-read and the cache is rewritten atomically.
+# While the watcher runs it refreshes a status file next to the cache; see local_library.is_cache_watched.
+
+# Changes are applied after at most this long, even if events keep arriving
+WATCH_MAX_DELAY_SECONDS = 60
+
+# inotify event masks (from <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+              | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')
+
+# Change kinds reported by the watchers
+FILE_CHANGED = 'changed' # Created, rewritten or moved in; re-read it (or drop it if it is gone by then)
+FILE_REMOVED = 'removed'
+DIRECTORY_REMOVED = 'directory_removed' # Deleted or moved out; drop every song below it
+RESCAN_NEEDED = 'rescan' # Events were lost; compare the whole library again
+
+
+def write_status_file(cache_file, library_path, watcher_name):
+    status = {'pid': os.getpid(), 'library_path': library_path, 'watcher': watcher_name, 'heartbeat': time.time()}
+    temp_file = status_file_path(cache_file) + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(status, f)
+    os.replace(temp_file, status_file_path(cache_file))
+
+
+class InotifyWatcher:
+    """
+    Recursive inotify watch of a directory tree. New directories are watched as they appear and the audio files
+    already inside them are reported, since they may have been created before the watch was added.
+    Raises OSError if inotify is not available or the watch limit (fs.inotify.max_user_watches) is reached.
+    """
+    name = 'inotify'
+
+    def __init__(self, library_path):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths_by_wd = {}
+        try:
+            self._watch_tree(library_path)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def _watch_directory(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return # Removed again before it could be watched
+            raise OSError(error, f"Could not watch {path}: {os.strerror(error)}")
+        self.paths_by_wd[wd] = path
+
+    def _watch_tree(self, path):
+        for root, dirs, files in os.walk(path):
+            self._watch_directory(root)
+
+    def _forget_tree(self, path):
+        prefix = path + os.sep
+        for wd, watched_path in list(self.paths_by_wd.items()):
+            if watched_path == path or watched_path.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.paths_by_wd[wd]
+
+    def read_changes(self, timeout):
+        """
+        Waits up to timeout seconds for events and returns them as a list of (kind, path) changes.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+
+        changes = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, name_length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_length].rstrip(b'\0'))
+            offset += name_length
+
+            if mask & IN_Q_OVERFLOW:
+                changes.append((RESCAN_NEEDED, None))
+                continue
+            directory = self.paths_by_wd.get(wd)
+            if mask & IN_IGNORED:
+                self.paths_by_wd.pop(wd, None)
+                continue
+            if directory is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # Handled through the parent's IN_DELETE/IN_MOVED_FROM, except for the library root itself
+                if not os.path.isdir(directory):
+                    changes.append((DIRECTORY_REMOVED, directory))
+                continue
+
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(path)
+                    changes.extend((FILE_CHANGED, filepath) for filepath, _ in scan_audio_files(path) if filepath)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._forget_tree(path)
+                    changes.append((DIRECTORY_REMOVED, path))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                changes.append((FILE_CHANGED, path))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                changes.append((FILE_REMOVED, path))
+            # A plain IN_CREATE is followed by IN_CLOSE_WRITE once the file has been written
+        return changes
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Fallback watcher: walks the library every poll_interval seconds and reports files whose
+    (size, mtime, inode) signature changed, appeared or disappeared since the previous walk.
+    """
+    name = 'polling'
+
+    def __init__(self, library_path, poll_interval=60):
+        self.library_path = library_path
+        self.poll_interval = poll_interval
+        self.signatures = self._snapshot()
+        self.next_poll = time.monotonic() + poll_interval
+
+    def _snapshot(self):
+        return {filepath: get_file_signature(stat_result)
+                for filepath, stat_result in scan_audio_files(self.library_path) if filepath}
+
+    def read_changes(self, timeout):
+        wait = self.next_poll - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0.0, wait))
+        self.next_poll = time.monotonic() + self.poll_interval
+
+        signatures = self._snapshot()
+        changes = [(FILE_CHANGED, filepath) for filepath, signature in signatures.items()
+                   if self.signatures.get(filepath) != signature]
+        changes.extend((FILE_REMOVED, filepath) for filepath in self.signatures if filepath not in signatures)
+        self.signatures = signatures
+        return changes
+
+    def close(self):
+        pass
+
+
+def open_watcher(library_path, poll_interval=60, use_inotify=True):
+    """
+    Returns an InotifyWatcher for library_path if possible, otherwise a PollingWatcher.
+    """
+    if use_inotify:
+        try:
+            return InotifyWatcher(library_path)
+        except (OSError, AttributeError) as e:
+            print(f"inotify is not available ({e}). Polling the library every {poll_interval} seconds instead.")
+    return PollingWatcher(library_path, poll_interval)
+
+
+def apply_changes(songs_by_path, changed_paths, removed_directories, workers=1, file_timeout=None, use_processes=False,
+                  header_stats=None):
+    """
+    Updates songs_by_path (filepath -> song) for a batch of changes: songs below removed directories are dropped,
+    and each changed path is re-read if its signature differs from the cached one, or dropped if it is gone.
+    With a header_tags.HeaderReadStats as header_stats, files are read header-only (see local_library.read_song_infos).
+    Returns stats with the 'added', 'changed' and 'removed' counts.
+    """
+    stats = {'added': 0, 'changed': 0, 'removed': 0}
+    for directory in removed_directories:
+        prefix = directory + os.sep
+        for filepath in [path for path in songs_by_path if path.startswith(prefix)]:
+            del songs_by_path[filepath]
+            stats['removed'] += 1
+
+    files_to_read = []
+    for filepath in sorted(changed_paths):
+        try:
+            stat_result = os.stat(filepath)
+        except OSError:
+            if songs_by_path.pop(filepath, None) is not None:
+                stats['removed'] += 1
+            continue
+        if not filepath.lower().endswith(SUPPORTED_EXTENSIONS):
+            continue
+        cached_song = songs_by_path.get(filepath)
+        signature = get_file_signature(stat_result)
+        if cached_song is not None and all(cached_song.get(key) == value for key, value in signature.items()):
+            continue
+        files_to_read.append((filepath, stat_result))
+
+    for filepath, song_info in read_song_infos(files_to_read, workers, file_timeout, use_processes, header_stats):
+        if song_info:
+            stats['changed' if filepath in songs_by_path else 'added'] += 1
+            songs_by_path[filepath] = song_info
+        elif songs_by_path.pop(filepath, None) is not None:
+            stats['removed'] += 1
+    return stats
+
+
+def watch_library(library_path, cache_file, debounce_seconds=2.0, poll_interval=60, use_inotify=True,
+                  workers=1, file_timeout=None, use_processes=False, header_only=False):
+    """
+    Brings the cache up to date with an incremental rescan, then keeps it current until interrupted (Ctrl-C).
+    With header_only=True, files are read header-only, both by the rescans and for the changes.
+    """
+    def new_header_stats():
+        if not header_only:
+            return None
+        from header_tags import HeaderReadStats
+        return HeaderReadStats()
+
+    watcher = open_watcher(library_path, poll_interval, use_inotify)
+    songs, _ = incremental_rescan(library_path, cache_file, workers, file_timeout, use_processes, new_header_stats())
+    songs_by_path = {song['filepath']: song for song in songs}
+    print(f"\nWatching {library_path} for changes ({watcher.name}). Press Ctrl-C to stop.")
+
+    changed_paths = set()
+    removed_directories = set()
+    rescan_needed = False
+    first_change = last_change = None
+    next_heartbeat = 0.0
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= next_heartbeat:
+                write_status_file(cache_file, library_path, watcher.name)
+                next_heartbeat = now + WATCH_HEARTBEAT_SECONDS
+            timeout = next_heartbeat - now
+            if last_change is not None:
+                timeout = min(timeout, max(0.0, last_change + debounce_seconds - now))
+
+            for kind, path in watcher.read_changes(timeout):
+                if kind == RESCAN_NEEDED:
+                    rescan_needed = True
+                elif kind == DIRECTORY_REMOVED:
+                    removed_directories.add(path)
+                else:
+                    changed_paths.add(path)
+                last_change = time.monotonic()
+                if first_change is None:
+                    first_change = last_change
+
+            now = time.monotonic()
+            if last_change is None or (now - last_change < debounce_seconds
+                                       and now - first_change < WATCH_MAX_DELAY_SECONDS):
+                continue
+
+            if rescan_needed:
+                print("Some file system events were lost. Comparing the whole library with the cache...")
+                songs, _ = incremental_rescan(library_path, cache_file, workers, file_timeout, use_processes,
+                                              new_header_stats())
+                songs_by_path = {song['filepath']: song for song in songs}
+            else:
+                stats = apply_changes(songs_by_path, changed_paths, removed_directories,
+                                      workers, file_timeout, use_processes, new_header_stats())
+                if stats['added'] or stats['changed'] or stats['removed']:
+                    save_songs_to_cache(list(songs_by_path.values()), cache_file)
+                    print(f"{time.strftime('%H:%M:%S')} Updated cache: {stats['added']} added, {stats['changed']} changed, "
+                          f"{stats['removed']} removed ({len(songs_by_path)} songs).")
+            changed_paths = set()
+            removed_directories = set()
+            rescan_needed = False
+            first_change = last_change = None
+    except KeyboardInterrupt:
+        print("\nStopped watching the library.")
+    finally:
+        watcher.close()
+        try:
+            os.remove(status_file_path(cache_file))
+        except OSError:
+            pass
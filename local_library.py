@@ -0,0 +1,776 @@
+import os
+import json
+import time
+from collections import deque
+from song_table import SongTable, load_song_table, save_song_table_snapshot
+from run_metrics import NO_METRICS
+
+# Shared local library layer, used by both scripts, spotify_library.py and the library watcher.
+# tinytag, header_tags and the worker pools are only imported once files actually have to be read,
+# so loading the cache (e.g. 'spotify_library.py stats') stays fast.
+
+SUPPORTED_EXTENSIONS = ('.mp3', '.flac', '.wav', '.m4a', '.ogg', '.wma', '.aiff')
+
+# Print progress every N files during a scan
+PROGRESS_EVERY = 1000
+
+# A running watcher (library_watcher.py) refreshes the status file next to the cache every WATCH_HEARTBEAT_SECONDS;
+# the cache counts as watched while the status file is younger than WATCH_STALE_SECONDS
+WATCH_HEARTBEAT_SECONDS = 10
+WATCH_STALE_SECONDS = 3 * WATCH_HEARTBEAT_SECONDS
+
+# Directory mtimes are only recorded for cache validation once they are this old, since an entry added in the same
+# clock tick (or within the coarse timestamps of network and FAT file systems) may not change the mtime again
+DIRECTORY_MTIME_SETTLE_SECONDS = 2
+
+
+def normalize_text(text):
+    """
+    Returns the case- and whitespace-insensitive form of a name, used as a lookup key.
+    """
+    return ' '.join(text.casefold().split())
+
+
+def get_file_signature(stat_result):
+    """
+    Returns the (size, mtime, inode) signature used to detect changed files.
+    Stored alongside each cached song so a rescan can skip files that have not changed.
+    """
+    return {
+        'size': stat_result.st_size,
+        'mtime': stat_result.st_mtime_ns,
+        'inode': stat_result.st_ino
+    }
+
+
+def normalize_isrc(isrc):
+    return isrc.replace('-', '').strip().upper()
+
+
+def parse_year(text):
+    """
+    Returns the year of a date tag ("1959", "1959-08-17", "1959/08"), or None if it does not start with one.
+    """
+    text = str(text).strip()[:4]
+    return int(text) if len(text) == 4 and text.isdigit() and int(text) else None
+
+
+def _first_value(value):
+    return value[0] if isinstance(value, list) and value else value or None
+
+
+def get_extra_tags(tag):
+    """
+    Returns the optional tags of a TinyTag result: those the track resolver can use, 'isrc', 'duration_ms'
+    (from the audio stream, or the ID3 TLEN frame) and 'track_number', and those playlist filters can query
+    (see library_query.py), 'genre', 'year' and 'bitrate' (kbit/s).
+    Tags the file does not carry are left out.
+    Works with tinytag 2.x, whose other tags are lists in tag.other, and 1.x, whose are strings in tag.extra.
+    """
+    extra_tags = {}
+    other = getattr(tag, 'other', None) or getattr(tag, 'extra', None) or {}
+    isrc = _first_value(other.get('isrc'))
+    if isrc:
+        isrc = normalize_isrc(isrc)
+        if isrc:
+            extra_tags['isrc'] = isrc
+    tlen = _first_value(other.get('tlen'))
+    if tag.duration:
+        extra_tags['duration_ms'] = int(tag.duration * 1000)
+    elif tlen and str(tlen).strip().isdigit():
+        extra_tags['duration_ms'] = int(tlen)
+    track = tag.track
+    if isinstance(track, str): # tinytag 1.x: "3" or "3/12"
+        track = track.split('/')[0].strip()
+        track = int(track) if track.isdigit() else None
+    if track:
+        extra_tags['track_number'] = track
+    if tag.genre and tag.genre.strip():
+        extra_tags['genre'] = tag.genre.strip()
+    if tag.year and parse_year(tag.year):
+        extra_tags['year'] = parse_year(tag.year)
+    if tag.bitrate:
+        extra_tags['bitrate'] = int(tag.bitrate)
+    return extra_tags
+
+
+def read_song_info(filepath, stat_result=None):
+    """
+    Reads the tags of a single audio file.
+    Returns a song dictionary with 'artist', 'title', 'album', 'filepath', the file signature and whichever
+    of 'isrc', 'duration_ms', 'track_number', 'genre', 'year' and 'bitrate' the file carries,
+    or None if the file has no title/artist or could not be read.
+    """
+    from tinytag import TinyTag
+    try:
+        if stat_result is None:
+            stat_result = os.stat(filepath)
+        tag = TinyTag.get(filepath)
+        if tag.title and tag.artist:
+            song_info = {
+                'artist': tag.artist.strip(),
+                'title': tag.title.strip(),
+                'album': tag.album.strip() if tag.album else "",
+                'filepath': filepath # Store the full path
+            }
+            song_info.update(get_extra_tags(tag))
+            song_info.update(get_file_signature(stat_result))
+            return song_info
+    except Exception as e:
+        # print(f"  Warning: Could not read metadata from {filepath} - {e}")
+        pass # Suppress frequent warnings for unreadable files
+    return None
+
+
+def read_song_info_from_headers(filepath, stat_result=None):
+    """
+    Header-only counterpart of read_song_info for libraries on network shares: MP3, FLAC, M4A and Ogg files
+    are read with header_tags.read_header_tags, which only reads their tag regions. Other formats use TinyTag.
+    Returns (song_info or None, bytes read or None for TinyTag, why the file gave no song or None),
+    to be recorded in a header_tags.HeaderReadStats.
+    """
+    from header_tags import can_read_headers, read_header_tags
+    if not can_read_headers(filepath):
+        song_info = read_song_info(filepath, stat_result)
+        return song_info, None, None if song_info else "no title or artist tag, or unreadable (read with TinyTag)"
+    try:
+        if stat_result is None:
+            stat_result = os.stat(filepath)
+    except OSError as e:
+        return None, 0, f"could not be read ({e})"
+    tags, bytes_read, problem = read_header_tags(filepath, stat_result.st_size)
+    title = tags.get('title', "").strip()
+    artist = tags.get('artist', "").strip()
+    if not (title and artist):
+        return None, bytes_read, problem
+    song_info = {
+        'artist': artist,
+        'title': title,
+        'album': tags.get('album', "").strip(),
+        'filepath': filepath
+    }
+    isrc = normalize_isrc(tags.get('isrc', ""))
+    if isrc:
+        song_info['isrc'] = isrc
+    if tags.get('duration_ms'):
+        song_info['duration_ms'] = tags['duration_ms']
+    track_number = tags.get('track_number', "").split('/')[0].strip()
+    if track_number.isdigit() and int(track_number):
+        song_info['track_number'] = int(track_number)
+    if tags.get('genre', "").strip():
+        song_info['genre'] = tags['genre'].strip()
+    if parse_year(tags.get('year', "")):
+        song_info['year'] = parse_year(tags['year'])
+    if tags.get('bitrate'):
+        song_info['bitrate'] = tags['bitrate']
+    song_info.update(get_file_signature(stat_result))
+    return song_info, bytes_read, None
+
+
+def scan_audio_files(library_path):
+    """
+    Walks the library with os.scandir and yields (filepath, stat_result) for every supported audio file.
+    Directory entries are classified from the listing itself, and on Windows the stat information
+    comes from the listing as well, so no separate os.stat pass is needed to build the signatures.
+    Also yields (None, None) for every other file so callers can keep an accurate processed-files count.
+    """
+    pending_dirs = [library_path]
+    while pending_dirs:
+        current_dir = pending_dirs.pop()
+        try:
+            with os.scandir(current_dir) as entries:
+                # Sorted so that repeated scans of the same tree produce songs in the same order
+                entries = sorted(entries, key=lambda entry: entry.name)
+                subdirs = []
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.name.lower().endswith(SUPPORTED_EXTENSIONS):
+                            yield entry.path, entry.stat()
+                        else:
+                            yield None, None
+                    except OSError:
+                        # File vanished or is unreadable between listing and stat
+                        yield None, None
+                # Reversed so the stack pops subdirectories in alphabetical order
+                pending_dirs.extend(reversed(subdirs))
+        except OSError as e:
+            print(f"  Warning: Could not list directory {current_dir} - {e}")
+
+
+def _collect_song_info(filepath, future):
+    """
+    Returns (filepath, song_info) for a finished tag-reading task, with None if the task failed.
+    """
+    try:
+        return filepath, future.result()
+    except Exception as e:
+        # A crashed worker process surfaces here rather than inside read_song_info
+        print(f"  Warning: Could not read metadata from {filepath} - {e}")
+    return filepath, None
+
+
+def read_song_infos(files, workers=1, file_timeout=None, use_processes=False, header_stats=None):
+    """
+    Reads tags for an iterable of (filepath, stat_result) pairs and yields (filepath, song_info),
+    where song_info is None for files without a title/artist.
+    Results are always yielded in input order, however many workers are used.
+    With workers > 1 the files are read by a thread pool (or a process pool if use_processes is True),
+    keeping a bounded number of reads in flight so slow network storage is read concurrently.
+    file_timeout only applies to the process pool, whose workers can be stopped: a file whose read takes
+    longer is skipped (see _read_song_infos_with_timeout). A thread stuck in a read cannot be stopped,
+    so the thread pool waits for every read.
+    With a header_tags.HeaderReadStats as header_stats, files are read with read_song_info_from_headers
+    and their byte counts and skipped files are recorded in it.
+    """
+    if header_stats is not None:
+        for filepath, result in _read_song_infos(files, read_song_info_from_headers, workers, file_timeout, use_processes):
+            yield filepath, header_stats.add(filepath, result)
+    else:
+        yield from _read_song_infos(files, read_song_info, workers, file_timeout, use_processes)
+
+
+def _read_song_infos(files, read_file, workers, file_timeout, use_processes):
+    if workers <= 1:
+        for filepath, stat_result in files:
+            yield filepath, read_file(filepath, stat_result)
+        return
+    if use_processes and file_timeout:
+        yield from _read_song_infos_with_timeout(files, read_file, workers, file_timeout)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    executor = executor_class(max_workers=workers)
+    max_in_flight = workers * 4
+    pending = deque()
+    try:
+        for filepath, stat_result in files:
+            pending.append((filepath, executor.submit(read_file, filepath, stat_result)))
+            if len(pending) >= max_in_flight:
+                queued_path, future = pending.popleft()
+                yield _collect_song_info(queued_path, future)
+        while pending:
+            queued_path, future = pending.popleft()
+            yield _collect_song_info(queued_path, future)
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def _stop_process_pool(executor, futures):
+    # Futures are cancelled one by one: shutdown(cancel_futures=True) needs Python 3.9
+    for future in futures:
+        future.cancel()
+    for process in list((getattr(executor, '_processes', None) or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False)
+
+
+def _read_song_infos_with_timeout(files, read_file, workers, file_timeout):
+    """
+    Process pool reading for _read_song_infos that skips a file whose read takes longer than file_timeout seconds.
+    A read is timed from the moment the pool hands it to a worker, not from when its result is awaited.
+    When a read overruns, the pool's processes are terminated and the reads that had not finished are
+    submitted again to a new pool, so a hung read neither blocks the scan nor keeps the process from exiting.
+    """
+    from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+    executor = ProcessPoolExecutor(max_workers=workers)
+    max_in_flight = workers * 4
+    pending = deque() # [filepath, stat_result, future, time the read was handed to a worker]
+    files = iter(files)
+    try:
+        while True:
+            while len(pending) < max_in_flight:
+                item = next(files, None)
+                if item is None:
+                    break
+                pending.append([item[0], item[1], executor.submit(read_file, *item), None])
+            if not pending:
+                return
+            if pending[0][2].done():
+                filepath, _, future, _ = pending.popleft()
+                yield _collect_song_info(filepath, future)
+                continue
+
+            now = time.monotonic()
+            overdue = None
+            for entry in pending:
+                if entry[3] is None and entry[2].running():
+                    entry[3] = now
+                if entry[3] is not None and not entry[2].done() and now - entry[3] > file_timeout:
+                    overdue = entry
+                    break
+            if overdue is None:
+                wait([entry[2] for entry in pending if not entry[2].done()], timeout=min(0.1, file_timeout),
+                     return_when=FIRST_COMPLETED)
+                continue
+
+            print(f"  Warning: Timed out after {file_timeout}s reading metadata from {overdue[0]}, skipping.")
+            skipped = Future()
+            skipped.set_result(None)
+            overdue[2] = skipped
+            _stop_process_pool(executor, [entry[2] for entry in pending])
+            executor = ProcessPoolExecutor(max_workers=workers)
+            for entry in pending:
+                future = entry[2]
+                if not future.done() or future.cancelled() or future.exception() is not None:
+                    entry[2], entry[3] = executor.submit(read_file, entry[0], entry[1]), None
+    finally:
+        if pending:
+            _stop_process_pool(executor, [entry[2] for entry in pending])
+        else:
+            executor.shutdown(wait=False)
+
+
+def scan_library_parallel(library_path, workers, file_timeout=None, use_processes=False, header_stats=None,
+                          untagged=None):
+    """
+    Full scan of the library using a pool of tag readers (see read_song_infos).
+    Prints the same directory and progress output as the serial scan.
+    Returns a tuple (songs, files_scanned_count), with songs in the deterministic scan order.
+    If an untagged dictionary is given, the audio files that gave no song are added to it as {filepath: signature}.
+    """
+    all_songs = []
+    files_scanned_count = 0
+    current_directory_progress = ""
+
+    audio_files = []
+    for filepath, stat_result in scan_audio_files(library_path):
+        if filepath is None:
+            files_scanned_count += 1
+        else:
+            audio_files.append((filepath, stat_result))
+
+    stat_results = dict(audio_files) if untagged is not None else None
+    for filepath, song_info in read_song_infos(audio_files, workers, file_timeout, use_processes, header_stats):
+        files_scanned_count += 1
+        directory = os.path.dirname(filepath)
+        if directory != current_directory_progress:
+            current_directory_progress = directory
+            print(f"\nScanning directory: {current_directory_progress}")
+
+        if song_info:
+            all_songs.append(song_info)
+        elif untagged is not None:
+            untagged[filepath] = get_file_signature(stat_results[filepath])
+
+        if files_scanned_count % PROGRESS_EVERY == 0:
+            print(f"  Processed {files_scanned_count} files, found {len(all_songs)} valid songs.")
+
+    return all_songs, files_scanned_count
+
+
+def save_songs_to_cache(songs, cache_file):
+    """
+    Writes the song list to the JSON cache file and returns it as a SongTable.
+    The data is written to a temporary file first and then moved over the old cache,
+    so an interrupted write never leaves a truncated cache behind.
+    The table's snapshot is written next to the cache as well, so the next load skips the JSON.
+    """
+    temp_file = cache_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(songs, f, indent=4)
+    os.replace(temp_file, cache_file)
+    table = SongTable.from_songs(songs)
+    save_song_table_snapshot(table, cache_file)
+    return table
+
+
+def untagged_files_path(cache_file):
+    return cache_file + '.untagged'
+
+
+def load_untagged_files(cache_file):
+    """
+    Returns {filepath: signature} of the audio files that gave no song when they were last read.
+    """
+    try:
+        with open(untagged_files_path(cache_file), 'r', encoding='utf-8') as f:
+            untagged = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return untagged if isinstance(untagged, dict) else {}
+
+
+def save_untagged_files(untagged, cache_file):
+    temp_file = untagged_files_path(cache_file) + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(untagged, f)
+    os.replace(temp_file, untagged_files_path(cache_file))
+
+
+def incremental_rescan(library_path, cache_file, workers=1, file_timeout=None, use_processes=False, header_stats=None):
+    """
+    Updates the cache by re-reading tags only for new or changed files.
+    A file is considered unchanged if its size, mtime and inode match the cached signature.
+    New and changed files are read with read_song_infos, so they can use a worker pool.
+    Cached songs whose files no longer exist are pruned, and the cache file is rewritten in place.
+    Files that give no song are recorded with their signature in untagged_files_path(cache_file),
+    so they are not read again until they change.
+    Returns a tuple (songs, stats) where stats holds the 'added', 'changed', 'removed', 'unchanged' and
+    'untagged' (unchanged files without a song, not read again) counts.
+    """
+    cached_songs = []
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached_songs = json.load(f)
+        except json.JSONDecodeError as e:
+            print(f"Error reading cache file {cache_file}: {e}. Every file will be re-read.")
+
+    cached_by_path = {song['filepath']: song for song in cached_songs if 'filepath' in song}
+    untagged_by_path = load_untagged_files(cache_file)
+    untagged_after_scan = {}
+
+    print(f"Performing an incremental scan of local music library at: {library_path}")
+    all_songs = []
+    stats = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0, 'untagged': 0}
+    files_scanned_count = 0
+    seen_paths = set()
+    signatures_backfilled = 0
+    files_to_read = []
+    signatures = {}
+    read_results = {}
+
+    for filepath, stat_result in scan_audio_files(library_path):
+        files_scanned_count += 1
+        if files_scanned_count % PROGRESS_EVERY == 0:
+            print(f"  Processed {files_scanned_count} files, {len(files_to_read)} new or changed.")
+        if filepath is None:
+            continue
+
+        seen_paths.add(filepath)
+        signature = get_file_signature(stat_result)
+        cached_song = cached_by_path.get(filepath)
+
+        if cached_song is not None and 'size' not in cached_song:
+            # Cache written before signatures were stored: trust the entry and record its signature
+            cached_song.update(signature)
+            all_songs.append(cached_song)
+            stats['unchanged'] += 1
+            signatures_backfilled += 1
+            continue
+
+        if cached_song is not None and all(cached_song.get(key) == value for key, value in signature.items()):
+            all_songs.append(cached_song)
+            stats['unchanged'] += 1
+            continue
+
+        if cached_song is None and untagged_by_path.get(filepath) == signature:
+            # Gave no song when it was last read and has not changed since
+            untagged_after_scan[filepath] = signature
+            stats['untagged'] += 1
+            continue
+
+        # Placeholder keeps the song in scan order until its tags have been read
+        files_to_read.append((filepath, stat_result))
+        signatures[filepath] = signature
+        all_songs.append(filepath)
+
+    for filepath, song_info in read_song_infos(files_to_read, workers, file_timeout, use_processes, header_stats):
+        if song_info:
+            read_results[filepath] = song_info
+            if filepath in cached_by_path:
+                stats['changed'] += 1
+            else:
+                stats['added'] += 1
+        else:
+            untagged_after_scan[filepath] = signatures[filepath]
+            if filepath in cached_by_path:
+                # File changed and no longer has usable tags
+                stats['removed'] += 1
+
+    all_songs = [read_results.get(song) if isinstance(song, str) else song for song in all_songs]
+    all_songs = [song for song in all_songs if song]
+
+    stats['removed'] += sum(1 for path in cached_by_path if path not in seen_paths)
+
+    print(f"\nFinished incremental scan. Processed {files_scanned_count} files: "
+          f"{stats['added']} added, {stats['changed']} changed, {stats['removed']} removed, "
+          f"{stats['unchanged']} unchanged, {stats['untagged']} without tags skipped.")
+
+    if signatures_backfilled:
+        print(f"Recorded file signatures for {signatures_backfilled} songs from an older cache.")
+
+    if stats['added'] or stats['changed'] or stats['removed'] or signatures_backfilled:
+        # Also written when every song was removed, so the cache does not keep the old entries
+        try:
+            save_songs_to_cache(all_songs, cache_file)
+            print(f"Saved {len(all_songs)} songs to cache file: {cache_file}")
+        except Exception as e:
+            print(f"Error saving data to cache file {cache_file}: {e}")
+    elif not all_songs:
+        print("No songs found to save to cache.")
+
+    if untagged_after_scan != untagged_by_path:
+        try:
+            save_untagged_files(untagged_after_scan, cache_file)
+        except OSError as e:
+            print(f"Error saving the files without tags to {untagged_files_path(cache_file)}: {e}")
+
+    return all_songs, stats
+
+
+def status_file_path(cache_file):
+    return cache_file + '.watch'
+
+
+def normalize_library_path(library_path):
+    return os.path.normcase(os.path.realpath(library_path))
+
+
+def is_cache_watched(cache_file, library_path=None):
+    """
+    Returns True if a watcher is keeping cache_file up to date, i.e. its status file was refreshed recently.
+    If library_path is given, the watcher must also be watching that library: a watcher started on another
+    library with the same cache file does not keep it current for this one.
+    """
+    try:
+        with open(status_file_path(cache_file), 'r', encoding='utf-8') as f:
+            status = json.load(f)
+        if library_path is not None and \
+                normalize_library_path(status['library_path']) != normalize_library_path(library_path):
+            return False
+        return time.time() - status['heartbeat'] < WATCH_STALE_SECONDS
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+
+def directory_state_path(cache_file):
+    return cache_file + '.dirs'
+
+
+def _check_directory(directory, recorded_mtime):
+    """
+    Returns (mtime_ns, names) for one directory holding cached songs: names is None when the directory is unchanged
+    since recorded_mtime, else the set of its entry names (empty if it is gone). mtime_ns is None if it is gone.
+    names is False when the directory exists but cannot be listed, so its files must be checked one by one.
+    """
+    try:
+        mtime = os.stat(directory or os.curdir).st_mtime_ns
+    except OSError:
+        return None, set()
+    if mtime == recorded_mtime:
+        return mtime, None
+    try:
+        with os.scandir(directory or os.curdir) as entries:
+            return mtime, {entry.name for entry in entries}
+    except OSError:
+        return mtime, False
+
+
+def validate_cached_files(songs, state_file=None, workers=1):
+    """
+    Checks which files of a SongTable still exist, one directory at a time instead of one file at a time.
+    Every directory holding cached songs is stat'ed once; if its mtime equals the one recorded in state_file by
+    the last validation, no entry was added or removed since, so all its files are present without listing it.
+    Other directories are listed once with os.scandir and their files looked up in the listing. With workers > 1
+    the directories are checked by a thread pool, which hides the round trips of a network share.
+    Afterwards, the mtimes of the directories whose files were all present are written back to state_file.
+    Returns (valid rows, number of missing files, number of directories listed, number of directories skipped).
+    """
+    directories = songs.directories.values
+    recorded = {}
+    if state_file:
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                recorded = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if not isinstance(recorded, dict):
+            recorded = {}
+
+    settled_before = time.time_ns() - DIRECTORY_MTIME_SETTLE_SECONDS * 1_000_000_000
+    recorded_mtimes = [recorded.get(directory) for directory in directories]
+    if workers > 1 and len(directories) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_check_directory, directories, recorded_mtimes))
+    else:
+        results = list(map(_check_directory, directories, recorded_mtimes))
+    listings = [names for _, names in results]
+
+    valid_rows = []
+    complete = [True] * len(directories)
+    directory_ids, filenames = songs.directory_ids, songs.filenames
+    for row, directory_id in enumerate(directory_ids):
+        names = listings[directory_id]
+        filename = filenames[row]
+        if filename and (names is None or (filename in names if names is not False
+                                           else os.path.exists(directories[directory_id] + filename))):
+            valid_rows.append(row)
+        else:
+            complete[directory_id] = False
+
+    if state_file:
+        state = {directory: mtime for directory, (mtime, _), directory_complete in zip(directories, results, complete)
+                 if mtime is not None and directory_complete and mtime < settled_before}
+        if state != recorded:
+            try:
+                temp_file = state_file + '.tmp'
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(state, f)
+                os.replace(temp_file, state_file)
+            except OSError as e:
+                print(f"Error writing the directory state file {state_file}: {e}")
+
+    skipped_count = sum(1 for names in listings if names is None)
+    return valid_rows, len(songs) - len(valid_rows), len(directories) - skipped_count, skipped_count
+
+
+def skipped_files_path(cache_file):
+    return cache_file + '.skipped'
+
+
+def report_header_read_stats(header_stats, cache_file, metrics=NO_METRICS, phase='scan'):
+    """
+    Prints the totals of a header-only scan, writes its skipped files next to the cache and records them in metrics.
+    """
+    print(header_stats.summary())
+    try:
+        header_stats.write_skipped(skipped_files_path(cache_file))
+        if header_stats.skipped:
+            print(f"Skipped files and the reasons are listed in {skipped_files_path(cache_file)}")
+    except OSError as e:
+        print(f"Error writing the skipped files to {skipped_files_path(cache_file)}: {e}")
+    metrics.count(phase, 'bytes_read', header_stats.bytes_read)
+    metrics.count(phase, 'skipped_files', len(header_stats.skipped))
+
+
+def get_songs_from_local_library_with_cache(library_path, cache_file, force_rescan=False, incremental=False,
+                                            workers=1, file_timeout=None, use_processes=False, metrics=None,
+                                            header_only=False):
+    """
+    Scans a local music library and extracts song details, with caching.
+    Returns a SongTable (see song_table.py) that behaves like a list of dictionaries,
+    each with 'artist', 'title', 'album', 'filepath'.
+    The 'filepath' is included to check for file existence when loading from cache.
+    Includes progress output for large scans.
+    With incremental=True, only new or changed files are re-read (see local_library.incremental_rescan).
+    With workers > 1, tags are read by a worker pool (see local_library.read_song_infos) and the directories of a
+    cache are checked by a thread pool (see local_library.validate_cached_files).
+    With header_only=True, files are read with read_song_info_from_headers; the bytes read are reported and the
+    files that gave no song are listed in skipped_files_path(cache_file).
+    A RunMetrics, if given, records the 'incremental_scan', 'cache_validate' and 'scan' phases.
+    Shared by both scripts and the 'scan' subcommand of spotify_library.py.
+    """
+    if metrics is None:
+        metrics = NO_METRICS
+    header_stats = None
+    if header_only:
+        from header_tags import HeaderReadStats
+        header_stats = HeaderReadStats()
+    if incremental and not force_rescan:
+        with metrics.phase('incremental_scan'):
+            songs, stats = incremental_rescan(library_path, cache_file, workers, file_timeout, use_processes, header_stats)
+        metrics.count('incremental_scan', 'songs', len(songs))
+        metrics.count('incremental_scan', 'files_read', stats['added'] + stats['changed'])
+        if header_stats is not None:
+            report_header_read_stats(header_stats, cache_file, metrics, 'incremental_scan')
+        return SongTable.from_songs(songs)
+
+    if os.path.exists(cache_file) and not force_rescan:
+        print(f"Loading song data from cache file: {cache_file}")
+        try:
+            with metrics.phase('cache_validate'):
+                cached_songs = load_song_table(cache_file)
+
+                if is_cache_watched(cache_file, library_path):
+                    # A running watcher (see library_watcher.py) keeps the cache current, so the existence check can be skipped
+                    print(f"Loaded {len(cached_songs)} songs from cache (kept up to date by the library watcher).")
+                    metrics.count('cache_validate', 'songs', len(cached_songs))
+                    return cached_songs
+            
+                # Basic validation: Check if files still exist from the cached data, one directory listing at a time
+                valid_rows, missing_files_count, listed_count, unchanged_count = validate_cached_files(
+                    cached_songs, directory_state_path(cache_file), workers)
+                print(f"Checked {listed_count + unchanged_count} folders ({unchanged_count} unchanged since the last check).")
+                metrics.count('cache_validate', 'directories_listed', listed_count)
+                metrics.count('cache_validate', 'directories_unchanged', unchanged_count)
+                valid_cached_songs = cached_songs.select(valid_rows) if missing_files_count else cached_songs
+            metrics.count('cache_validate', 'songs', len(cached_songs))
+            
+            # If a significant portion of files are missing (e.g., >10%), force rescan
+            if len(cached_songs) > 0 and (missing_files_count / len(cached_songs)) > 0.1:
+                print(f"More than 10% ({missing_files_count}/{len(cached_songs)}) of cached files are missing. Forcing a full rescan.")
+            elif missing_files_count > 0:
+                print(f"Loaded {len(valid_cached_songs)} valid songs from cache ({missing_files_count} missing files).")
+                return valid_cached_songs
+            else:
+                print(f"Loaded {len(valid_cached_songs)} valid songs from cache (no missing files detected).")
+                return valid_cached_songs
+
+        except json.JSONDecodeError as e:
+            print(f"Error reading cache file {cache_file}: {e}. Forcing a full rescan.")
+        except Exception as e:
+            print(f"An unexpected error occurred while loading cache: {e}. Forcing a full rescan.")
+
+    # If cache not found, invalid, or force_rescan is True, perform full scan
+    print(f"Performing a full scan of local music library at: {library_path} (This may take a while for large libraries)")
+    untagged = {} # Files without a song, so an incremental rescan does not read them again
+    with metrics.phase('scan'):
+        if workers > 1:
+            all_songs, files_scanned_count = scan_library_parallel(library_path, workers, file_timeout, use_processes,
+                                                                   header_stats, untagged)
+            songs_found_count = len(all_songs)
+        else:
+            all_songs = []
+
+            files_scanned_count = 0
+            songs_found_count = 0
+            current_directory_progress = ""
+    
+            # Iterate over directories and files
+            for root, dirs, files in os.walk(library_path):
+                # Update current directory if it changes
+                if root != current_directory_progress:
+                    current_directory_progress = root
+                    print(f"\nScanning directory: {current_directory_progress}")
+
+                for file in files:
+                    files_scanned_count += 1
+                    filepath = os.path.join(root, file)
+            
+                    if file.lower().endswith(SUPPORTED_EXTENSIONS):
+                        if header_stats is not None:
+                            song_info = header_stats.add(filepath, read_song_info_from_headers(filepath))
+                        else:
+                            song_info = read_song_info(filepath)
+                        if song_info:
+                            all_songs.append(song_info)
+                            songs_found_count += 1
+                        else:
+                            try:
+                                untagged[filepath] = get_file_signature(os.stat(filepath))
+                            except OSError:
+                                pass
+            
+                    # Print progress every 1000 files (adjust as needed)
+                    if files_scanned_count % 1000 == 0:
+                        print(f"  Processed {files_scanned_count} files, found {songs_found_count} valid songs.")
+    metrics.count('scan', 'files', files_scanned_count)
+    metrics.count('scan', 'songs', songs_found_count)
+
+    print(f"\nFinished scanning. Processed {files_scanned_count} files, found {songs_found_count} songs with title and artist.")
+    if header_stats is not None:
+        report_header_read_stats(header_stats, cache_file, metrics, 'scan')
+    try:
+        save_untagged_files(untagged, cache_file)
+    except OSError as e:
+        print(f"Error saving the files without tags to {untagged_files_path(cache_file)}: {e}")
+
+    # Save the scanned data to cache
+    if all_songs:
+        try:
+            songs = save_songs_to_cache(all_songs, cache_file)
+            print(f"Saved {len(all_songs)} songs to cache file: {cache_file}")
+            return songs
+        except Exception as e:
+            print(f"Error saving data to cache file {cache_file}: {e}")
+    else:
+        print("No songs found to save to cache.")
+
+    return SongTable.from_songs(all_songs)
@@ -0,0 +1,56 @@
+import json
+from library_query import validate_filter
+from playlist_sampler import WEIGHTING_MODES
+
+# Playlist specs for the batch mode of Spotify_GeneratePlaylist.py ('--batch').
+# The batch file is JSON: {"playlists": [spec, ...]}, where each spec has a "name" and optionally any of
+# SPEC_KEYS; keys that are left out take the script's settings. The "filter" takes the keys of
+# library_query.FILTER_KEYS. All playlists share one library load, one LibraryIndex, one Spotify client
+# and one resolution pass over the union of their selected songs.
+#
+#   {"playlists": [
+#       {"name": "Jazz Evening", "size": 200, "max_songs_per_artist": 2,
+#        "filter": {"genres": ["Jazz"], "min_year": 1955, "max_year": 1965, "max_duration_seconds": 360}},
+#       {"name": "Fresh Additions", "size": 500, "weighting": "recent", "filter": {"added_within_days": 30}},
+#       {"name": "Short Songs", "sync": true, "filter": {"max_duration_seconds": 180}}
+#   ]}
+
+SPEC_KEYS = ('name', 'description', 'public', 'size', 'max_songs_per_artist', 'weighting', 'seed', 'sync', 'filter')
+
+# Spotify playlists hold at most 10,000 tracks
+MAX_PLAYLIST_SIZE = 10000
+
+
+def load_playlist_specs(batch_file, defaults):
+    """
+    Reads and validates the playlist specs of a batch file.
+    defaults supplies every SPEC_KEYS value a spec leaves out (except 'name').
+    Returns the specs as complete dictionaries. Raises ValueError for an invalid file or spec.
+    """
+    try:
+        with open(batch_file, 'r', encoding='utf-8') as f:
+            batch = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Could not read playlist batch file {batch_file}: {e}")
+    if not isinstance(batch, dict) or not isinstance(batch.get('playlists'), list) or not batch['playlists']:
+        raise ValueError(f"{batch_file} must hold a non-empty 'playlists' list")
+
+    specs = []
+    for position, spec in enumerate(batch['playlists'], start=1):
+        if not isinstance(spec, dict) or not isinstance(spec.get('name'), str) or not spec['name'].strip():
+            raise ValueError(f"Playlist {position} in {batch_file} needs a 'name'")
+        unknown_keys = set(spec) - set(SPEC_KEYS)
+        if unknown_keys:
+            raise ValueError(f"Unknown keys for playlist '{spec['name']}': {', '.join(sorted(unknown_keys))}")
+        song_filter = spec.get('filter', defaults.get('filter')) or {}
+        validate_filter(song_filter, f"filter of playlist '{spec['name']}'")
+        spec = {key: spec.get(key, defaults.get(key)) for key in SPEC_KEYS}
+        spec['filter'] = song_filter
+        if not isinstance(spec['size'], int) or not 0 < spec['size'] <= MAX_PLAYLIST_SIZE:
+            raise ValueError(f"The size of playlist '{spec['name']}' must be between 1 and {MAX_PLAYLIST_SIZE}")
+        if not isinstance(spec['max_songs_per_artist'], int) or spec['max_songs_per_artist'] <= 0:
+            raise ValueError(f"max_songs_per_artist of playlist '{spec['name']}' must be a positive integer")
+        if spec['weighting'] not in WEIGHTING_MODES:
+            raise ValueError(f"Unknown weighting {spec['weighting']!r} for playlist '{spec['name']}'")
+        specs.append(spec)
+    return specs
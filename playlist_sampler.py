@@ -0,0 +1,95 @@
+import heapq
+import random
+from song_table import SongTable, MISSING_SIGNED
+
+# Artist-capped random song selection for playlists, in time linear in the library size plus the number of picks.
+# Every artist gets a queue holding a random order of (at most max_songs_per_artist of) their songs.
+# Artists are then visited round-robin in a random order, taking the next song from each queue,
+# until the target is reached or every queue is empty.
+
+WEIGHTING_MODES = (None, 'albums', 'recent')
+
+
+def _weighted_order(items, weights, rng, count=None):
+    """
+    Returns items in a random order where items with larger weights tend to come first
+    (weighted sampling without replacement, using keys u ** (1 / weight)).
+    If count is given, only the first count items of that order are computed.
+    """
+    keyed = ((rng.random() ** (1.0 / weight), index) for index, weight in enumerate(weights))
+    if count is None or count >= len(items):
+        order = sorted(keyed, reverse=True)
+    else:
+        order = heapq.nlargest(count, keyed)
+    return [items[index] for _, index in order]
+
+
+def _recency_weights(mtimes, rows, oldest, span):
+    """
+    Weights between 1 and 4 based on file modification time: the newest files are picked up to 4x as often.
+    Rows without a stored mtime count as the oldest.
+    """
+    return [1.0 + 3.0 * (max(mtimes[row], oldest) - oldest) / span for row in rows]
+
+
+def select_songs(local_songs, num_songs, max_songs_per_artist, rng=None, weighting=None):
+    """
+    Picks up to num_songs songs from a SongTable, at most max_songs_per_artist per artist.
+    Songs are taken round-robin over the artists (in random order) so the selection is spread over as many
+    artists as possible. Returns a list of SongView rows in pick order.
+
+    rng: a random.Random instance; pass random.Random(seed) for a reproducible selection.
+    weighting: None for a uniform selection, 'albums' to visit artists with more albums earlier in each round,
+    or 'recent' to favour recently modified (added) files, both within an artist and when ordering artists.
+    """
+    if not isinstance(local_songs, SongTable):
+        local_songs = SongTable.from_songs(local_songs)
+    if weighting not in WEIGHTING_MODES:
+        raise ValueError(f"Unknown weighting mode {weighting!r}, expected one of {WEIGHTING_MODES}")
+    rng = rng or random.Random()
+    if num_songs <= 0 or max_songs_per_artist <= 0:
+        return []
+
+    artist_ids = list(range(len(local_songs.rows_by_artist)))
+    mtimes = local_songs.integers['mtime']
+    oldest = span = None
+    if weighting == 'recent':
+        known_mtimes = [mtime for mtime in mtimes if mtime != MISSING_SIGNED]
+        oldest = min(known_mtimes, default=0)
+        span = max(1, max(known_mtimes, default=0) - oldest)
+
+    # Per-artist queues: only the songs that can actually be picked (at most the cap) are drawn
+    queues = []
+    artist_weights = []
+    for artist_id in artist_ids:
+        rows = local_songs.rows_by_artist[artist_id]
+        take = min(len(rows), max_songs_per_artist)
+        if weighting == 'recent':
+            song_weights = _recency_weights(mtimes, rows, oldest, span)
+            queues.append(_weighted_order(list(rows), song_weights, rng, take))
+            artist_weights.append(max(song_weights))
+        else:
+            queues.append(rng.sample(list(rows), take))
+            if weighting == 'albums':
+                album_ids = local_songs.interned_ids['album']
+                artist_weights.append(float(len({album_ids[row] for row in rows})))
+
+    # Artist visiting order, shared by all rounds
+    if weighting is None:
+        rng.shuffle(artist_ids)
+    else:
+        artist_ids = _weighted_order(artist_ids, artist_weights, rng)
+    artist_ids = [artist_id for artist_id in artist_ids if queues[artist_id]]
+
+    selected_rows = []
+    round_index = 0
+    while artist_ids:
+        for artist_id in artist_ids:
+            selected_rows.append(queues[artist_id][round_index])
+            if len(selected_rows) >= num_songs:
+                return [local_songs[row] for row in selected_rows]
+        round_index += 1
+        # Drop artists whose queue is used up, so each round only visits artists that still have songs
+        artist_ids = [artist_id for artist_id in artist_ids if len(queues[artist_id]) > round_index]
+
+    return [local_songs[row] for row in selected_rows]
@@ -0,0 +1,143 @@
+import os
+import json
+from collections import Counter
+
+# Incremental playlist sync, used by Spotify_GeneratePlaylist.py with '--sync'.
+# Instead of creating a new playlist on every run, an existing playlist is changed into the newly resolved
+# set of tracks with as few requests as possible: only tracks that are no longer wanted are removed and only
+# missing tracks are added, in batches of 100. Tracks that stay are not touched, so their order is kept.
+# Removals are sent with the snapshot ID the diff was computed from, so Spotify applies them to that version.
+# After a sync the playlist's tracks are remembered with its new snapshot ID; while Spotify still reports
+# that snapshot ID, the next sync uses them instead of paging through the whole playlist again.
+# Only Spotify tracks take part in the diff; local files and podcast episodes in the playlist are left alone.
+
+# Spotify accepts at most 100 items per add or remove request, and returns at most 100 items per page
+PLAYLIST_BATCH_SIZE = 100
+USER_PLAYLISTS_PAGE_SIZE = 50
+
+# Attempts at reading a consistent copy of a playlist that keeps changing while it is paged through
+READ_ATTEMPTS = 3
+
+TRACK_URI_PREFIX = 'spotify:track:'
+
+
+def find_user_playlist(sp, user_id, name):
+    """
+    Returns the first of the current user's playlists that is owned by user_id and named name, or None.
+    """
+    offset = 0
+    while True:
+        page = sp.current_user_playlists(limit=USER_PLAYLISTS_PAGE_SIZE, offset=offset)
+        for playlist in page['items']:
+            if playlist and playlist['name'] == name and playlist['owner']['id'] == user_id:
+                return playlist
+        if not page.get('next'):
+            return None
+        offset += USER_PLAYLISTS_PAGE_SIZE
+
+
+def get_snapshot_id(sp, playlist_id):
+    return sp.playlist(playlist_id, fields='snapshot_id')['snapshot_id']
+
+
+def read_playlist_track_uris(sp, playlist_id, snapshot_id=None):
+    """
+    Pages through a playlist and returns (track URIs in playlist order, snapshot ID they belong to).
+    If the snapshot ID changes while the pages are read, the playlist is read again (up to READ_ATTEMPTS times).
+    """
+    if snapshot_id is None:
+        snapshot_id = get_snapshot_id(sp, playlist_id)
+    for _ in range(READ_ATTEMPTS):
+        uris = []
+        offset = 0
+        while True:
+            page = sp.playlist_items(playlist_id, fields='items(track(uri)),next', limit=PLAYLIST_BATCH_SIZE,
+                                     offset=offset, additional_types=('track',))
+            for item in page['items']:
+                track = item.get('track')
+                if track and (track.get('uri') or "").startswith(TRACK_URI_PREFIX):
+                    uris.append(track['uri'])
+            if not page.get('next'):
+                break
+            offset += PLAYLIST_BATCH_SIZE
+        current_snapshot_id = get_snapshot_id(sp, playlist_id)
+        if current_snapshot_id == snapshot_id:
+            break
+        print("  The playlist changed while it was being read; reading it again.")
+        snapshot_id = current_snapshot_id
+    return uris, snapshot_id
+
+
+def compute_playlist_diff(current_uris, target_uris):
+    """
+    Returns (URIs to remove, URIs to add) that turn the playlist current_uris into the set target_uris.
+    A wanted track listed more than once is removed (Spotify removes every occurrence) and added back once.
+    URIs to add keep the order of target_uris.
+    """
+    target = dict.fromkeys(target_uris)
+    counts = Counter(current_uris)
+    uris_to_remove = [uri for uri, count in counts.items() if uri not in target or count > 1]
+    kept = {uri for uri, count in counts.items() if uri in target and count == 1}
+    uris_to_add = [uri for uri in target if uri not in kept]
+    return uris_to_remove, uris_to_add
+
+
+def load_sync_state(state_file):
+    if not state_file or not os.path.exists(state_file):
+        return {}
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"  Warning: Could not read playlist sync state {state_file} - {e}")
+        return {}
+
+
+def save_sync_state(state_file, state):
+    temp_file = state_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(temp_file, state_file)
+
+
+def sync_playlist(sp, playlist_id, target_uris, state_file=None):
+    """
+    Makes the playlist hold exactly the tracks in target_uris, sending only the needed removes and adds.
+    state_file remembers each synced playlist's tracks and snapshot ID between runs (None to always read the playlist).
+    Returns stats with the 'kept', 'removed' and 'added' track counts. Spotify API errors are raised to the caller;
+    the sync can simply be run again, since the diff is computed from the playlist's current contents.
+    """
+    state = load_sync_state(state_file)
+    snapshot_id = get_snapshot_id(sp, playlist_id)
+    remembered = state.get(playlist_id)
+    if remembered and remembered.get('snapshot_id') == snapshot_id:
+        current_uris = remembered['uris']
+        print(f"The playlist is unchanged since the last sync ({len(current_uris)} tracks).")
+    else:
+        print("Reading the current tracks of the playlist...")
+        current_uris, snapshot_id = read_playlist_track_uris(sp, playlist_id, snapshot_id)
+        print(f"  The playlist has {len(current_uris)} tracks.")
+
+    uris_to_remove, uris_to_add = compute_playlist_diff(current_uris, target_uris)
+    print(f"Removing {len(uris_to_remove)} and adding {len(uris_to_add)} tracks to bring the playlist up to date.")
+    if state_file:
+        # Forget the remembered tracks until the sync has finished, in case it is interrupted
+        state.pop(playlist_id, None)
+        save_sync_state(state_file, state)
+
+    for i in range(0, len(uris_to_remove), PLAYLIST_BATCH_SIZE):
+        result = sp.playlist_remove_all_occurrences_of_items(playlist_id, uris_to_remove[i:i + PLAYLIST_BATCH_SIZE],
+                                                             snapshot_id=snapshot_id)
+        snapshot_id = result['snapshot_id']
+    for i in range(0, len(uris_to_add), PLAYLIST_BATCH_SIZE):
+        result = sp.playlist_add_items(playlist_id, uris_to_add[i:i + PLAYLIST_BATCH_SIZE])
+        snapshot_id = result['snapshot_id']
+        print(f"  Added {min(i + PLAYLIST_BATCH_SIZE, len(uris_to_add))}/{len(uris_to_add)} tracks to playlist.")
+
+    removed = set(uris_to_remove)
+    kept_uris = [uri for uri in current_uris if uri not in removed]
+    if state_file:
+        state[playlist_id] = {'snapshot_id': snapshot_id, 'uris': kept_uris + uris_to_add}
+        save_sync_state(state_file, state)
+    return {'kept': len(kept_uris), 'removed': sum(1 for uri in current_uris if uri in removed),
+            'added': len(uris_to_add)}
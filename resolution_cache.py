@@ -0,0 +1,156 @@
+import time
+import sqlite3
+import threading
+from local_library import normalize_text
+
+# Persistent cache of Spotify search results, shared by Spotify_GeneratePlaylist.py and Spotify_FollowArtists.py.
+# Tracks are keyed on the normalized (artist, title, album) and artists on the normalized artist name.
+# Both successful lookups and "not found" answers are cached; "not found" entries expire sooner
+# so newly released music is picked up again.
+
+DEFAULT_FOUND_TTL_DAYS = 30
+DEFAULT_NOT_FOUND_TTL_DAYS = 3
+
+# Commit every N writes; the rest is committed by close()
+COMMIT_EVERY = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resolutions (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    spotify_id TEXT,
+    resolved_at REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+"""
+
+
+def track_key(artist, title, album):
+    """
+    Returns the cache key for a track.
+    """
+    return '\x1f'.join(normalize_text(value or "") for value in (artist, title, album))
+
+
+def artist_key(artist_name):
+    """
+    Returns the cache key for an artist.
+    """
+    return normalize_text(artist_name or "")
+
+
+class ResolutionCache:
+    """
+    On-disk cache of Spotify track URIs and artist IDs with separate TTLs for found and not-found results.
+    lookup_* return a tuple (cached, value): cached is False on a miss, and value is None
+    for a cached "not found" answer. With enabled=False every lookup is a miss and nothing is stored.
+    The cache can be shared by the worker threads of spotify_resolver.resolve_in_order.
+    """
+
+    def __init__(self, db_path, found_ttl_days=DEFAULT_FOUND_TTL_DAYS, not_found_ttl_days=DEFAULT_NOT_FOUND_TTL_DAYS,
+                 enabled=True):
+        self.db_path = db_path
+        self.found_ttl = found_ttl_days * 86400
+        self.not_found_ttl = not_found_ttl_days * 86400
+        self.enabled = enabled
+        self.stats = {'hits': 0, 'not_found_hits': 0, 'misses': 0, 'expired': 0, 'writes': 0}
+        self._pending_writes = 0
+        self.lock = threading.Lock()
+        self.conn = None
+        if enabled:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+
+    def _lookup(self, kind, key):
+        with self.lock:
+            return self._lookup_locked(kind, key)
+
+    def _lookup_locked(self, kind, key):
+        if not self.enabled:
+            self.stats['misses'] += 1
+            return False, None
+        row = self.conn.execute("SELECT spotify_id, resolved_at FROM resolutions WHERE kind = ? AND key = ?",
+                                (kind, key)).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return False, None
+        spotify_id, resolved_at = row
+        ttl = self.found_ttl if spotify_id is not None else self.not_found_ttl
+        if time.time() - resolved_at > ttl:
+            self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            return False, None
+        self.stats['hits'] += 1
+        if spotify_id is None:
+            self.stats['not_found_hits'] += 1
+        return True, spotify_id
+
+    def _store(self, kind, key, spotify_id):
+        if not self.enabled:
+            return
+        with self.lock:
+            self._store_locked(kind, key, spotify_id)
+
+    def _store_locked(self, kind, key, spotify_id):
+        self.conn.execute("INSERT OR REPLACE INTO resolutions (kind, key, spotify_id, resolved_at) VALUES (?, ?, ?, ?)",
+                          (kind, key, spotify_id, time.time()))
+        self.stats['writes'] += 1
+        self._pending_writes += 1
+        if self._pending_writes >= COMMIT_EVERY:
+            self.conn.commit()
+            self._pending_writes = 0
+
+    def lookup_track(self, artist, title, album):
+        return self._lookup('track', track_key(artist, title, album))
+
+    def store_track(self, artist, title, album, track_uri):
+        """
+        Stores the resolved track URI, or None if the track was not found on Spotify.
+        """
+        self._store('track', track_key(artist, title, album), track_uri)
+
+    def lookup_artist(self, artist_name):
+        return self._lookup('artist', artist_key(artist_name))
+
+    def store_artist(self, artist_name, artist_id):
+        """
+        Stores the resolved artist ID, or None if the artist was not found on Spotify.
+        """
+        self._store('artist', artist_key(artist_name), artist_id)
+
+    def invalidate(self, kind=None):
+        """
+        Removes all cached entries, or only those of one kind ('track' or 'artist').
+        Returns the number of entries removed.
+        """
+        if not self.enabled:
+            return 0
+        with self.lock:
+            if kind is None:
+                cursor = self.conn.execute("DELETE FROM resolutions")
+            else:
+                cursor = self.conn.execute("DELETE FROM resolutions WHERE kind = ?", (kind,))
+            self.conn.commit()
+            self._pending_writes = 0
+            return cursor.rowcount
+
+    def hit_rate(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def print_stats(self):
+        if not self.enabled:
+            print("Resolution cache: disabled for this run.")
+            return
+        print(f"Resolution cache: {self.stats['hits']} hits ({self.stats['not_found_hits']} cached as not found), "
+              f"{self.stats['misses']} misses ({self.stats['expired']} expired), "
+              f"hit rate {self.hit_rate():.0%}.")
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.commit()
+                self.conn.close()
+                self.conn = None
@@ -0,0 +1,99 @@
+import os
+import json
+import time
+
+# Append-only journal for long Spotify runs, so an interrupted run can be resumed with '--resume'.
+# Every step that must not be repeated (the playlist that was created, the songs that were selected,
+# each resolved song, each completed add or follow batch) is appended as one JSON line and flushed
+# before the run moves on. A crash can at most leave a partial last line, which is dropped on resume.
+
+# Version 2: 'added' records list the indexes of the selected songs in the batch, since batches are
+# now added while songs are still being resolved
+JOURNAL_VERSION = 2
+
+
+def read_journal(path, kind):
+    """
+    Reads the records of a journal file, skipping a partial last line.
+    Returns (records, valid_size), where valid_size is the length of the file up to the last complete record.
+    Returns ([], 0) if the file does not exist or was written by a different kind of run or journal version.
+    """
+    if not os.path.exists(path):
+        return [], 0
+    records = []
+    valid_size = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break # Torn write from a crash; nothing after it can be trusted
+            if not line.endswith(b'\n'):
+                break
+            records.append(record)
+            valid_size += len(line)
+    if not records or records[0].get('type') != 'run' or records[0].get('kind') != kind \
+            or records[0].get('version') != JOURNAL_VERSION:
+        return [], 0
+    return records, valid_size
+
+
+class RunJournal:
+    """
+    Journal of one run of kind 'playlist' or 'follow'.
+    With resume=True the records of an unfinished earlier run are loaded and new records are appended to them;
+    otherwise (or if the last run finished) a new journal is started. `resumed` tells which one happened.
+    """
+
+    def __init__(self, path, kind, resume=False):
+        self.path = path
+        self.kind = kind
+        self.records = []
+        valid_size = 0
+        if resume:
+            self.records, valid_size = read_journal(path, kind)
+            if self.records and self.records[-1].get('type') == 'complete':
+                self.records, valid_size = [], 0
+        self.resumed = bool(self.records)
+        # Binary mode, so valid_size (a byte count) can be used with truncate and seek,
+        # whatever the track names are and however the platform translates newlines
+        if self.resumed:
+            self.file = open(path, 'r+b')
+            self.file.truncate(valid_size)
+            self.file.seek(valid_size)
+        else:
+            self.file = open(path, 'wb')
+            self.append('run', sync=True, kind=kind, version=JOURNAL_VERSION, started_at=time.time())
+
+    def append(self, record_type, sync=False, **fields):
+        """
+        Appends a record and flushes it to the OS. With sync=True it is also fsynced to disk,
+        for records that mark work on Spotify's side as done.
+        """
+        record = {'type': record_type, **fields}
+        self.records.append(record)
+        self.file.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def records_of(self, record_type):
+        return [record for record in self.records if record['type'] == record_type]
+
+    def last(self, record_type):
+        """
+        Returns the last record of the given type, or None.
+        """
+        for record in reversed(self.records):
+            if record['type'] == record_type:
+                return record
+        return None
+
+    def complete(self):
+        """
+        Marks the run as finished; a later '--resume' then starts a new run.
+        """
+        self.append('complete', sync=True, finished_at=time.time())
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import bisect
+import threading
+import contextlib
+
+# Per-run instrumentation for both scripts, enabled with '--metrics'.
+# Records the wall time and item counts of each phase (scan, cache validation, selection, resolution, upload...),
+# every Spotify API call by endpoint (spotipy method) with its status and a latency histogram,
+# and the statistics of the resolution cache and the rate limiter.
+# The report is written as JSON and optionally as a Prometheus textfile (for node_exporter's textfile collector).
+# A disabled RunMetrics does nothing: phase() returns a shared no-op context and the Spotify client is not wrapped.
+
+# Upper bounds (seconds) of the API latency histogram buckets, as in Prometheus' default buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_PREFIX = 'spotify_library'
+
+_NO_PHASE = contextlib.nullcontext()
+
+
+class LatencyHistogram:
+    """
+    Histogram of call durations over LATENCY_BUCKETS. counts[i] is the number of calls in bucket i alone
+    (not cumulative); the last count holds the calls slower than the largest bound.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum_seconds': round(self.total, 6),
+            'max_seconds': round(self.max, 6),
+            'buckets': {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), self.counts)}
+        }
+
+
+class _Phase:
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        with self.metrics.lock:
+            phase = self.metrics._get_phase(self.name)
+            phase['seconds'] += elapsed
+            phase['runs'] += 1
+        return False
+
+
+class InstrumentedSpotify:
+    """
+    Wraps a spotipy.Spotify client and records every method call in a RunMetrics: its duration and its
+    outcome ('ok' or the HTTP status of the SpotifyException), by method name.
+    """
+
+    def __init__(self, sp, metrics):
+        # Imported here so that loading this module (e.g. for NO_METRICS) does not load spotipy
+        from spotipy import SpotifyException
+        self.sp = sp
+        self.metrics = metrics
+        self.spotify_exception = SpotifyException
+
+    def __getattr__(self, name):
+        attribute = getattr(self.sp, name)
+        if not callable(attribute):
+            return attribute
+
+        def instrumented_call(*args, **kwargs):
+            start = time.perf_counter()
+            status = 'ok'
+            try:
+                return attribute(*args, **kwargs)
+            except self.spotify_exception as e:
+                status = str(e.http_status)
+                raise
+            except Exception:
+                status = 'error'
+                raise
+            finally:
+                self.metrics.record_call(name, time.perf_counter() - start, status)
+        return instrumented_call
+
+
+class RunMetrics:
+    """
+    Metrics of one run of a script ('playlist' or 'follow').
+    """
+
+    def __init__(self, script, enabled=True):
+        self.script = script
+        self.enabled = enabled
+        self.started_at = time.time()
+        self.lock = threading.Lock()
+        self.phases = {}
+        self.calls = {} # Endpoint -> {status: count}
+        self.latencies = {} # Endpoint -> LatencyHistogram
+        self.caches = {}
+        self.client = {}
+
+    def _get_phase(self, name):
+        if name not in self.phases:
+            self.phases[name] = {'seconds': 0.0, 'runs': 0, 'items': {}}
+        return self.phases[name]
+
+    def phase(self, name):
+        """
+        Context manager timing one phase. Entering the same phase again adds to its time.
+        """
+        if not self.enabled:
+            return _NO_PHASE
+        return _Phase(self, name)
+
+    def count(self, phase, unit, amount=1):
+        """
+        Adds amount processed items of a unit ('files', 'songs', 'tracks', 'artists') to a phase.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            items = self._get_phase(phase)['items']
+            items[unit] = items.get(unit, 0) + amount
+
+    def instrument(self, sp):
+        """
+        Returns sp wrapped in an InstrumentedSpotify, or sp itself when disabled.
+        """
+        return InstrumentedSpotify(sp, self) if self.enabled else sp
+
+    def record_call(self, endpoint, seconds, status):
+        with self.lock:
+            statuses = self.calls.setdefault(endpoint, {})
+            statuses[status] = statuses.get(status, 0) + 1
+            self.latencies.setdefault(endpoint, LatencyHistogram()).observe(seconds)
+
+    def record_cache(self, name, stats, hit_rate):
+        if self.enabled:
+            self.caches[name] = dict(stats, hit_rate=round(hit_rate, 4))
+
+    def record_client(self, stats):
+        """
+        Records the RateLimitedSpotify statistics (calls, retries, rate-limited responses).
+        """
+        if self.enabled:
+            self.client = dict(stats)
+
+    def to_dict(self):
+        phases = {}
+        for name, phase in self.phases.items():
+            report = {'seconds': round(phase['seconds'], 4), 'runs': phase['runs'], 'items': dict(phase['items'])}
+            for unit, amount in phase['items'].items():
+                report[f"{unit}_per_second"] = round(amount / phase['seconds'], 1) if phase['seconds'] else None
+            phases[name] = report
+        api = {}
+        for endpoint, statuses in self.calls.items():
+            api[endpoint] = {'calls': sum(statuses.values()), 'statuses': dict(statuses),
+                             'latency': self.latencies[endpoint].to_dict()}
+        return {
+            'script': self.script,
+            'started_at': self.started_at,
+            'wall_seconds': round(time.time() - self.started_at, 4),
+            'phases': phases,
+            'api': api,
+            'api_calls': sum(endpoint['calls'] for endpoint in api.values()),
+            'rate_limited_responses': sum(statuses.get('429', 0) for statuses in self.calls.values()),
+            'client': self.client,
+            'caches': self.caches
+        }
+
+    def to_prometheus(self):
+        """
+        Returns the report in the Prometheus text exposition format.
+        Counts are exported as gauges, since every run replaces the values of the previous one.
+        """
+        report = self.to_dict()
+        script = f'script="{self.script}"'
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{PROMETHEUS_PREFIX}_{name}{{{','.join((script,) + labels)}}} {value}")
+
+        metric('run_start_timestamp_seconds', 'gauge', "Start time of the run.", [((), report['started_at'])])
+        metric('run_duration_seconds', 'gauge', "Wall time of the run.", [((), report['wall_seconds'])])
+        metric('phase_duration_seconds', 'gauge', "Wall time spent in each phase.",
+               [((f'phase="{name}"',), phase['seconds']) for name, phase in report['phases'].items()])
+        metric('phase_items', 'gauge', "Items processed in each phase.",
+               [((f'phase="{name}"', f'unit="{unit}"'), amount)
+                for name, phase in report['phases'].items() for unit, amount in phase['items'].items()])
+        metric('api_calls', 'gauge', "Spotify API calls by endpoint and outcome.",
+               [((f'endpoint="{endpoint}"', f'status="{status}"'), count)
+                for endpoint, statuses in self.calls.items() for status, count in statuses.items()])
+
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_api_call_duration_seconds Spotify API call latency.")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_api_call_duration_seconds histogram")
+        for endpoint, histogram in self.latencies.items():
+            labels = f'{script},endpoint="{endpoint}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'{PROMETHEUS_PREFIX}_api_call_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{PROMETHEUS_PREFIX}_api_call_duration_seconds_sum{{{labels}}} {histogram.total}")
+            lines.append(f"{PROMETHEUS_PREFIX}_api_call_duration_seconds_count{{{labels}}} {histogram.count}")
+
+        metric('client_events', 'gauge', "Rate limiter calls, retries and rate-limited (429) responses.",
+               [((f'event="{event}"',), count) for event, count in report['client'].items()])
+        metric('cache_events', 'gauge', "Resolution cache lookups and writes.",
+               [((f'cache="{name}"', f'event="{event}"'), count)
+                for name, stats in report['caches'].items() for event, count in stats.items() if event != 'hit_rate'])
+        metric('cache_hit_ratio', 'gauge', "Share of cache lookups answered from the cache.",
+               [((f'cache="{name}"',), stats['hit_rate']) for name, stats in report['caches'].items()])
+        return '\n'.join(lines) + '\n'
+
+    def write_reports(self, json_file, prometheus_file=None):
+        """
+        Writes the JSON report and, if a path is given, the Prometheus textfile.
+        Both are replaced atomically so a collector never reads a partial file.
+        """
+        if not self.enabled:
+            return
+        _write_atomic(json_file, json.dumps(self.to_dict(), indent=4))
+        print(f"Metrics written to {json_file}")
+        if prometheus_file:
+            _write_atomic(prometheus_file, self.to_prometheus())
+            print(f"Prometheus metrics written to {prometheus_file}")
+
+
+def _write_atomic(path, text):
+    temp_file = path + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_file, path)
+
+
+# Shared disabled instance, used when a function is called without metrics
+NO_METRICS = RunMetrics('none', enabled=False)
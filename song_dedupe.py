@@ -0,0 +1,114 @@
+import re
+import unicodedata
+from song_table import SongTable, MISSING_SIGNED
+
+# Deduplication of the local library before any Spotify lookups.
+# The same song often exists in several copies (FLAC and MP3, album and compilation), and the same artist
+# under several spellings ("The Beatles", "Beatles, The", "Beyoncé feat. JAY-Z"). Both are grouped on a
+# canonical key: Unicode-normalized (accents removed), case-folded, without featured artists, a leading
+# "The" or punctuation. Selection and resolution then work on one canonical entry per group, so copies
+# take neither searches nor playlist slots.
+
+FEATURED_IN_BRACKETS = re.compile(r'\s*[\(\[]\s*(?:feat|ft|featuring)\b[^\)\]]*[\)\]]', re.IGNORECASE)
+FEATURED_SUFFIX = re.compile(r'\s+(?:feat|ft|featuring)\b\.?\s.*$', re.IGNORECASE)
+INVERTED_THE = re.compile(r'^(.*?),\s*the$', re.IGNORECASE)
+LEADING_THE = re.compile(r'^the\s+')
+APOSTROPHES = re.compile(r"['’`]")
+PUNCTUATION = re.compile(r'[\W_]+')
+
+
+def canonical_text(text):
+    """
+    Returns text without accents, case, apostrophes or other punctuation, with single spaces between words.
+    Only the marks on Latin letters are accents: those of other scripts (the dakuten of "ベ") tell letters
+    apart, so they are kept and recomposed.
+    """
+    if not text.isascii():
+        text = unicodedata.normalize('NFC', ''.join(_without_latin_accents(unicodedata.normalize('NFKD', text))))
+    text = APOSTROPHES.sub('', text.casefold().replace('&', ' and '))
+    return PUNCTUATION.sub(' ', text).strip()
+
+
+def _without_latin_accents(text):
+    base_is_latin = False
+    for character in text:
+        if not unicodedata.combining(character):
+            base_is_latin = character.isascii() or unicodedata.name(character, '').startswith('LATIN ')
+            yield character
+        elif not base_is_latin:
+            yield character
+
+
+def strip_featured_artists(text):
+    if 'f' not in text and 'F' not in text:
+        return text
+    return FEATURED_SUFFIX.sub('', FEATURED_IN_BRACKETS.sub('', text))
+
+
+def canonical_artist(name):
+    """
+    Returns the dedupe key of an artist name: "The Beatles", "Beatles, The" and "beatles" give "beatles".
+    A name made only of punctuation ("!!!") keeps its own lowercased form as the key, so it is not dropped.
+    """
+    key = LEADING_THE.sub('', canonical_text(INVERTED_THE.sub(r'\1', strip_featured_artists(name).strip())))
+    return key or name.strip().lower()
+
+
+def canonical_title(title):
+    return canonical_text(strip_featured_artists(title)) or title.strip().lower()
+
+
+def canonical_song_rows(songs):
+    """
+    Returns the rows of a SongTable to keep, one per (canonical artist, canonical title), in table order.
+    Of several copies, the first one with an ISRC is kept (it resolves with a single exact lookup),
+    then the first one with a duration, then simply the first one.
+    """
+    artist_keys = [canonical_artist(name) for name in songs.artists]
+    isrcs = songs.strings['isrc']
+    durations = songs.integers['duration_ms']
+    best_rows = {}
+    for row, title in enumerate(songs.strings['title']):
+        key = (artist_keys[songs.artist_id(row)], canonical_title(title))
+        rank = (not isrcs[row], durations[row] == MISSING_SIGNED)
+        best = best_rows.get(key)
+        if best is None or rank < best[0]:
+            best_rows[key] = (rank, row)
+    return sorted(row for _, row in best_rows.values())
+
+
+def dedupe_songs(songs):
+    """
+    Returns (a SongTable holding one copy of every song, number of duplicate copies left out).
+    songs may be a SongTable or a list of song dictionaries.
+    """
+    if not isinstance(songs, SongTable):
+        songs = SongTable.from_songs(songs)
+    rows = canonical_song_rows(songs)
+    if len(rows) == len(songs):
+        return songs, 0
+    return songs.select(rows), len(songs) - len(rows)
+
+
+def canonical_artist_names(artist_song_counts):
+    """
+    Returns {canonical artist key: the spelling to search for} for {artist name: number of songs}
+    (see SongTable.artist_song_counts and library_index.iter_artists).
+    Of several spellings, one without featured artists ("Beyoncé" rather than "Beyoncé feat. JAY-Z"), then an
+    uninverted one ("The Beatles" rather than "Beatles, The"), then the one with the most songs wins.
+    If every spelling names featured artists, they are stripped from the one searched for.
+    """
+    best_names = {}
+    for name, song_count in artist_song_counts.items():
+        name = name.strip()
+        if not name:
+            continue
+        key = canonical_artist(name)
+        featured = strip_featured_artists(name) != name
+        if featured:
+            name = strip_featured_artists(name).strip() or name
+        rank = (featured, bool(INVERTED_THE.match(name)), -song_count, name)
+        best = best_names.get(key)
+        if best is None or rank < best[0]:
+            best_names[key] = (rank, name)
+    return {key: name for key, (_, name) in best_names.items()}
@@ -0,0 +1,377 @@
+import os
+import sys
+import json
+import pickle
+from array import array
+from collections.abc import Mapping
+
+# Compact in-memory form of the local library.
+# Instead of one dictionary (and four separate strings) per song, songs are stored column by column:
+# artist and album names are interned into shared string tables and referenced by integer IDs,
+# file paths are split into a shared directory part and a file name, and numeric fields live in arrays.
+# SongView gives dictionary-style access to a single row, so code written for the list-of-dicts
+# returned by the JSON cache keeps working unchanged.
+
+# Keys every song has, in the order used by the JSON cache
+BASE_KEYS = ('artist', 'title', 'album', 'filepath')
+# Columns holding one string per song
+STRING_COLUMNS = ('title',)
+# Columns holding one string per song that only some songs have; missing values are stored as ""
+OPTIONAL_STRING_COLUMNS = ('isrc',)
+# Columns whose (highly repetitive) values are stored once and referenced by ID
+INTERNED_COLUMNS = ('artist', 'album', 'genre')
+# Interned columns that only some songs have; missing values are stored as ""
+OPTIONAL_INTERNED_COLUMNS = ('genre',)
+# Optional integer columns and their array typecodes; missing values are stored as a sentinel
+INTEGER_COLUMNS = {'size': 'q', 'mtime': 'q', 'inode': 'Q', 'duration_ms': 'q', 'track_number': 'q', 'year': 'q',
+                   'bitrate': 'q'}
+
+# Bump when the snapshot layout changes so old snapshots are rebuilt from the JSON cache
+SNAPSHOT_VERSION = 2
+
+MISSING_SIGNED = -2 ** 63
+MISSING_UNSIGNED = 2 ** 64 - 1
+
+
+def _missing_value(typecode):
+    return MISSING_UNSIGNED if typecode.isupper() else MISSING_SIGNED
+
+
+def _split_filepath(filepath):
+    """
+    Splits a path into (directory including the trailing separator, file name).
+    Concatenating the two parts gives back the exact original string.
+    """
+    split_at = max(filepath.rfind('/'), filepath.rfind('\\')) + 1
+    return filepath[:split_at], filepath[split_at:]
+
+
+class StringTable:
+    """
+    Stores each distinct string once and hands out integer IDs for it.
+    """
+    __slots__ = ('values', '_ids')
+
+    def __init__(self):
+        self.values = []
+        self._ids = {}
+
+    def get_id(self, value):
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self.values)
+            self._ids[value] = string_id
+            self.values.append(sys.intern(value))
+        return string_id
+
+    def get_ids(self, values):
+        """
+        Returns an array with the ID of each value, adding new values to the table.
+        """
+        ids = self._ids
+        new_id_start = len(ids)
+        string_ids = array('I', [ids.setdefault(value, len(ids)) for value in values])
+        self.values.extend(sys.intern(value) for value in list(ids)[new_id_start:])
+        return string_ids
+
+    def __len__(self):
+        return len(self.values)
+
+
+class SongTable:
+    """
+    Column-oriented table of songs with interned artist/album/directory strings.
+    Behaves like a read-only list of song dictionaries: len(), indexing and iteration return SongView rows.
+    rows_by_artist maps each artist ID to an array of row indexes, so grouping songs by artist is free.
+    """
+    __slots__ = ('strings', 'interned', 'interned_ids', 'directories', 'directory_ids', 'filenames',
+                 'integers', '_rows_by_artist')
+
+    def __init__(self):
+        self.strings = {column: [] for column in STRING_COLUMNS + OPTIONAL_STRING_COLUMNS}
+        self.interned = {column: StringTable() for column in INTERNED_COLUMNS}
+        self.interned_ids = {column: array('I') for column in INTERNED_COLUMNS}
+        self.directories = StringTable()
+        self.directory_ids = array('I')
+        self.filenames = []
+        self.integers = {column: array(typecode) for column, typecode in INTEGER_COLUMNS.items()}
+        self._rows_by_artist = None
+
+    @classmethod
+    def from_songs(cls, songs):
+        """
+        Builds a table from an iterable of song dictionaries (e.g. the JSON cache or library_index.iter_songs).
+        The columns are filled one at a time, which is much faster than appending song by song.
+        """
+        if not isinstance(songs, list):
+            songs = list(songs)
+        table = cls()
+        for column in STRING_COLUMNS + OPTIONAL_STRING_COLUMNS:
+            table.strings[column] = [song.get(column) or "" for song in songs]
+        for column in INTERNED_COLUMNS:
+            table.interned_ids[column] = table.interned[column].get_ids([song.get(column) or "" for song in songs])
+        filepaths = [song.get('filepath') or "" for song in songs]
+        split_points = [max(filepath.rfind('/'), filepath.rfind('\\')) + 1 for filepath in filepaths]
+        table.directory_ids = table.directories.get_ids(
+            [filepath[:split_at] for filepath, split_at in zip(filepaths, split_points)])
+        table.filenames = [filepath[split_at:] for filepath, split_at in zip(filepaths, split_points)]
+        for column, values in table.integers.items():
+            missing = _missing_value(values.typecode)
+            values.extend([missing if song.get(column) is None else song[column] for song in songs])
+        table.build_artist_index()
+        return table
+
+    @classmethod
+    def from_json_file(cls, cache_file):
+        """
+        Loads a JSON cache file into a table.
+        The parsed dictionaries are only needed while the columns are built and are released afterwards.
+        """
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return cls.from_songs(json.load(f))
+
+    def append(self, song):
+        """
+        Adds one song dictionary to the table.
+        """
+        for column in STRING_COLUMNS + OPTIONAL_STRING_COLUMNS:
+            self.strings[column].append(song.get(column) or "")
+        for column in INTERNED_COLUMNS:
+            self.interned_ids[column].append(self.interned[column].get_id(song.get(column) or ""))
+        directory, filename = _split_filepath(song.get('filepath') or "")
+        self.directory_ids.append(self.directories.get_id(directory))
+        self.filenames.append(filename)
+        for column, values in self.integers.items():
+            value = song.get(column)
+            values.append(_missing_value(values.typecode) if value is None else value)
+        self._rows_by_artist = None
+
+    def build_artist_index(self):
+        """
+        Precomputes the artist ID -> row indexes grouping.
+        """
+        rows_by_artist = [array('I') for _ in range(len(self.interned['artist']))]
+        for row, artist_id in enumerate(self.interned_ids['artist']):
+            rows_by_artist[artist_id].append(row)
+        self._rows_by_artist = rows_by_artist
+
+    @property
+    def rows_by_artist(self):
+        if self._rows_by_artist is None:
+            self.build_artist_index()
+        return self._rows_by_artist
+
+    @property
+    def artists(self):
+        """
+        Distinct artist names, indexed by artist ID.
+        """
+        return self.interned['artist'].values
+
+    def artist_song_counts(self):
+        """
+        Returns {artist name: number of songs}, the same shape as library_index.iter_artists gives.
+        """
+        return {name: len(rows) for name, rows in zip(self.artists, self.rows_by_artist)}
+
+    def artist_id(self, row):
+        return self.interned_ids['artist'][row]
+
+    def get_value(self, row, column):
+        """
+        Returns a single field of a row, or raises KeyError for unknown or missing fields.
+        """
+        if column in self.interned_ids:
+            value = self.interned[column].values[self.interned_ids[column][row]]
+            if value or column not in OPTIONAL_INTERNED_COLUMNS:
+                return value
+            raise KeyError(column)
+        if column in self.strings:
+            value = self.strings[column][row]
+            if value or column not in OPTIONAL_STRING_COLUMNS:
+                return value
+        if column == 'filepath':
+            return self.directories.values[self.directory_ids[row]] + self.filenames[row]
+        if column in self.integers:
+            values = self.integers[column]
+            value = values[row]
+            if value != _missing_value(values.typecode):
+                return value
+        raise KeyError(column)
+
+    def row_keys(self, row):
+        """
+        Returns the field names present for a row, in the order used by the JSON cache.
+        """
+        keys = list(BASE_KEYS)
+        keys.extend(column for column in INTERNED_COLUMNS + STRING_COLUMNS
+                    if column not in BASE_KEYS and column not in OPTIONAL_INTERNED_COLUMNS)
+        keys.extend(column for column in OPTIONAL_STRING_COLUMNS if self.strings[column][row])
+        keys.extend(column for column in OPTIONAL_INTERNED_COLUMNS
+                    if self.interned[column].values[self.interned_ids[column][row]])
+        for column, values in self.integers.items():
+            if values[row] != _missing_value(values.typecode):
+                keys.append(column)
+        return keys
+
+    def row_as_dict(self, row):
+        return {key: self.get_value(row, key) for key in self.row_keys(row)}
+
+    def to_dicts(self):
+        """
+        Returns the songs as a list of plain dictionaries (e.g. to write the JSON cache).
+        """
+        return [self.row_as_dict(row) for row in range(len(self))]
+
+    def select(self, rows):
+        """
+        Returns a new table holding only the given rows, in the given order.
+        """
+        table = SongTable()
+        for column, values in self.strings.items():
+            table.strings[column] = [values[row] for row in rows]
+        for column, ids in self.interned_ids.items():
+            names = self.interned[column].values
+            table.interned_ids[column] = table.interned[column].get_ids([names[ids[row]] for row in rows])
+        directories = self.directories.values
+        table.directory_ids = table.directories.get_ids([directories[self.directory_ids[row]] for row in rows])
+        table.filenames = [self.filenames[row] for row in rows]
+        for column, values in self.integers.items():
+            table.integers[column].extend([values[row] for row in rows])
+        table.build_artist_index()
+        return table
+
+    def save_snapshot(self, snapshot_file, source_signature=None):
+        """
+        Writes the table to a binary snapshot that loads many times faster than the JSON cache.
+        source_signature identifies the cache file the snapshot was built from.
+        """
+        state = {
+            'version': SNAPSHOT_VERSION,
+            'columns': (STRING_COLUMNS, OPTIONAL_STRING_COLUMNS, INTERNED_COLUMNS, INTEGER_COLUMNS),
+            'source_signature': source_signature,
+            'strings': self.strings,
+            'interned': {column: strings.values for column, strings in self.interned.items()},
+            'interned_ids': self.interned_ids,
+            'directories': self.directories.values,
+            'directory_ids': self.directory_ids,
+            'filenames': self.filenames,
+            'integers': self.integers
+        }
+        temp_file = snapshot_file + '.tmp'
+        with open(temp_file, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, snapshot_file)
+
+    @classmethod
+    def load_snapshot(cls, snapshot_file, source_signature=None):
+        """
+        Loads a snapshot written by save_snapshot.
+        Returns None if it is missing, unreadable, from another layout version or built from a different cache file.
+        """
+        try:
+            with open(snapshot_file, 'rb') as f:
+                state = pickle.load(f)
+        except Exception:
+            return None
+        if (state.get('version') != SNAPSHOT_VERSION
+                or state.get('columns') != (STRING_COLUMNS, OPTIONAL_STRING_COLUMNS, INTERNED_COLUMNS, INTEGER_COLUMNS)
+                or state.get('source_signature') != source_signature):
+            return None
+
+        table = cls()
+        table.strings = state['strings']
+        for column, values in state['interned'].items():
+            table.interned[column].values = [sys.intern(value) for value in values]
+            table.interned[column]._ids = {value: string_id for string_id, value in enumerate(values)}
+        table.interned_ids = state['interned_ids']
+        table.directories.values = state['directories']
+        table.directories._ids = {value: string_id for string_id, value in enumerate(state['directories'])}
+        table.directory_ids = state['directory_ids']
+        table.filenames = state['filenames']
+        table.integers = state['integers']
+        table.build_artist_index()
+        return table
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [SongView(self, index) for index in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("song table index out of range")
+        return SongView(self, row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield SongView(self, row)
+
+
+class SongView(Mapping):
+    """
+    Read-only dictionary-style view of one row of a SongTable.
+    """
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key):
+        return self.table.get_value(self.row, key)
+
+    def __iter__(self):
+        return iter(self.table.row_keys(self.row))
+
+    def __len__(self):
+        return len(self.table.row_keys(self.row))
+
+    def __eq__(self, other):
+        if isinstance(other, SongView) and other.table is self.table:
+            return other.row == self.row
+        return Mapping.__eq__(self, other)
+
+    def __hash__(self):
+        return hash((id(self.table), self.row))
+
+    def __repr__(self):
+        return f"SongView({self.table.row_as_dict(self.row)!r})"
+
+
+def snapshot_path(cache_file):
+    return cache_file + '.table'
+
+
+def save_song_table_snapshot(table, cache_file):
+    """
+    Writes the snapshot of a table that was just saved to cache_file, so the next load_song_table does not parse the JSON.
+    A failed write only costs that one JSON parse, so it is reported rather than raised.
+    """
+    try:
+        table.save_snapshot(snapshot_path(cache_file), _source_signature(cache_file))
+    except OSError as e:
+        print(f"  Warning: Could not write library snapshot {snapshot_path(cache_file)} - {e}")
+
+
+def load_song_table(cache_file):
+    """
+    Loads the JSON cache file as a SongTable.
+    Normally the table comes from its binary snapshot (cache_file + '.table'), which every cache write refreshes
+    (see local_library.save_songs_to_cache). The JSON is only parsed when the snapshot is missing or older than
+    the cache file, e.g. after the cache was edited by hand, and the snapshot is rebuilt then.
+    """
+    table = SongTable.load_snapshot(snapshot_path(cache_file), _source_signature(cache_file))
+    if table is not None:
+        return table
+
+    table = SongTable.from_json_file(cache_file)
+    save_song_table_snapshot(table, cache_file)
+    return table
+
+
+def _source_signature(cache_file):
+    stat_result = os.stat(cache_file)
+    return stat_result.st_size, stat_result.st_mtime_ns
@@ -0,0 +1,184 @@
+import os
+import sys
+import time
+import argparse
+import importlib
+
+# Single entry point for the suite, with one subcommand per task:
+#   scan      refresh the local library cache (or the SQLite index), optionally keep watching the library
+#   stats     summarize the cached library
+#   follow    run Spotify_FollowArtists.py
+#   playlist  run Spotify_GeneratePlaylist.py
+# Paths and Spotify credentials come from flags or environment variables instead of edited constants.
+# Only the modules a subcommand needs are imported: 'scan' and 'stats' never load spotipy, and 'stats'
+# does not load tinytag either, so they start quickly (see benchmarks/bench_startup.py).
+# 'follow' and 'playlist' pass every flag they do not know (e.g. --concurrent, --resume, --sync) to the script.
+
+DEFAULT_CACHE_FILE = 'local_music_cache.json'
+DEFAULT_LIBRARY_INDEX_FILE = 'local_music_library.db'
+DEFAULT_SCAN_FILE_TIMEOUT = 30
+
+SCRIPT_MODULES = {'follow': 'Spotify_FollowArtists', 'playlist': 'Spotify_GeneratePlaylist'}
+
+
+def parse_arguments(argv=None):
+    """
+    Returns (parsed arguments, flags left for the script of the 'follow' and 'playlist' subcommands).
+    """
+    library_options = argparse.ArgumentParser(add_help=False)
+    library_options.add_argument('--library', default=os.environ.get('MUSIC_LIBRARY_PATH'),
+                                 help="music library path (default: $MUSIC_LIBRARY_PATH)")
+    library_options.add_argument('--cache', default=os.environ.get('LOCAL_MUSIC_CACHE_FILE', DEFAULT_CACHE_FILE),
+                                 help=f"library cache file (default: $LOCAL_MUSIC_CACHE_FILE or {DEFAULT_CACHE_FILE})")
+    library_options.add_argument('--index', default=os.environ.get('LOCAL_MUSIC_INDEX_FILE', DEFAULT_LIBRARY_INDEX_FILE),
+                                 help="SQLite library index used with --sqlite (default: $LOCAL_MUSIC_INDEX_FILE or "
+                                      f"{DEFAULT_LIBRARY_INDEX_FILE})")
+    library_options.add_argument('--sqlite', action='store_true', help="use the SQLite library index instead of the cache")
+
+    spotify_options = argparse.ArgumentParser(add_help=False)
+    spotify_options.add_argument('--client-id', default=os.environ.get('SPOTIPY_CLIENT_ID'),
+                                 help="Spotify app client ID (default: $SPOTIPY_CLIENT_ID)")
+    spotify_options.add_argument('--client-secret', default=os.environ.get('SPOTIPY_CLIENT_SECRET'),
+                                 help="Spotify app client secret (default: $SPOTIPY_CLIENT_SECRET)")
+    spotify_options.add_argument('--redirect-uri', default=os.environ.get('SPOTIPY_REDIRECT_URI'),
+                                 help="redirect URI of the Spotify app (default: $SPOTIPY_REDIRECT_URI)")
+
+    parser = argparse.ArgumentParser(description="Spotify Local Library Integration Suite.")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    scan = subcommands.add_parser('scan', parents=[library_options], help="refresh the local library cache")
+    scan.add_argument('--rescan', action='store_true', help="re-read every file")
+    scan.add_argument('--incremental', action='store_true', help="re-read only new or changed files")
+    scan.add_argument('--workers', type=int, default=1, help="files read at the same time")
+    scan.add_argument('--processes', action='store_true', help="read tags in worker processes instead of threads")
+    scan.add_argument('--file-timeout', type=float, default=DEFAULT_SCAN_FILE_TIMEOUT,
+                      help="seconds before a single unreadable file is skipped (with --workers and --processes)")
+    scan.add_argument('--header-only', action='store_true',
+                      help="read only the tag regions of MP3, FLAC, M4A and Ogg files (for network shares)")
+    scan.add_argument('--watch', action='store_true', help="keep the cache up to date until interrupted")
+    scan.add_argument('--debounce', type=float, default=2, help="quiet seconds before changes are applied (with --watch)")
+    scan.add_argument('--poll-interval', type=float, default=60,
+                      help="seconds between library walks when inotify is not available (with --watch)")
+
+    subcommands.add_parser('stats', parents=[library_options], help="summarize the cached library")
+    for command, module_name in SCRIPT_MODULES.items():
+        subcommands.add_parser(command, parents=[library_options, spotify_options],
+                               help=f"run {module_name}.py (other flags are passed to the script)")
+    return parser.parse_known_args(argv)
+
+
+def run_scan(arguments):
+    from local_library import get_songs_from_local_library_with_cache
+
+    if not arguments.library or not os.path.isdir(arguments.library):
+        print(f"ERROR: The music library path does not exist: {arguments.library}")
+        print("Pass it with --library or set MUSIC_LIBRARY_PATH.")
+        return 1
+
+    if arguments.watch:
+        from library_watcher import watch_library
+        watch_library(arguments.library, arguments.cache, arguments.debounce, arguments.poll_interval,
+                      workers=arguments.workers, file_timeout=arguments.file_timeout,
+                      use_processes=arguments.processes, header_only=arguments.header_only)
+        return 0
+
+    if arguments.sqlite:
+        from library_index import open_current_library_index, count_songs
+        conn = open_current_library_index(arguments.library, arguments.index, cache_file=arguments.cache, refresh=True,
+                                          force_rescan=arguments.rescan, workers=arguments.workers,
+                                          file_timeout=arguments.file_timeout, use_processes=arguments.processes,
+                                          header_only=arguments.header_only)
+        try:
+            print(f"{count_songs(conn)} songs in the library.")
+        finally:
+            conn.close()
+        return 0
+
+    songs = get_songs_from_local_library_with_cache(arguments.library, arguments.cache, force_rescan=arguments.rescan,
+                                                    incremental=arguments.incremental, workers=arguments.workers,
+                                                    file_timeout=arguments.file_timeout,
+                                                    use_processes=arguments.processes,
+                                                    header_only=arguments.header_only)
+    print(f"{len(songs)} songs in the library.")
+    return 0
+
+
+def run_stats(arguments):
+    from song_table import SongTable, MISSING_SIGNED, load_song_table
+    from local_library import is_cache_watched
+
+    if arguments.sqlite:
+        if not os.path.exists(arguments.index):
+            print(f"No library index found at {arguments.index}. Run 'scan --sqlite' first.")
+            return 1
+        from library_index import open_library_index, iter_songs
+        conn = open_library_index(arguments.index)
+        try:
+            songs = SongTable.from_songs(iter_songs(conn))
+        finally:
+            conn.close()
+        source_file = arguments.index
+    else:
+        if not os.path.exists(arguments.cache):
+            print(f"No cache file found at {arguments.cache}. Run 'scan' first.")
+            return 1
+        songs = load_song_table(arguments.cache)
+        source_file = arguments.cache
+
+    durations = [value for value in songs.integers['duration_ms'] if value != MISSING_SIGNED]
+    isrc_count = sum(1 for value in songs.strings['isrc'] if value)
+    genres = songs.interned['genre'].values
+    genre_count = sum(1 for genre_id in songs.interned_ids['genre'] if genres[genre_id])
+    year_count = sum(1 for value in songs.integers['year'] if value != MISSING_SIGNED)
+    song_count = len(songs)
+
+    def share(count):
+        return f"{count} ({100 * count / song_count:.1f}%)" if song_count else "0"
+
+    stat_result = os.stat(source_file)
+    print(f"Library: {source_file} ({stat_result.st_size / 1_048_576:.1f} MB, "
+          f"updated {time.strftime('%Y-%m-%d %H:%M', time.localtime(stat_result.st_mtime))})")
+    if not arguments.sqlite:
+        print(f"  Watched:      {'yes' if is_cache_watched(arguments.cache, arguments.library or None) else 'no'}")
+    print(f"  Songs:        {song_count}")
+    print(f"  Artists:      {len(songs.artists)}")
+    print(f"  Albums:       {len(songs.interned['album'])}")
+    print(f"  Folders:      {len(songs.directories)}")
+    print(f"  With ISRC:    {share(isrc_count)}")
+    print(f"  With length:  {share(len(durations))}, {sum(durations) / 3_600_000:.1f} hours in total")
+    print(f"  With genre:   {share(genre_count)}, {sum(1 for genre in genres if genre)} different genres")
+    print(f"  With year:    {share(year_count)}")
+    return 0
+
+
+def run_script(arguments, script_flags):
+    """
+    Runs Spotify_FollowArtists.py or Spotify_GeneratePlaylist.py with the paths and credentials of the arguments.
+    """
+    script = importlib.import_module(SCRIPT_MODULES[arguments.command])
+    settings = {'MUSIC_LIBRARY_PATH': arguments.library, 'CACHE_FILE': arguments.cache,
+                'LIBRARY_INDEX_FILE': arguments.index, 'SPOTIPY_CLIENT_ID': arguments.client_id,
+                'SPOTIPY_CLIENT_SECRET': arguments.client_secret, 'SPOTIPY_REDIRECT_URI': arguments.redirect_uri}
+    for name, value in settings.items():
+        if value:
+            setattr(script, name, value)
+    if arguments.sqlite:
+        script_flags = script_flags + ['--sqlite']
+    script.main(script_flags)
+    return 0
+
+
+def main(argv=None):
+    arguments, script_flags = parse_arguments(argv)
+    if arguments.command in SCRIPT_MODULES:
+        return run_script(arguments, script_flags)
+    if script_flags:
+        print(f"ERROR: Unknown arguments for '{arguments.command}': {' '.join(script_flags)}")
+        return 2
+    if arguments.command == 'scan':
+        return run_scan(arguments)
+    return run_stats(arguments)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
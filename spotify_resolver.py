@@ -0,0 +1,175 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import spotipy
+from urllib3.util.retry import Retry
+
+# Concurrent, rate-limit-aware Spotify lookups.
+# RateLimitedSpotify wraps a spotipy client so that every API call takes a token from a shared token bucket,
+# and 429 responses pause all workers for the Retry-After period before the call is retried.
+# resolve_in_order runs a lookup function over many items on a bounded thread pool and yields the results
+# in input order, so the scripts can keep their sequential progress output.
+
+# Server errors retried by the HTTP layer when using build_requests_session (RateLimitedSpotify does not retry them).
+# 429 is left out (and Retry-After ignored there) so that rate limiting reaches RateLimitedSpotify,
+# which then makes all workers back off together.
+RESOLVER_STATUS_FORCELIST = (500, 502, 503, 504)
+
+
+def build_requests_session(pool_size=10, retries=3, backoff_factor=0.3):
+    """
+    Returns a requests.Session for spotipy.Spotify(requests_session=...) when using RateLimitedSpotify.
+    The connection pool is sized for the number of concurrent workers, and 429 responses are returned
+    to spotipy (as a SpotifyException carrying the Retry-After header) instead of being retried in place.
+    """
+    retry = Retry(
+        total=retries,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RESOLVER_STATUS_FORCELIST,
+        respect_retry_after_header=False)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing `rate` calls per second with bursts of up to `burst` calls.
+    block_for() empties the bucket and stops every caller for the given number of seconds.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def block_for(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.updated = self.blocked_until
+
+
+def get_retry_after(exception):
+    """
+    Returns the Retry-After value (in seconds) of a SpotifyException, or None if it has none.
+    """
+    headers = getattr(exception, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitedSpotify:
+    """
+    Wraps a spotipy.Spotify client. Method calls are passed through after taking a token from the limiter.
+    A 429 response blocks the limiter for its Retry-After period (or an exponential backoff if the header
+    is missing) and the call is retried. 5xx responses are left to the HTTP layer (see build_requests_session),
+    so an outage is not retried at both levels. Other errors, and calls still failing after max_retries retries,
+    are raised as usual.
+    """
+
+    def __init__(self, sp, limiter, max_retries=5, backoff_base=1.0):
+        self.sp = sp
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.stats = {'calls': 0, 'retries': 0, 'rate_limited': 0}
+        self.stats_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.sp, name)
+        if not callable(attribute):
+            return attribute
+
+        def rate_limited_call(*args, **kwargs):
+            return self.call(attribute, *args, **kwargs)
+        return rate_limited_call
+
+    def _count(self, stat):
+        with self.stats_lock:
+            self.stats[stat] += 1
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            self._count('calls')
+            try:
+                return func(*args, **kwargs)
+            except spotipy.SpotifyException as e:
+                # spotipy also reports server errors the HTTP layer gave up on as 429, but without response headers
+                rate_limited = e.http_status == 429 and bool(e.headers)
+                if not rate_limited or attempt >= self.max_retries:
+                    raise
+                delay = get_retry_after(e)
+                if delay is None:
+                    delay = self.backoff_base * 2 ** attempt
+                self._count('rate_limited')
+                self.limiter.block_for(delay)
+                self._count('retries')
+                attempt += 1
+
+    def print_stats(self):
+        print(f"Spotify API: {self.stats['calls']} calls, {self.stats['retries']} retries, "
+              f"{self.stats['rate_limited']} rate-limited (429) responses.")
+
+
+def _run_lookup(lookup, item):
+    # Errors are returned rather than raised so one failed lookup doesn't stop the others
+    try:
+        return lookup(item), None
+    except Exception as e:
+        return None, e
+
+
+def resolve_in_order(items, lookup, workers=1):
+    """
+    Calls lookup(item) for every item and yields (index, item, result, error) in input order.
+    error is the exception raised by lookup (and result None), or None on success.
+    With workers > 1 the lookups run on a thread pool with a bounded number of lookups in flight.
+    """
+    if workers <= 1:
+        for index, item in enumerate(items):
+            result, error = _run_lookup(lookup, item)
+            yield index, item, result, error
+        return
+
+    max_in_flight = workers * 4
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for index, item in enumerate(items):
+            pending.append((index, item, executor.submit(_run_lookup, lookup, item)))
+            if len(pending) >= max_in_flight:
+                queued_index, queued_item, future = pending.popleft()
+                yield (queued_index, queued_item) + future.result()
+        while pending:
+            queued_index, queued_item, future = pending.popleft()
+            yield (queued_index, queued_item) + future.result()
@@ -0,0 +1,168 @@
+import struct
+
+from header_tags import HeaderReadStats, read_header_tags
+from local_library import read_song_info_from_headers
+
+
+def write_file(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def syncsafe(size):
+    return bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f])
+
+
+def id3_frame(frame_id, text):
+    data = b'\x00' + text.encode('latin-1')
+    return frame_id + len(data).to_bytes(4, 'big') + b'\x00\x00' + data
+
+
+def id3_tag(body, flags=0, size=None):
+    return b'ID3' + bytes([3, 0, flags]) + syncsafe(len(body) if size is None else size) + body
+
+
+def flac_block(block_type, data, last=False):
+    return bytes([block_type | (0x80 if last else 0)]) + len(data).to_bytes(3, 'big') + data
+
+
+def flac_streaminfo(sample_rate=44100, total_samples=441000):
+    data = bytearray(34)
+    data[10], data[11], data[12] = sample_rate >> 12, (sample_rate >> 4) & 0xff, (sample_rate & 0x0f) << 4
+    data[14:18] = total_samples.to_bytes(4, 'big')
+    return bytes(data)
+
+
+def vorbis_comment(comments, count=None):
+    data = struct.pack('<I', 6) + b'vendor' + struct.pack('<I', len(comments) if count is None else count)
+    for comment in comments:
+        data += struct.pack('<I', len(comment.encode('utf-8'))) + comment.encode('utf-8')
+    return data
+
+
+def atom(atom_type, payload):
+    return (8 + len(payload)).to_bytes(4, 'big') + atom_type + payload
+
+
+def mp4_file(title="Title", artist="Artist"):
+    mvhd = atom(b'mvhd', bytes(12) + (1000).to_bytes(4, 'big') + (5000).to_bytes(4, 'big') + bytes(80))
+    items = b''.join(atom(item_type, atom(b'data', b'\x00\x00\x00\x01' + bytes(4) + value.encode('utf-8')))
+                     for item_type, value in ((b'\xa9nam', title), (b'\xa9ART', artist)))
+    meta = atom(b'meta', bytes(4) + atom(b'hdlr', bytes(25)) + atom(b'ilst', items))
+    return atom(b'ftyp', b'M4A ' + bytes(4)) + atom(b'moov', mvhd + atom(b'udta', meta)) + atom(b'mdat', bytes(100))
+
+
+# MP3 (ID3v2)
+
+def test_id3_tag_is_read(tmp_path):
+    path = write_file(tmp_path, 'song.mp3', id3_tag(id3_frame(b'TIT2', "Title") + id3_frame(b'TPE1', "Artist")))
+    tags, _, problem = read_header_tags(path)
+    assert (tags['title'], tags['artist'], problem) == ("Title", "Artist", None)
+
+
+def test_id3_tag_cut_inside_a_frame_keeps_the_frames_before_it(tmp_path):
+    data = id3_tag(id3_frame(b'TIT2', "Title") + id3_frame(b'TPE1', "Artist"))
+    path = write_file(tmp_path, 'song.mp3', data[:-3])
+    tags, _, problem = read_header_tags(path)
+    assert tags == {'title': "Title"}
+    assert problem.startswith("truncated")
+
+
+def test_id3_tag_cut_inside_a_frame_header_is_reported(tmp_path):
+    data = id3_tag(id3_frame(b'TIT2', "Title") + id3_frame(b'TPE1', "Artist"))
+    path = write_file(tmp_path, 'song.mp3', data[:data.index(b'TPE1') + 5])
+    tags, _, problem = read_header_tags(path)
+    assert tags == {'title': "Title"}
+    assert problem.startswith("truncated")
+
+
+def test_id3_frame_larger_than_the_tag_is_ignored(tmp_path):
+    oversized = b'TPE1' + (10_000).to_bytes(4, 'big') + b'\x00\x00\x00Artist'
+    path = write_file(tmp_path, 'song.mp3', id3_tag(id3_frame(b'TIT2', "Title") + oversized))
+    tags, _, problem = read_header_tags(path)
+    assert tags == {'title': "Title"}
+    assert problem is None
+
+
+def test_id3_extended_header_cut_off_is_reported(tmp_path):
+    path = write_file(tmp_path, 'song.mp3', id3_tag(b'\x00\x00', flags=0x40, size=1000))
+    tags, _, problem = read_header_tags(path)
+    assert tags == {}
+    assert problem.startswith("truncated")
+
+
+def test_empty_mp3_gives_no_tags(tmp_path):
+    tags, bytes_read, problem = read_header_tags(write_file(tmp_path, 'song.mp3', b''))
+    assert (tags, bytes_read, problem) == ({}, 0, None)
+
+
+# FLAC
+
+def test_flac_tags_and_duration_are_read(tmp_path):
+    data = b'fLaC' + flac_block(0, flac_streaminfo()) + flac_block(4, vorbis_comment(["TITLE=Title", "artist=Artist"]), last=True)
+    tags, _, problem = read_header_tags(write_file(tmp_path, 'song.flac', data))
+    assert (tags['title'], tags['artist'], tags['duration_ms'], problem) == ("Title", "Artist", 10_000, None)
+
+
+def test_flac_cut_inside_the_comment_block_keeps_the_duration(tmp_path):
+    data = b'fLaC' + flac_block(0, flac_streaminfo()) + flac_block(4, vorbis_comment(["TITLE=Title", "ARTIST=Artist"]), last=True)
+    tags, _, problem = read_header_tags(write_file(tmp_path, 'song.flac', data[:-5]))
+    assert tags == {'duration_ms': 10_000}
+    assert problem.startswith("truncated")
+
+
+def test_flac_comment_count_larger_than_the_comments_keeps_them(tmp_path):
+    data = b'fLaC' + flac_block(4, vorbis_comment(["TITLE=Title", "ARTIST=Artist"], count=5), last=True)
+    tags, _, problem = read_header_tags(write_file(tmp_path, 'song.flac', data))
+    assert (tags['title'], tags['artist'], problem) == ("Title", "Artist", None)
+
+
+def test_flac_without_stream_marker_is_reported(tmp_path):
+    tags, _, problem = read_header_tags(write_file(tmp_path, 'song.flac', b'RIFF' + bytes(100)))
+    assert tags == {}
+    assert problem == "no FLAC stream marker"
+
+
+def test_flac_invalid_block_type_is_reported(tmp_path):
+    data = b'fLaC' + flac_block(0, flac_streaminfo()) + flac_block(127, bytes(8), last=True)
+    tags, _, problem = read_header_tags(write_file(tmp_path, 'song.flac', data))
+    assert tags == {'duration_ms': 10_000}
+    assert problem == "invalid FLAC metadata block"
+
+
+# MP4
+
+def test_mp4_tags_and_duration_are_read(tmp_path):
+    tags, _, problem = read_header_tags(write_file(tmp_path, 'song.m4a', mp4_file()))
+    assert (tags['title'], tags['artist'], tags['duration_ms'], problem) == ("Title", "Artist", 5000, None)
+
+
+def test_mp4_cut_inside_the_item_list_keeps_the_items_before_it(tmp_path):
+    data = mp4_file()
+    cut = data.index(b'Artist') + 2
+    tags, _, problem = read_header_tags(write_file(tmp_path, 'song.m4a', data[:cut]))
+    assert tags == {'duration_ms': 5000, 'title': "Title"}
+    assert problem.startswith("truncated")
+
+
+def test_mp4_atom_smaller_than_its_header_is_reported(tmp_path):
+    tags, _, problem = read_header_tags(write_file(tmp_path, 'song.m4a', (4).to_bytes(4, 'big') + b'ftyp' + bytes(8)))
+    assert tags == {}
+    assert problem == "invalid MP4 atom at byte 0"
+
+
+def test_mp4_without_moov_is_reported(tmp_path):
+    tags, _, problem = read_header_tags(write_file(tmp_path, 'song.m4a', atom(b'ftyp', b'M4A ' + bytes(4))))
+    assert tags == {}
+    assert problem == "no 'moov' atom"
+
+
+# Songs from malformed files
+
+def test_malformed_file_is_skipped_with_its_problem(tmp_path):
+    path = write_file(tmp_path, 'song.flac', b'fLaC' + flac_block(4, vorbis_comment(["TITLE=Title"]))[:6])
+    stats = HeaderReadStats()
+    assert stats.add(path, read_song_info_from_headers(path)) is None
+    assert stats.skipped[0][0] == path
+    assert stats.skipped[0][1].startswith("truncated")
@@ -0,0 +1,100 @@
+import playlist_sync
+from playlist_sync import compute_playlist_diff, sync_playlist
+
+
+class FakeSpotify:
+    """
+    A playlist held in memory, answering the calls playlist_sync makes and recording the changes sent to it.
+    """
+
+    def __init__(self, uris):
+        self.uris = list(uris)
+        self.version = 0
+        self.pages_read = 0
+        self.removed = []
+        self.added = []
+
+    @property
+    def snapshot_id(self):
+        return f"snapshot-{self.version}"
+
+    def playlist(self, playlist_id, fields=None):
+        return {'snapshot_id': self.snapshot_id}
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, additional_types=None):
+        self.pages_read += 1
+        items = [{'track': {'uri': uri}} for uri in self.uris[offset:offset + limit]]
+        return {'items': items, 'next': 'more' if offset + limit < len(self.uris) else None}
+
+    def playlist_remove_all_occurrences_of_items(self, playlist_id, uris, snapshot_id=None):
+        assert snapshot_id == self.snapshot_id
+        self.removed.append(list(uris))
+        self.uris = [uri for uri in self.uris if uri not in uris]
+        self.version += 1
+        return {'snapshot_id': self.snapshot_id}
+
+    def playlist_add_items(self, playlist_id, uris):
+        self.added.append(list(uris))
+        self.uris.extend(uris)
+        self.version += 1
+        return {'snapshot_id': self.snapshot_id}
+
+
+def track(number):
+    return f"spotify:track:{number}"
+
+
+def test_diff_keeps_removes_and_adds():
+    current = [track(1), track(2), track(3)]
+    target = [track(3), track(4), track(1), track(5)]
+    assert compute_playlist_diff(current, target) == ([track(2)], [track(4), track(5)])
+
+
+def test_diff_removes_a_duplicated_wanted_track_and_adds_it_back_once():
+    current = [track(1), track(2), track(1)]
+    assert compute_playlist_diff(current, [track(1), track(2)]) == ([track(1)], [track(1)])
+
+
+def test_diff_of_an_unchanged_playlist_is_empty():
+    assert compute_playlist_diff([track(1), track(2)], [track(2), track(1)]) == ([], [])
+
+
+def test_sync_only_sends_the_difference():
+    sp = FakeSpotify([track(1), 'spotify:local:a:b:c:1', track(2), track(3)])
+    stats = sync_playlist(sp, 'playlist', [track(3), track(4), track(1)])
+    assert stats == {'kept': 2, 'removed': 1, 'added': 1}
+    assert sp.removed == [[track(2)]]
+    assert sp.added == [[track(4)]]
+    assert sp.uris == [track(1), 'spotify:local:a:b:c:1', track(3), track(4)]
+
+
+def test_sync_sends_changes_in_batches(monkeypatch):
+    monkeypatch.setattr(playlist_sync, 'PLAYLIST_BATCH_SIZE', 2)
+    sp = FakeSpotify([track(number) for number in range(5)])
+    stats = sync_playlist(sp, 'playlist', [track(number) for number in range(3, 8)])
+    assert stats == {'kept': 2, 'removed': 3, 'added': 3}
+    assert sp.removed == [[track(0), track(1)], [track(2)]]
+    assert sp.added == [[track(5), track(6)], [track(7)]]
+
+
+def test_sync_state_skips_reading_an_unchanged_playlist(tmp_path):
+    state_file = str(tmp_path / 'sync_state.json')
+    sp = FakeSpotify([track(1), track(2)])
+    sync_playlist(sp, 'playlist', [track(2), track(3)], state_file)
+    pages_read = sp.pages_read
+
+    stats = sync_playlist(sp, 'playlist', [track(3), track(4)], state_file)
+    assert sp.pages_read == pages_read
+    assert stats == {'kept': 1, 'removed': 1, 'added': 1}
+    assert sp.uris == [track(3), track(4)]
+
+
+def test_sync_state_is_not_used_once_the_playlist_changed(tmp_path):
+    state_file = str(tmp_path / 'sync_state.json')
+    sp = FakeSpotify([track(1)])
+    sync_playlist(sp, 'playlist', [track(1), track(2)], state_file)
+    sp.playlist_add_items('playlist', [track(9)]) # Changed by someone else since the sync
+
+    stats = sync_playlist(sp, 'playlist', [track(1), track(2)], state_file)
+    assert stats == {'kept': 2, 'removed': 1, 'added': 0}
+    assert sp.uris == [track(1), track(2)]
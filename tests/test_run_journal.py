@@ -0,0 +1,138 @@
+import os
+
+import pytest
+import spotipy
+
+import Spotify_GeneratePlaylist as generate_playlist
+from run_journal import RunJournal, read_journal
+
+
+class FakeSpotify:
+    """
+    Records the tracks added to the playlist. With fail_on_call, that add request (counting from 1) fails.
+    """
+
+    def __init__(self, fail_on_call=None):
+        self.added = []
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def playlist_add_items(self, playlist_id, uris):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise spotipy.SpotifyException(500, -1, "Server error")
+        self.added.extend(uris)
+        return {'snapshot_id': "snapshot"}
+
+
+def interrupted_resolver(stop_after=None):
+    """
+    Stands in for resolve_songs: every song resolves to a track named after its title, and with stop_after the
+    run is interrupted after that many songs. The indexes asked for are kept in resolver.requested.
+    """
+    def resolver(sp, songs, indexes, resolution_cache=None, search_workers=1, album_stats=None):
+        resolver.requested.extend(indexes)
+        for count, i in enumerate(indexes):
+            if count == stop_after:
+                raise KeyboardInterrupt
+            yield i, f"spotify:track:{songs[i]['title']}", 'text', None
+    resolver.requested = []
+    return resolver
+
+
+@pytest.fixture
+def playlist_run(monkeypatch):
+    monkeypatch.setattr(generate_playlist, 'PLAYLIST_BATCH_SIZE', 3)
+    monkeypatch.setattr(generate_playlist, 'DEDUPE_SONGS', False)
+    monkeypatch.setattr(generate_playlist, 'SELECTION_FILTER', None)
+    monkeypatch.setattr(generate_playlist, 'SELECTION_SEED', 1)
+
+    def run(sp, journal, resolver, songs):
+        monkeypatch.setattr(generate_playlist, 'resolve_songs', resolver)
+        generate_playlist.search_and_add_tracks_to_playlist(sp, 'playlist', songs, len(songs), journal=journal)
+    return run
+
+
+def local_songs(count):
+    return [{'artist': f"Artist {i}", 'title': f"Song {i}", 'album': "", 'filepath': f"/music/{i}.mp3"}
+            for i in range(count)]
+
+
+def test_torn_last_line_is_skipped_and_overwritten(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = RunJournal(path, 'playlist')
+    journal.append('resolved', index=0, uri="spotify:track:ä")
+    journal.close()
+    complete_size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(b'{"type": "resolved", "ind')
+
+    records, valid_size = read_journal(path, 'playlist')
+    assert [record['type'] for record in records] == ['run', 'resolved']
+    assert valid_size == complete_size
+
+    journal = RunJournal(path, 'playlist', resume=True)
+    assert journal.resumed
+    journal.append('resolved', index=1, uri=None)
+    journal.close()
+    records, _ = read_journal(path, 'playlist')
+    assert [record.get('index') for record in records] == [None, 0, 1]
+    assert records[1]['uri'] == "spotify:track:ä"
+
+
+def test_finished_or_other_runs_are_not_resumed(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    RunJournal(path, 'follow').close()
+    journal = RunJournal(path, 'playlist', resume=True)
+    journal.close()
+    assert not journal.resumed
+
+    journal = RunJournal(path, 'playlist')
+    journal.complete()
+    journal.close()
+    journal = RunJournal(path, 'playlist', resume=True)
+    journal.close()
+    assert not journal.resumed
+
+
+def test_resumed_run_adds_every_track_once(tmp_path, playlist_run):
+    path = str(tmp_path / 'journal.jsonl')
+    songs = local_songs(10)
+    sp = FakeSpotify()
+
+    journal = RunJournal(path, 'playlist')
+    with pytest.raises(KeyboardInterrupt):
+        playlist_run(sp, journal, interrupted_resolver(stop_after=7), songs)
+    journal.close()
+    # Two full batches were added; the seventh resolved song was still waiting for its batch
+    assert len(sp.added) == 6
+
+    journal = RunJournal(path, 'playlist', resume=True)
+    resolver = interrupted_resolver()
+    playlist_run(sp, journal, resolver, songs)
+    journal.close()
+
+    assert len(resolver.requested) == 3
+    assert sorted(sp.added) == sorted(f"spotify:track:{song['title']}" for song in songs)
+    records, _ = read_journal(path, 'playlist')
+    assert records[-1]['type'] == 'complete'
+
+
+def test_resumed_run_retries_only_the_failed_batch(tmp_path, playlist_run):
+    path = str(tmp_path / 'journal.jsonl')
+    songs = local_songs(9)
+    sp = FakeSpotify(fail_on_call=2)
+
+    journal = RunJournal(path, 'playlist')
+    playlist_run(sp, journal, interrupted_resolver(), songs)
+    journal.close()
+    assert len(sp.added) == 6
+    assert read_journal(path, 'playlist')[0][-1]['type'] != 'complete'
+
+    journal = RunJournal(path, 'playlist', resume=True)
+    resolver = interrupted_resolver()
+    playlist_run(sp, journal, resolver, songs)
+    journal.close()
+
+    assert resolver.requested == []
+    assert sorted(sp.added) == sorted(f"spotify:track:{song['title']}" for song in songs)
@@ -0,0 +1,52 @@
+import pytest
+
+from song_dedupe import canonical_artist, canonical_artist_names, canonical_text, canonical_title, dedupe_songs
+
+
+@pytest.mark.parametrize('first, second', [
+    ("The Beatles", "Beatles, The"),
+    ("Beyoncé feat. JAY-Z", "beyonce"),
+    ("Sigur Rós", "SIGUR ROS"),
+    ("Guns N' Roses", "Guns N Roses"),
+    ("Simon & Garfunkel", "Simon and Garfunkel"),
+    ("ｼｰﾄﾍﾞﾙﾂ", "シートベルツ"), # Half-width and full-width kana
+])
+def test_spellings_of_one_artist_share_a_key(first, second):
+    assert canonical_artist(first) == canonical_artist(second)
+
+
+@pytest.mark.parametrize('first, second', [
+    ("シートベルツ", "シートヘルツ"), # Dakuten
+    ("パン", "ハン"),                 # Handakuten
+    ("Ｂ", "Ｐ"),
+    ("!!!", "???"),
+])
+def test_different_artists_do_not_collide(first, second):
+    assert canonical_artist(first) != canonical_artist(second)
+
+
+def test_punctuation_only_names_keep_a_key():
+    assert canonical_artist("!!!") == "!!!"
+    assert canonical_title("...") == "..."
+
+
+def test_accents_are_removed_only_from_latin_letters():
+    assert canonical_text("Mötley Crüe") == "motley crue"
+    assert canonical_text("ガ") == "ガ"
+
+
+def test_dedupe_keeps_one_copy_preferring_the_one_with_an_isrc():
+    songs = [
+        {'artist': "Beatles, The", 'title': "Help!", 'album': "Help!", 'filepath': "/a.mp3"},
+        {'artist': "The Beatles", 'title': "Help", 'album': "1", 'filepath': "/b.flac", 'isrc': "GBAYE6500524"},
+        {'artist': "シートベルツ", 'title': "Tank!", 'album': "", 'filepath': "/c.mp3"},
+        {'artist': "シートヘルツ", 'title': "Tank!", 'album': "", 'filepath': "/d.mp3"},
+    ]
+    table, duplicate_count = dedupe_songs(songs)
+    assert duplicate_count == 1
+    assert [song['filepath'] for song in table] == ["/b.flac", "/c.mp3", "/d.mp3"]
+
+
+def test_preferred_spelling_is_searched():
+    names = canonical_artist_names({"Beatles, The": 5, "The Beatles": 2, "Beyoncé feat. JAY-Z": 3, "Beyoncé": 1})
+    assert names == {'beatles': "The Beatles", 'beyonce': "Beyoncé"}